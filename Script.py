@@ -5,7 +5,17 @@ import time      # Для работы с временем
 import logging   # Для логирования
 import os        # Для работы с файловой системой
 from xml_validator import KaspiXMLValidator  # Для валидации XML
-from config import config, AL_STYLE_HEADERS, KASPI_HEADERS  # Конфигурация
+from feed_writer import KaspiFeedWriter  # Потоковая запись XML
+from feed_state import FeedState  # Хэши записанных и опубликованных прайс-листов
+from order_engine import run_order_engine  # Асинхронная обработка заказов
+from import_tracker import ImportTracker, import_code, wait_for_results  # Результаты загрузок в Kaspi
+from upload_scheduler import UploadScheduler, UPLOAD_UPLOADED, UPLOAD_QUEUED, UPLOAD_FAILED  # Лимит загрузок прайс-листа
+from lease import Lease, LeaseUnavailable, fencing_ok  # Только один узел выполняет синхронизацию
+from config import config, KASPI_HEADERS  # Конфигурация
+from al_style_client import get_al_style_client  # Общий клиент Al-Style
+from rate_budget import PRIORITY_CATALOG  # Страницы каталога уступают очередь списанию остатков
+from catalog_store import CatalogStore  # Локальный каталог товаров (SQLite)
+from catalog_checkpoint import CatalogCheckpoint  # Продолжение прерванной выгрузки
 import os  # Для работы с файловой системой
 
 # Настраиваем логирование
@@ -19,40 +29,160 @@ except ValueError as e:
     logging.error(f"Ошибка конфигурации: {e}")
     exit(1)
 
-def get_al_style_products():
+def get_al_style_data_date():
+    """
+    Возвращает дату актуальности данных Al-Style (метод /date) или None при ошибке.
+    """
+    try:
+        response = get_al_style_client().get('/date')
+    except requests.exceptions.RequestException as e:
+        logging.warning(f'Не удалось получить дату актуальности Al-Style: {e}')
+        return None
+    if response.status_code != 200:
+        logging.warning(f'Al-Style /date вернул статус {response.status_code}')
+        return None
+
+    try:
+        data = response.json()
+    except ValueError:
+        return response.text.strip() or None
+    # Формат ответа не задокументирован: берём поле date, иначе весь ответ целиком
+    if isinstance(data, dict):
+        data = data.get('date', data)
+    return data if isinstance(data, str) else json.dumps(data, sort_keys=True)
+
+
+def get_al_style_products(force_refresh=False):
     """
     Получает список товаров из вашего интернет-магазина.
+    Если данные Al-Style не менялись с последней загрузки, возвращает сохранённый снимок.
+    """
+    return list(iter_al_style_products(force_refresh))
+
+
+def iter_al_style_products(force_refresh=False):
+    """
+    Выдаёт товары по мере получения страниц из Al Style (генератор).
+    В памяти держится только текущая страница, поэтому формирование XML
+    идёт параллельно с ожиданием лимита запросов.
     """
+    store = CatalogStore()
+    data_date = get_al_style_data_date()
+    if not force_refresh and data_date and data_date == store.data_date and store.count():
+        logging.info(f'Данные Al-Style не менялись ({data_date}), используем локальный каталог: {store.count()} товаров')
+        yield from store.iter_products()
+        return
+
+    # Полная выгрузка была недавно - достаточно обновить цены и остатки
+    full_synced_at = store.full_synced_at
+    if not force_refresh and full_synced_at and store.count():
+        if time.time() - full_synced_at < config.full_sync_interval_hours * 3600:
+            if _sync_al_style_prices(store, data_date):
+                yield from store.iter_products()
+                return
+
     logging.info('Начало получения товаров из Al Style')
-    # Формируем URL для получения товаров
-    url = f"{config.al_style_api_url}/elements-pagination"
+    client = get_al_style_client()  # Сессия с пулом соединений и лимитом запросов
     # Параметры запроса (фильтры, лимиты, дополнительные поля)
     params = {
-        'access-token': config.al_style_token,  # Токен доступа
-        'limit': 20000,                    # Количество товаров на запрос
+        'limit': config.al_style_page_limit,  # Количество товаров на запрос
         'offset': 0,                     # Смещение для пагинации
         'additional_fields': 'brand,price1,price2,quantity,article_pn'  # Дополнительные данные о товаре
     }
-    all_products = []  # Список для хранения всех товаро
+    total_count = 0  # Сколько товаров уже получено
+    sync_started_at = time.time()  # Момент начала полной выгрузки
+
+    # Продолжаем прерванную выгрузку, если данные Al-Style с тех пор не менялись
+    checkpoint = CatalogCheckpoint()
+    if checkpoint.resume(data_date, params['limit']):
+        sync_started_at = checkpoint.header['started_at']
+        params['offset'] = checkpoint.next_offset
+        logging.info(f"Продолжаем выгрузку со смещения {params['offset']} (контрольная точка)")
+        for page in checkpoint.iter_pages():  # Страницы, полученные в прошлый раз
+            total_count += len(page)
+            yield from page
+    else:
+        checkpoint.start(data_date, params['limit'], sync_started_at)
 
     while True:  # Цикл для получения всех страниц товаров
-        # Выполняем запрос
-        response = requests.get(url, headers=AL_STYLE_HEADERS, params=params)
+        # Выполняем запрос (клиент сам выдерживает паузу между запросами)
+        response = client.get('/elements-pagination', params=params, priority=PRIORITY_CATALOG)
+        if response.status_code != 200:
+            # Клиент уже исчерпал повторы; контрольная точка остаётся - следующий запуск продолжит с этой страницы
+            raise requests.exceptions.HTTPError(
+                f"Al-Style /elements-pagination вернул статус {response.status_code} "
+                f"(смещение {params['offset']})", response=response
+            )
         data = response.json()  # Преобразуем ответ в JSON
         products = data.get('elements', [])  # Получаем список товаров
-        all_products.extend(products)  # Добавляем товары в общий список
-        logging.info(f'Получено {len(products)} товаров, всего загружено {len(all_products)}')
+        total_count += len(products)
+        logging.info(f'Получено {len(products)} товаров, всего загружено {total_count}')
+
+        store.upsert_products(products, sync_started_at)  # Сохраняем страницу в локальный каталог
+        checkpoint.append_page(params['offset'], products)  # Запоминаем прогресс выгрузки
+        yield from products  # Отдаём товары страницы потребителю
 
         # Проверяем, есть ли следующая страница
-        pagination = data.get('pagination', {})  # Информация о пагинации
-        if pagination.get('currentPage') >= pagination.get('totalPages'):  # Если последняя страница
+        pagination = data.get('pagination') or {}  # Информация о пагинации (нет - значит, данные закончились)
+        if (pagination.get('currentPage') or 0) >= (pagination.get('totalPages') or 0):  # Если последняя страница
             logging.info('Все товары получены из Al Style')
             break  # Выходим из цикла
         else:
             params['offset'] += params['limit']  # Увеличиваем смещение для следующей страницы
-            time.sleep(config.request_delay)  # Ждем настроенное время, чтобы не перегружать сервер
 
-    return all_products  # Возвращаем полный список товаров
+    # Каталог считается актуальным только после получения всех страниц
+    store.finish_sync(data_date, sync_started_at)
+    checkpoint.clear()
+
+
+def sync_al_style_prices(store=None, data_date=None):
+    """
+    Быстрая синхронизация: обновляет цены и остатки в сохранённом каталоге через /quantity-price.
+    Названия и бренды остаются от последней полной выгрузки.
+    Возвращает обновлённый список товаров или None, если обновить не удалось.
+    """
+    store = store or CatalogStore()
+    if not _sync_al_style_prices(store, data_date):
+        return None
+    return store.load_products()
+
+
+def _sync_al_style_prices(store, data_date):
+    """
+    Загружает /quantity-price и применяет его к локальному каталогу. Возвращает True при успехе.
+    """
+    if not store.count():
+        logging.warning('Нет сохранённого каталога для быстрой синхронизации, нужна полная выгрузка')
+        return False
+
+    logging.info('Быстрая синхронизация цен и остатков из Al Style (/quantity-price)')
+    try:
+        response = get_al_style_client().get('/quantity-price', priority=PRIORITY_CATALOG)
+    except requests.exceptions.RequestException as e:
+        logging.error(f'Ошибка при получении цен и остатков: {e}')
+        return False
+    if response.status_code != 200:
+        logging.error(f'Ошибка при получении цен и остатков: {response.status_code}')
+        return False
+
+    prices = response.json()  # {article: {quantity, price1, price2, ...}}
+    updated_count = store.update_prices(prices)
+    store.finish_sync(data_date)
+    logging.info(f'Изменились цены или остатки у {updated_count} из {store.count()} товаров')
+    return True
+
+
+def get_local_products():
+    """
+    Возвращает товары из локального каталога без обращения к Al-Style.
+    Если каталог ещё пуст, выполняет обычную выгрузку.
+    """
+    products = CatalogStore().load_products()
+    if products:
+        logging.info(f'Загружено {len(products)} товаров из локального каталога')
+        return products
+    logging.info('Локальный каталог пуст, выполняем выгрузку из Al Style')
+    return get_al_style_products()
 
 
 def get_valid_stock_count(quantity):
@@ -86,96 +216,125 @@ def get_valid_stock_count(quantity):
 def update_kaspi_prices_stock(products):
     """
     Обновляет цены и остатки на Kaspi.kz.
+    products - любой итерируемый объект с товарами, в том числе iter_al_style_products().
     """
     logging.info('Начало обновления цен и остатков на Kaspi.kz')
     # Импортируем модуль для работы с XML
-    from xml.etree.ElementTree import Element, SubElement, tostring
-    import xml.dom.minidom
+    from xml.etree.ElementTree import Element, SubElement
     
-    # Создаем корневой элемент XML-файла
-    kaspi_catalog = Element('kaspi_catalog', {
+    # Атрибуты корневого элемента XML-файла
+    catalog_attrs = {
         'date': time.strftime('%Y-%m-%dT%H:%M:%S'),  # Текущая дата и время
         'xmlns': 'kaspiShopping',                   # Пространство имен для XML
         'xmlns:xsi': 'http://www.w3.org/2001/XMLSchema-instance',  # Дополнительные атрибуты
         'xsi:schemaLocation': 'kaspiShopping http://kaspi.kz/kaspishopping.xsd'  # Схема для Kaspi
-    })
+    }
 
-    # Добавляем информацию о компании
-    company = SubElement(kaspi_catalog, 'company')
-    company.text = config.company_name  # Указываем название компании
+    xml_filename = config.xml_filename
+    feed_state = FeedState()
+    offers_count = 0  # Количество добавленных предложений
+    # Пишем XML в файл потоком: каждое предложение сериализуется сразу после формирования.
+    # Если предложения совпали с уже записанным файлом, файл (и его date) не меняется.
+    # Документ проверяется (структура и схема) прямо во время записи, без повторного разбора файла
+    validator = KaspiXMLValidator()
+    validation = validator.start_validation()
+    try:
+        with KaspiFeedWriter(xml_filename, catalog_attrs, keep_if_hash=feed_state.written_hash(xml_filename),
+                             tee=validation.feed) as writer:
+            # Добавляем информацию о компании
+            company = Element('company')
+            company.text = config.company_name  # Указываем название компании
+            writer.write(company)
 
-    # Добавляем идентификатор компании
-    merchantid = SubElement(kaspi_catalog, 'merchantid')
-    merchantid.text = config.merchant_id  # Указываем ID компании
+            # Добавляем идентификатор компании
+            merchantid = Element('merchantid')
+            merchantid.text = config.merchant_id  # Указываем ID компании
+            writer.write(merchantid)
 
-    # Создаем секцию предложений (товаров) - БЕЗ categories
-    offers = SubElement(kaspi_catalog, 'offers')
+            # Создаем секцию предложений (товаров) - БЕЗ categories
+            writer.start('offers')
 
-    for product in products:  # Проходим по каждому товару
-        sku = str(product.get('article_pn') or product.get('article') or '').strip()
-        if not sku:
-            logging.warning('Пропуск товара без SKU')
-            continue  # Пропускаем товары без SKU
-        
-        
-        offer = SubElement(offers, 'offer', {
-            'sku': sku  # Уникальный код товара
-        })
-
-        # Указываем модель товара
-        model_value = product.get('name')
-        model = SubElement(offer, 'model')
-        model.text = model_value.strip() if model_value else 'No Name'
-
-        # Указываем бренд товара
-        brand_value = product.get('brand')
-        brand = SubElement(offer, 'brand')
-        brand.text = brand_value.strip() if brand_value else 'Unknown'
-        
-        # Указываем информацию о доступности на складе
-        availabilities = SubElement(offer, 'availabilities')
-        stock_count = get_valid_stock_count(product.get('quantity'))
-        availability = SubElement(availabilities, 'availability', {
-            'available': 'yes' if int(stock_count) > 0 else 'no',
-            'storeId': config.store_id,  # Используем настроенный storeId
-            'preOrder': '0',
-            'stockCount': stock_count
-        })
-
-        # Указываем цену товара
-        price = SubElement(offer, 'price')
-        price_value = product.get('price2') or product.get('price1') or '0'
-        price.text = str(price_value).strip()
-        
-    # Convert to string with proper UTF-8 encoding
-    rough_string = tostring(kaspi_catalog, encoding='utf-8')
-    reparsed = xml.dom.minidom.parseString(rough_string)
-    # Кодируем в UTF-8 и сразу декодируем для сохранения как текст
-    pretty_xml_as_string = reparsed.toprettyxml(indent="  ", encoding='utf-8').decode('utf-8')
-    
-    xml_filename = config.xml_filename
-    with open(xml_filename, 'w', encoding='utf-8') as f:
-        f.write(pretty_xml_as_string)
-    logging.info('Prices and stock successfully updated and saved to XML for Kaspi.kz')
-    
-    # Валидируем созданный XML
-    logging.info('Начало валидации XML против схемы Kaspi.kz')
-    validator = KaspiXMLValidator()
-    
-    # Проверяем структуру XML
-    structure_valid, structure_message = validator.check_required_elements(pretty_xml_as_string)
+            for product in products:  # Проходим по каждому товару (products может быть генератором)
+                sku = str(product.get('article_pn') or product.get('article') or '').strip()
+                if not sku:
+                    logging.warning('Пропуск товара без SKU')
+                    continue  # Пропускаем товары без SKU
+                offers_count += 1
+
+                offer = Element('offer', {
+                    'sku': sku  # Уникальный код товара
+                })
+
+                # Указываем модель товара
+                model_value = product.get('name')
+                model = SubElement(offer, 'model')
+                model.text = model_value.strip() if model_value else 'No Name'
+
+                # Указываем бренд товара
+                brand_value = product.get('brand')
+                brand = SubElement(offer, 'brand')
+                brand.text = brand_value.strip() if brand_value else 'Unknown'
+
+                # Указываем информацию о доступности на складе
+                availabilities = SubElement(offer, 'availabilities')
+                stock_count = get_valid_stock_count(product.get('quantity'))
+                availability = SubElement(availabilities, 'availability', {
+                    'available': 'yes' if int(stock_count) > 0 else 'no',
+                    'storeId': config.store_id,  # Используем настроенный storeId
+                    'preOrder': '0',
+                    'stockCount': stock_count
+                })
+
+                # Указываем цену товара
+                price = SubElement(offer, 'price')
+                price_value = product.get('price2') or product.get('price1') or '0'
+                price.text = str(price_value).strip()
+
+                writer.write(offer)  # Записываем предложение в файл и забываем его
+
+            writer.end()  # </offers>
+            writer.end()  # </kaspi_catalog> - документ закончен, проверка завершается до замены файла
+            validation.close()
+            structure_valid, structure_message = validation.structure_result
+            if offers_count == 0 or not structure_valid:
+                # Пустой ответ Al-Style или документ с ошибками структуры не заменяет последний рабочий прайс-лист
+                writer.discard()
+    except requests.exceptions.RequestException as e:
+        # Выгрузка прервана: незавершённый файл удалён, последний рабочий прайс-лист остаётся
+        logging.error(f'Ошибка при получении товаров из Al Style: {e}')
+        return False
+    finally:
+        # Разбор завершается на любом пути, в том числе если файл не изменился или запись отменена
+        validation.close()
+
+    if offers_count == 0:
+        logging.error('Нет товаров для формирования XML')
+        return False
+    logging.info(f'Сформировано {offers_count} предложений')
+
+    # Проверяем структуру XML (файл с ошибками структуры не записан)
     if not structure_valid:
         logging.error(f'Ошибка структуры XML: {structure_message}')
+        logging.error('XML не сохранен - остается последний корректный прайс-лист')
         return False
+
+    if writer.unchanged:
+        logging.info('Предложения не изменились - XML не перезаписан, повторная проверка не нужна')
+        return True
+    logging.info('Prices and stock successfully updated and saved to XML for Kaspi.kz')
     
     # Валидируем против схемы
-    schema_valid, schema_message = validator.validate_xml_string(pretty_xml_as_string)
-    if schema_valid:
+    schema_valid, schema_message = validation.schema_result
+    if schema_valid and validation.fallback:
+        # Резервная схема проверяет только структуру - это не полная валидация
+        logging.warning(schema_message)
+    elif schema_valid:
         logging.info(f'XML успешно прошел валидацию: {schema_message}')
     else:
         logging.warning(f'XML не прошел валидацию схемы: {schema_message}')
         logging.warning('XML сохранен, но может быть отклонен Kaspi.kz')
     
+    feed_state.mark_written(xml_filename, writer.offers_hash)
     return True
     
     
@@ -191,111 +350,9 @@ def process_kaspi_orders():
     Обрабатывает заказы с Kaspi.kz и обновляет остатки в вашем магазине.
     """
     logging.info('Начало обработки заказов с Kaspi.kz')
-    
-    # ОБЯЗАТЕЛЬНО: Даты для фильтра (максимум 14 дней!)
-    import time
-    timestamp_now = int(time.time() * 1000)
-    timestamp_past = timestamp_now - (config.kaspi_date_range_days * 24 * 60 * 60 * 1000)
-    
-    # Параметры для фильтрации заказов (ВСЕ обязательные!)
-    params = {
-        'page[number]': 0,  # Номер страницы (ОБЯЗАТЕЛЬНО)
-        'page[size]': config.kaspi_page_size,  # Размер страницы (ОБЯЗАТЕЛЬНО)
-        'filter[orders][creationDate][$ge]': str(timestamp_past),  # Дата от (ОБЯЗАТЕЛЬНО!)
-        'filter[orders][creationDate][$le]': str(timestamp_now),   # Дата до (ОБЯЗАТЕЛЬНО!)
-        'filter[orders][status]': 'APPROVED_BY_BANK',  # Только подтвержденные заказы
-    }
-    
-    try:
-        # Выполняем запрос на получение заказов (правильный endpoint)
-        response = requests.get(config.kaspi_orders_url, headers=KASPI_HEADERS, params=params, timeout=config.request_timeout)
-        logging.info(f'Статус ответа от Kaspi API: {response.status_code}')
-        
-        if response.status_code != 200:
-            logging.error(f'Ошибка при получении заказов: {response.status_code} - {response.text}')
-            return
-        
-        orders = response.json().get('data', [])  # Получаем список заказов
-        logging.info(f'Найдено {len(orders)} заказов для обработки')
-        
-        if len(orders) == 0:
-            logging.info('Нет заказов для обработки в статусе APPROVED_BY_BANK')
-            return
-            
-    except requests.exceptions.RequestException as e:
-        logging.error(f'Ошибка при подключении к Kaspi API: {e}')
-        return
-    except Exception as e:
-        logging.error(f'Неожиданная ошибка при получении заказов: {e}')
-        return
 
-    for order in orders:  # Проходим по каждому заказу
-        order_id = order['id']  # ID заказа
-        order_code = order['attributes']['code']  # Код заказа
-
-        # Формируем запрос для принятия заказа
-        accept_order_payload = {
-            "data": {
-                "type": "orders",
-                "id": order_id,
-                "attributes": {
-                    "code": order_code,
-                    "status": "ACCEPTED_BY_MERCHANT"  # Меняем статус на "Принят"
-                }
-            }
-        }
-        # Отправляем запрос для принятия заказа (правильный endpoint)
-        response = requests.post(config.kaspi_orders_url, headers=KASPI_HEADERS, json=accept_order_payload, timeout=config.request_timeout)
-        if response.status_code == 200:  # Если запрос успешный
-            logging.info(f"Заказ {order_code} принят")
-        else:
-            logging.error(f"Ошибка при принятии заказа {order_code}: {response.status_code}")
-            continue  # Переходим к следующему заказу
-
-        # Получаем состав заказа
-        entries_link = order['relationships']['entries']['links']['related']
-        response_entries = requests.get(entries_link, headers=KASPI_HEADERS)
-        entries = response_entries.json().get('data', [])  # Товары из заказа
-
-        for entry in entries:  # Проходим по каждому товару
-            product_id = entry['id']  # ID товара
-            quantity = entry['attributes']['quantity']  # Количество товара
-
-            # Получаем данные о товаре
-            product_link = entry['relationships']['product']['links']['related']
-            response_product = requests.get(product_link, headers=KASPI_HEADERS)
-            product_data = response_product.json()['data']
-            product_code = product_data['attributes']['code']  # Код товара
-
-            # Обновляем остаток в Al Style
-            al_style_quantity_url = f"{config.al_style_api_url}/quantity"
-            al_style_params = {
-                'access-token': config.al_style_token,
-                'article': product_code  # Код товара
-            }
-            response_quantity = requests.get(al_style_quantity_url, headers=AL_STYLE_HEADERS, params=al_style_params)
-            if response_quantity.status_code == 200:
-                quantity_data = response_quantity.json()  # Текущий остаток
-                current_quantity = int(quantity_data.get(product_code, 0))  # Остаток на складе
-
-                # Вычисляем новый остаток
-                new_quantity = current_quantity - int(quantity)  # Вычитаем заказанное количество
-                if new_quantity < 0:  # Если остаток отрицательный
-                    new_quantity = 0  # Устанавливаем в 0
-
-                # Отправляем запрос на обновление остатка
-                update_quantity_payload = {
-                    'access-token': config.al_style_token,
-                    'article': product_code,
-                    'quantity': new_quantity
-                }
-                update_response = requests.post(f"{config.al_style_api_url}/update-quantity", headers=AL_STYLE_HEADERS, json=update_quantity_payload)
-                if update_response.status_code == 200:
-                    logging.info(f"Остаток товара {product_code} обновлен до {new_quantity}")
-                else:
-                    logging.error(f"Ошибка при обновлении остатка товара {product_code}")
-            else:
-                logging.error(f"Ошибка при получении остатка товара {product_code}")
+    # Заказы принимаются параллельно (Kaspi), остатки списываются последовательно (Al-Style)
+    run_order_engine()
 
     logging.info('Обработка заказов с Kaspi.kz завершена')
 
@@ -352,7 +409,8 @@ def test_kaspi_orders():
 
 def upload_xml_to_kaspi(xml_file_path):
     """
-    Загружает XML файл с товарами в Kaspi.kz
+    Загружает XML файл с товарами в Kaspi.kz.
+    Возвращает UPLOAD_UPLOADED, UPLOAD_QUEUED (окно лимита закрыто, файл в очереди) или UPLOAD_FAILED.
     """
     logging.info('Начало загрузки XML файла в Kaspi.kz')
     
@@ -360,43 +418,143 @@ def upload_xml_to_kaspi(xml_file_path):
         # Проверяем, существует ли файл
         if not os.path.exists(xml_file_path):
             logging.error(f'XML файл не найден: {xml_file_path}')
-            return False
+            return UPLOAD_FAILED
         
-        # Читаем содержимое XML файла
-        with open(xml_file_path, 'rb') as xml_file:
-            files = {'file': (xml_file_path, xml_file, 'application/xml')}
+        # Не расходуем лимит загрузок, если эти предложения уже загружены
+        feed_state = FeedState()
+        if feed_state.is_published(xml_file_path, 'kaspi'):
+            logging.info('Предложения не изменились с последней загрузки - повторная загрузка не нужна')
+            return UPLOAD_UPLOADED
+        
+        # Узел, потерявший аренду, не загружает файл (его загрузит новый владелец)
+        if not fencing_ok('Загрузка XML в Kaspi.kz'):
+            return UPLOAD_FAILED
+        
+        # Пока окно лимита закрыто, ставим файл в очередь (при загрузке из очереди уйдёт его последняя версия)
+        scheduler = UploadScheduler()
+        try:
+            wait = scheduler.seconds_until_slot()
+            if wait > 0:
+                scheduler.enqueue(xml_file_path)
+                logging.info(f'Лимит загрузок: файл поставлен в очередь, окно откроется через {int(wait // 60)} мин')
+                return UPLOAD_QUEUED
             
-            # Заголовки для загрузки файла
-            headers = {
-                'X-Auth-Token': config.kaspi_token
-            }
+            # Читаем содержимое XML файла
+            with open(xml_file_path, 'rb') as xml_file:
+                files = {'file': (xml_file_path, xml_file, 'application/xml')}
             
-            # Отправляем файл
-            response = requests.post(
-                config.kaspi_xml_upload_url,
-                files=files,
-                headers=headers,
-                timeout=config.request_timeout
-            )
+                # Заголовки для загрузки файла
+                headers = {
+                    'X-Auth-Token': config.kaspi_token
+                }
             
-            logging.info(f'Статус загрузки XML: {response.status_code}')
+                # Отправляем файл
+                response = requests.post(
+                    config.kaspi_xml_upload_url,
+                    files=files,
+                    headers=headers,
+                    timeout=config.request_timeout
+                )
             
-            if response.status_code in [200, 201, 202]:
-                logging.info('XML файл успешно загружен в Kaspi.kz')
-                logging.info(f'Ответ: {response.text}')
-                return True
-            else:
-                logging.error(f'Ошибка при загрузке XML: {response.status_code} - {response.text}')
-                return False
+                logging.info(f'Статус загрузки XML: {response.status_code}')
+            
+                # Запоминаем результат для расчёта окна лимита
+                if scheduler.record_response(response):
+                    scheduler.enqueue(xml_file_path)
+                    return UPLOAD_QUEUED
+            
+                if response.status_code in [200, 201, 202]:
+                    logging.info('XML файл успешно загружен в Kaspi.kz')
+                    logging.info(f'Ответ: {response.text}')
+                    feed_state.mark_published(xml_file_path, 'kaspi')
+                    scheduler.dequeue(xml_file_path)
+                    track_import(response, xml_file_path, feed_state)
+                    return UPLOAD_UPLOADED
+                else:
+                    logging.error(f'Ошибка при загрузке XML: {response.status_code} - {response.text}')
+                    return UPLOAD_FAILED
+                
+        finally:
+            scheduler.close()
                 
     except requests.exceptions.RequestException as e:
         logging.error(f'Ошибка при подключении к Kaspi.kz: {e}')
-        return False
+        return UPLOAD_FAILED
     except Exception as e:
         logging.error(f'Неожиданная ошибка при загрузке XML: {e}')
-        return False
+        return UPLOAD_FAILED
+
+def log_upload_result(upload_result):
+    """
+    Сообщает итог загрузки (результат upload_xml_to_kaspi): успех, очередь до открытия окна лимита или ошибка.
+    """
+    if upload_result == UPLOAD_UPLOADED:
+        logging.info("XML файл успешно загружен в Kaspi.kz")
+    elif upload_result == UPLOAD_QUEUED:
+        logging.info("XML файл в очереди: будет загружен, когда откроется окно лимита Kaspi.kz")
+    else:
+        logging.error("Ошибка при загрузке XML файла в Kaspi.kz")
+
+def track_import(response, xml_file_path, feed_state):
+    """
+    Записывает код загрузки; результат проверяет демон (poll_imports) или wait_for_import_result.
+    """
+    code = import_code(response)
+    if not code:
+        logging.warning('Kaspi не вернул код загрузки - результат обработки не отслеживается')
+        return
+    tracker = ImportTracker()
+    try:
+        tracker.record_upload(code, xml_file_path, feed_state.written_hash(xml_file_path))
+    finally:
+        tracker.close()
+
+def wait_for_import_result(upload_result):
+    """
+    В разовом запуске ждёт результат обработки загрузки (не дольше config.kaspi_import_wait_seconds).
+    """
+    if upload_result == UPLOAD_UPLOADED:
+        wait_for_results(config.kaspi_import_wait_seconds)
+
+
+def show_import_status():
+    """
+    Проверяет загрузки, для которых подошло время, и выводит последние загрузки.
+    """
+    tracker = ImportTracker()
+    try:
+        tracker.poll_due()
+        for item in tracker.recent():
+            uploaded_at = time.strftime('%Y-%m-%d %H:%M', time.localtime(item['uploaded_at']))
+            print(f"{uploaded_at}  {item['code']}  {item['status']:<9}  всего {item['total']}, "
+                  f"принято {item['accepted']}, ошибок {item['errors']}, пропущено {item['skipped']}")
+    finally:
+        tracker.close()
+
+
+# Режимы, которым не нужна аренда: они не выгружают каталог и ничего не загружают в Kaspi
+LEASE_FREE_MODES = ('help', 'import-status', 'test-orders')
+
 
 def main():
+    """
+    Точка входа: выполняет run_mode под арендой, если другой экземпляр уже работает - выходит
+    """
+    import sys
+    
+    mode = sys.argv[1].lower() if len(sys.argv) > 1 else None
+    if mode in LEASE_FREE_MODES:
+        run_mode()
+        return
+    
+    try:
+        with Lease():  # Аренда продлевается в фоне, пока идёт работа
+            run_mode()
+    except LeaseUnavailable as e:
+        logging.warning(f'Синхронизацию выполняет другой экземпляр ({e}) - выходим')
+
+
+def run_mode():
     """
     Основная функция с поддержкой режимов тестирования
     """
@@ -415,23 +573,40 @@ def main():
             products = get_al_style_products()
             logging.info(f"Получено {len(products)} товаров из Al-Style")
             return
+        elif mode == 'sync-full':
+            # Полная выгрузка каталога (названия, бренды, цены, остатки)
+            products = get_al_style_products(force_refresh=True)
+            logging.info(f"Полная синхронизация: {len(products)} товаров")
+            return
+        elif mode == 'sync-hot':
+            # Только цены и остатки поверх сохранённого каталога
+            products = sync_al_style_prices(data_date=get_al_style_data_date())
+            logging.info(f"Быстрая синхронизация: {len(products) if products else 0} товаров")
+            return
         elif mode == 'test-xml':
-            # Тестируем только генерацию XML
-            products = get_al_style_products()
-            xml_valid = update_kaspi_prices_stock(products)
+            # Тестируем только генерацию XML (товары обрабатываются по мере загрузки)
+            xml_valid = update_kaspi_prices_stock(iter_al_style_products())
             logging.info(f"XML валидация: {'успешно' if xml_valid else 'ошибка'}")
             return
         elif mode == 'upload-xml':
             # Загружаем XML файл в Kaspi.kz
-            xml_uploaded = upload_xml_to_kaspi(config.xml_filename)
-            logging.info(f"XML загрузка: {'успешно' if xml_uploaded else 'ошибка'}")
+            upload_result = upload_xml_to_kaspi(config.xml_filename)
+            log_upload_result(upload_result)
+            wait_for_import_result(upload_result)
+            return
+        elif mode == 'import-status':
+            # Проверяем результаты загрузок прайс-листа
+            show_import_status()
             return
         elif mode == 'help':
             print("Доступные режимы:")
             print("  python Script.py test-orders    - тестировать получение заказов")
             print("  python Script.py test-products  - тестировать получение товаров")
+            print("  python Script.py sync-full      - полная выгрузка каталога Al-Style")
+            print("  python Script.py sync-hot       - обновить только цены и остатки")
             print("  python Script.py test-xml       - тестировать генерацию XML")
             print("  python Script.py upload-xml     - загрузить XML в Kaspi.kz")
+            print("  python Script.py import-status  - результаты загрузок XML в Kaspi.kz")
             print("  python Script.py help          - показать помощь")
             print("  python Script.py               - полный запуск")
             return
@@ -439,28 +614,21 @@ def main():
     # Полный запуск (по умолчанию)
     logging.info("=== ПОЛНЫЙ ЗАПУСК СИСТЕМЫ ===")
     
-    # Получаем список товаров из Al Style
-    products = get_al_style_products()
-    logging.info(f"Получено {len(products)} товаров из вашего интернет-магазина")
-
-    # Обновляем цены и остатки в Kaspi.kz с валидацией
-    xml_valid = update_kaspi_prices_stock(products)
+    # Получаем товары из Al Style и сразу обновляем цены и остатки в Kaspi.kz с валидацией
+    xml_valid = update_kaspi_prices_stock(iter_al_style_products())
     if xml_valid:
         logging.info("Цены и остатки обновлены на Kaspi.kz - XML валиден")
         
         # Загружаем XML файл в Kaspi.kz
-        xml_uploaded = upload_xml_to_kaspi(config.xml_filename)
-        if xml_uploaded:
-            logging.info("XML файл успешно загружен в Kaspi.kz")
-        else:
-            logging.error("Ошибка при загрузке XML файла в Kaspi.kz")
+        upload_result = upload_xml_to_kaspi(config.xml_filename)
+        log_upload_result(upload_result)
+        wait_for_import_result(upload_result)
     else:
         logging.error("Ошибка валидации XML - проверьте данные товаров")
         return  # Останавливаем выполнение при ошибке валидации
 
     # Обрабатываем заказы с Kaspi.kz
     process_kaspi_orders()
-    logging.info("Обработка заказов с Kaspi.kz завершена")
 
 if __name__ == "__main__":
     main()  # Запускаем программ
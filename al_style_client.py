@@ -0,0 +1,132 @@
+"""
+HTTP-клиент для Al-Style API
+Общая сессия с пулом соединений, gzip и ограничением частоты запросов
+(API Al-Style допускает один запрос каждые 5 секунд на токен - лимит общий для всех
+процессов, см. rate_budget.py)
+"""
+
+import logging
+import threading
+from typing import Optional, Dict, Any
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import config, AL_STYLE_HEADERS
+from rate_budget import SharedRateBudget, PRIORITY_DEFAULT
+
+
+# Статусы, при которых GET-запрос имеет смысл повторить
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+def retry_after(response: requests.Response, default: float) -> float:
+    """Пауза из заголовка Retry-After (в секундах) или default"""
+    value = (response.headers.get('Retry-After') or '').strip()
+    return float(value) if value.isdigit() else default
+
+
+class AlStyleClient:
+    """Клиент Al-Style API на общей requests.Session с keep-alive"""
+
+    def __init__(self, base_url: Optional[str] = None, token: Optional[str] = None,
+                 min_interval: Optional[float] = None, max_retries: Optional[int] = None,
+                 timeout: Optional[float] = None):
+        """
+        Args:
+            base_url: Базовый URL API (по умолчанию config.al_style_api_url)
+            token: access-token (по умолчанию config.al_style_token)
+            min_interval: Минимальный интервал между запросами (по умолчанию config.request_delay)
+            max_retries: Количество повторов при сетевых ошибках (по умолчанию config.max_retries)
+            timeout: Таймаут запроса в секундах (по умолчанию config.request_timeout)
+        """
+        self.base_url = (base_url or config.al_style_api_url).rstrip('/')
+        self.token = token if token is not None else config.al_style_token
+        self.max_retries = config.max_retries if max_retries is None else max_retries
+        self.timeout = config.request_timeout if timeout is None else timeout
+        # Бюджет запросов общий для всех процессов с этим токеном
+        self.limiter = SharedRateBudget(self.token, config.request_delay if min_interval is None else min_interval)
+        self.logger = logging.getLogger(__name__)
+
+        self.session = requests.Session()
+        self.session.headers.update(AL_STYLE_HEADERS)
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+        self.session.headers['Connection'] = 'keep-alive'
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method: str, endpoint: str, params: Optional[Dict[str, Any]] = None,
+                json: Optional[Dict[str, Any]] = None, priority: int = PRIORITY_DEFAULT) -> requests.Response:
+        """
+        Выполняет запрос к Al-Style с учётом лимита и повторов
+
+        Args:
+            method: HTTP-метод (GET/POST)
+            endpoint: Путь метода API, например '/elements-pagination'
+            params: Параметры строки запроса (access-token добавляется автоматически)
+            json: Тело запроса для POST
+            priority: Приоритет в общей очереди запросов (rate_budget.PRIORITY_*)
+
+        Returns:
+            requests.Response: Ответ API (последняя попытка)
+        """
+        url = f"{self.base_url}/{endpoint.lstrip('/')}"
+        query = {'access-token': self.token}
+        if params:
+            query.update(params)
+
+        # Повторяем только идемпотентные запросы
+        attempts = self.max_retries + 1 if method.upper() == 'GET' else 1
+        for attempt in range(1, attempts + 1):
+            self.limiter.acquire(priority)
+            try:
+                response = self.session.request(method, url, params=query, json=json, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt == attempts:
+                    raise
+                self.logger.warning(f"Al-Style {endpoint}: ошибка соединения ({e}), попытка {attempt}/{attempts}")
+                continue
+
+            if response.status_code == 429:
+                # Лимит превышен (например, процессом с другой базой бюджета) - пауза для всех
+                self.limiter.defer(retry_after(response, self.limiter.interval))
+            if response.status_code in RETRY_STATUS_CODES and attempt < attempts:
+                self.logger.warning(f"Al-Style {endpoint}: HTTP {response.status_code}, попытка {attempt}/{attempts}")
+                continue
+            return response
+
+    def get(self, endpoint: str, params: Optional[Dict[str, Any]] = None,
+            priority: int = PRIORITY_DEFAULT) -> requests.Response:
+        """GET-запрос к Al-Style"""
+        return self.request('GET', endpoint, params=params, priority=priority)
+
+    def post(self, endpoint: str, json: Optional[Dict[str, Any]] = None,
+             priority: int = PRIORITY_DEFAULT) -> requests.Response:
+        """POST-запрос к Al-Style (access-token дублируется в теле, как требует API)"""
+        payload = dict(json or {})
+        payload.setdefault('access-token', self.token)
+        return self.request('POST', endpoint, json=payload, priority=priority)
+
+    def close(self) -> None:
+        """Закрывает пул соединений и базу бюджета запросов"""
+        self.session.close()
+        self.limiter.close()
+
+
+_client: Optional[AlStyleClient] = None
+_client_lock = threading.Lock()
+
+
+def get_al_style_client() -> AlStyleClient:
+    """
+    Возвращает общий для процесса клиент Al-Style
+
+    Returns:
+        AlStyleClient: Единственный экземпляр клиента
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = AlStyleClient()
+        return _client
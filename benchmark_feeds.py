@@ -0,0 +1,303 @@
+"""
+Бенчмарк генераторов прайс-листа Kaspi.kz
+Прогоняет каждый генератор (Script, enhanced, ultra_precise, correct, fixed, fallback)
+на синтетическом каталоге Al-Style заданного размера и замеряет время и пиковый RSS.
+Каждый замер выполняется в отдельном процессе и отдельной временной папке,
+результаты дописываются в JSON-файл, чтобы сравнивать версии между собой.
+
+Пример:
+    python benchmark_feeds.py --sizes 10000,100000,1000000
+    python benchmark_feeds.py --generators script,fixed --sizes 100000 --output results.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from typing import List, Dict, Any, Iterator, Optional
+
+try:
+    import resource  # Нет в Windows: там пиковый RSS не замеряется
+except ImportError:
+    resource = None
+
+
+# Генераторы прайс-листа: имя -> (модуль, как вызвать)
+GENERATORS = {
+    'script': 'Script.update_kaspi_prices_stock',
+    'enhanced': 'enhanced_xml_generator.generate_enhanced_xml',
+    'ultra_precise': 'ultra_precise_xml_generator.generate_ultra_precise_xml',
+    'correct': 'correct_xml_generator.generate_correct_xml',
+    'fixed': 'fixed_xml_generator.generate_fixed_xml',
+    'fallback': 'fallback_solution.APIFallback.generate_xml_only',
+}
+
+DEFAULT_SIZES = (10000, 100000, 1000000)
+DEFAULT_OUTPUT = 'feed_benchmark_results.json'
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Словари для синтетических товаров
+CATEGORIES = ('Ноутбук', 'Мышь беспроводная', 'Клавиатура механическая', 'Кабель HDMI 2.1', 'Патч-корд UTP Cat.6',
+              'Монитор', 'Наушники', 'Колонки', 'Роутер Wi-Fi 6', 'SSD накопитель', 'Картридж', 'Блок питания')
+BRANDS = ('Xiaomi', 'Samsung', 'Lenovo', 'HP', 'Logitech', 'Defender', 'Canon', 'TP-Link', 'ASUS', 'Kingston')
+COLORS = ('Чёрный', 'Белый', 'Серый', 'Синий', 'Красный')
+
+
+def synthetic_products(count: int, seed: int = 1) -> Iterator[Dict[str, Any]]:
+    """
+    Синтетические товары в формате /elements-pagination Al-Style
+
+    Распределения повторяют то, что приходит от Al-Style: остатки числами и строками
+    вида ">500", пустые и отсутствующие цены, бренды и артикулы производителя,
+    спецсимволы XML в названиях.
+
+    Args:
+        count: Количество товаров
+        seed: Начальное значение генератора случайных чисел
+
+    Yields:
+        Dict[str, Any]: Товар
+    """
+    rnd = random.Random(seed)
+    for index in range(count):
+        article = 10000 + index
+        brand = rnd.choice(BRANDS)
+        name = f'{rnd.choice(CATEGORIES)} {brand} {rnd.choice("ABCDEFGHKMX")}{rnd.randint(100, 9999)} {rnd.choice(COLORS)}'
+        roll = rnd.random()
+        if roll < 0.02:
+            name = f'{name} "Pro" & <Plus>'  # Экранирование в XML
+        elif roll < 0.03:
+            name = ''
+
+        product: Dict[str, Any] = {'article': article, 'name': name}
+
+        roll = rnd.random()
+        if roll < 0.9:
+            product['brand'] = brand
+        elif roll < 0.95:
+            product['brand'] = ''
+
+        roll = rnd.random()
+        if roll < 0.6:
+            product['quantity'] = rnd.randint(0, 49)
+        elif roll < 0.7:
+            product['quantity'] = '>500'
+        elif roll < 0.8:
+            product['quantity'] = '>50'
+        elif roll < 0.85:
+            product['quantity'] = str(rnd.randint(0, 20))
+        elif roll < 0.9:
+            product['quantity'] = ''
+        elif roll < 0.95:
+            product['quantity'] = None
+
+        price1 = rnd.randint(500, 900000)
+        roll = rnd.random()
+        if roll < 0.8:
+            product['price1'] = price1
+            product['price2'] = price1 * 115 // 100
+        elif roll < 0.9:
+            product['price1'] = price1  # Розничной цены нет
+        elif roll < 0.93:
+            product['price1'] = 1       # Цена по запросу
+            product['price2'] = ''
+        # Иначе цен нет совсем
+
+        roll = rnd.random()
+        if roll < 0.9:
+            product['article_pn'] = f'{brand[:3].upper()}-{rnd.randint(100000, 999999)}'
+        elif roll < 0.999:
+            product['article_pn'] = ''
+        else:
+            product['article'] = None  # Товар без SKU - генераторы должны его пропустить
+        yield product
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Пиковый RSS текущего процесса в мегабайтах (None, если замерить нельзя)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS - байты
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_one(name: str, count: int, seed: int, result_file: str) -> None:
+    """
+    Выполняет один замер в текущем процессе (вызывается в дочернем процессе из run_benchmark)
+
+    Args:
+        name: Имя генератора из GENERATORS
+        count: Количество товаров
+        seed: Начальное значение для synthetic_products
+        result_file: Куда записать результат замера (JSON)
+    """
+    sys.path.insert(0, REPO_DIR)
+    os.makedirs('logs', exist_ok=True)  # fallback_solution пишет лог в logs/ при импорте
+
+    # Схема для Script.py - резервная из schemas/, без обращения к сети (помечена как резервная)
+    from config import config
+    from xml_validator import FALLBACK_SCHEMA_PATH
+    shutil.copyfile(FALLBACK_SCHEMA_PATH, config.xml_schema_cache_file)
+    with open(f'{config.xml_schema_cache_file}.meta.json', 'w', encoding='utf-8') as f:
+        json.dump({'checked_at': time.time(), 'fallback': True}, f)
+
+    module_name, _, attr_path = GENERATORS[name].partition('.')
+    target: Any = __import__(module_name)
+    owner, _, func_name = attr_path.rpartition('.')
+    if owner:
+        target = getattr(target, owner)()  # Метод класса (APIFallback)
+    generate = getattr(target, func_name)
+    logging.getLogger().setLevel(logging.WARNING)  # Генераторы логируют каждое предупреждение
+
+    rss_before = peak_rss_mb()
+    started = time.perf_counter()
+    output = generate(synthetic_products(count, seed))
+    seconds = time.perf_counter() - started
+
+    if name == 'script':
+        # Script.py возвращает результат проверки и пишет в config.xml_filename
+        valid, output = output, config.xml_filename
+    else:
+        valid = None
+    result = {
+        'seconds': round(seconds, 3),
+        'peak_rss_mb': peak_rss_mb(),
+        'rss_before_mb': rss_before,
+        'output_bytes': os.path.getsize(output) if output and os.path.exists(output) else None,
+        'valid': valid,
+    }
+    with open(result_file, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+
+
+def run_benchmark(name: str, count: int, seed: int = 1) -> Dict[str, Any]:
+    """
+    Замеряет один генератор на одном размере каталога в отдельном процессе
+
+    Returns:
+        Dict[str, Any]: Результат замера (при ошибке - поле error)
+    """
+    record: Dict[str, Any] = {'generator': name, 'offers': count, 'seed': seed}
+    workdir = tempfile.mkdtemp(prefix=f'feed_bench_{name}_')
+    result_file = os.path.join(workdir, 'result.json')
+    env = dict(os.environ)
+    env.setdefault('AL_STYLE_TOKEN', 'benchmark')
+    env.setdefault('KASPI_TOKEN', 'benchmark')
+    # Все файлы генератора - во временной папке
+    env.update({
+        'CATALOG_DB_PATH': os.path.join(workdir, 'kaspi_catalog.db'),
+        'XML_SCHEMA_CACHE_FILE': os.path.join(workdir, 'kaspishopping_cache.xsd'),
+    })
+    try:
+        process = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--run-one', name,
+             '--count', str(count), '--seed', str(seed), '--result-file', result_file],
+            cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+        )
+        if process.returncode == 0 and os.path.exists(result_file):
+            with open(result_file, 'r', encoding='utf-8') as f:
+                record.update(json.load(f))
+        else:
+            # Последняя строка stderr - обычно текст исключения
+            lines = (process.stderr or '').strip().splitlines()
+            record['error'] = lines[-1] if lines else f'exit {process.returncode}'
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return record
+
+
+def git_revision() -> Optional[str]:
+    """Текущий коммит репозитория (None, если git недоступен)"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_runs(path: str) -> List[Dict[str, Any]]:
+    """Ранее сохранённые прогоны из файла результатов"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('runs', [])
+    except (OSError, ValueError):
+        return []
+
+
+def previous_result(runs: List[Dict[str, Any]], name: str, count: int) -> Optional[Dict[str, Any]]:
+    """Последний успешный замер того же генератора на том же размере"""
+    for run in reversed(runs):
+        for result in run.get('results', []):
+            if result['generator'] == name and result['offers'] == count and 'error' not in result:
+                return result
+    return None
+
+
+def change(current: Optional[float], previous: Optional[float]) -> str:
+    if current is None or not previous:
+        return ''
+    return f' ({(current - previous) / previous * 100:+.0f}%)'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк генераторов прайс-листа Kaspi.kz')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='Размеры каталога через запятую')
+    parser.add_argument('--generators', default=','.join(GENERATORS), help='Генераторы через запятую')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='JSON-файл с результатами всех прогонов')
+    parser.add_argument('--run-one', help=argparse.SUPPRESS)
+    parser.add_argument('--count', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        run_one(args.run_one, args.count, args.seed, args.result_file)
+        return 0
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    names = [name.strip() for name in args.generators.split(',') if name.strip()]
+    unknown = [name for name in names if name not in GENERATORS]
+    if unknown:
+        parser.error(f"Неизвестные генераторы: {', '.join(unknown)} (доступны: {', '.join(GENERATORS)})")
+
+    runs = load_runs(args.output)
+    run = {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': [],
+    }
+    for count in sizes:
+        for name in names:
+            logging.info(f'{name}: {count} товаров...')
+            result = run_benchmark(name, count, args.seed)
+            run['results'].append(result)
+            if 'error' in result:
+                logging.error(f"{name}, {count}: {result['error']}")
+                continue
+            previous = previous_result(runs, name, count) or {}
+            logging.info(f"{name}, {count}: {result['seconds']} с{change(result['seconds'], previous.get('seconds'))}, "
+                         f"пиковый RSS {result['peak_rss_mb']} МБ"
+                         f"{change(result['peak_rss_mb'], previous.get('peak_rss_mb'))}")
+
+    runs.append(run)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'runs': runs}, f, ensure_ascii=False, indent=2)
+    logging.info(f'Результаты сохранены в {args.output}')
+    return 1 if any('error' in result for result in run['results']) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
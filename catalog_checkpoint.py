@@ -0,0 +1,128 @@
+"""
+Контрольная точка постраничной выгрузки каталога Al-Style
+Позволяет продолжить прерванную выгрузку с последней полученной страницы
+"""
+
+import os
+import json
+import logging
+from typing import List, Dict, Any, Iterator, Optional
+
+from config import config
+
+
+class CatalogCheckpoint:
+    """
+    Файл контрольной точки в формате JSON Lines:
+    первая строка - заголовок (дата данных Al-Style, размер страницы, время начала),
+    каждая следующая - одна полученная страница с её смещением
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: Путь к файлу контрольной точки (по умолчанию config.catalog_checkpoint_file)
+        """
+        self.path = path or config.catalog_checkpoint_file
+        self.logger = logging.getLogger(__name__)
+        self.header: Optional[Dict[str, Any]] = None
+        self.next_offset = 0
+
+    def resume(self, data_date: Optional[str], limit: int) -> bool:
+        """
+        Проверяет, можно ли продолжить прерванную выгрузку
+
+        Устаревшая контрольная точка (другая дата данных /date или другой размер страницы) удаляется.
+
+        Args:
+            data_date: Текущая дата актуальности Al-Style
+            limit: Размер страницы текущей выгрузки
+
+        Returns:
+            bool: True, если есть годная контрольная точка (см. header и next_offset)
+        """
+        if not os.path.exists(self.path):
+            return False
+
+        try:
+            with open(self.path, 'rb+') as f:
+                header = json.loads(f.readline())
+                limit_in_file = header['limit']
+                next_offset = 0
+                good_end = f.tell()
+                for line in iter(f.readline, b''):
+                    try:
+                        page = json.loads(line)
+                    except ValueError:
+                        break  # Недописанная строка при аварийном завершении
+                    next_offset = page['offset'] + limit_in_file
+                    good_end = f.tell()
+                f.truncate(good_end)  # Отрезаем недописанный хвост, чтобы дописывать дальше
+        except (OSError, ValueError, KeyError) as e:
+            self.logger.warning(f"Контрольная точка повреждена и будет удалена: {e}")
+            self.clear()
+            return False
+
+        if not data_date or header.get('data_date') != data_date or header.get('limit') != limit:
+            self.logger.info("Контрольная точка устарела (данные Al-Style изменились), начинаем заново")
+            self.clear()
+            return False
+
+        self.header = header
+        self.next_offset = next_offset
+        return True
+
+    def iter_pages(self) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Выдаёт уже полученные страницы из контрольной точки по одной
+
+        Yields:
+            List[Dict[str, Any]]: Товары одной страницы
+        """
+        with open(self.path, 'r', encoding='utf-8') as f:
+            f.readline()  # Заголовок
+            for line in f:
+                try:
+                    page = json.loads(line)
+                except ValueError:
+                    break
+                if page['offset'] >= self.next_offset:
+                    break
+                yield page['elements']
+
+    def start(self, data_date: Optional[str], limit: int, started_at: float) -> None:
+        """
+        Начинает новую контрольную точку
+
+        Args:
+            data_date: Дата актуальности Al-Style
+            limit: Размер страницы
+            started_at: Время начала выгрузки
+        """
+        self.header = {'data_date': data_date, 'limit': limit, 'started_at': started_at}
+        self.next_offset = 0
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(self.header) + '\n')
+
+    def append_page(self, offset: int, elements: List[Dict[str, Any]]) -> None:
+        """
+        Дописывает полученную страницу (с fsync, чтобы пережить падение процесса)
+
+        Args:
+            offset: Смещение страницы
+            elements: Товары страницы
+        """
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'offset': offset, 'elements': elements}, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.next_offset = offset + self.header['limit']
+
+    def clear(self) -> None:
+        """Удаляет контрольную точку после успешной выгрузки"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        self.header = None
+        self.next_offset = 0
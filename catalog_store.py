@@ -0,0 +1,258 @@
+"""
+Локальный каталог Al-Style в SQLite (режим WAL)
+Хранит последние известные данные по каждому товару, хэш содержимого и время появления/изменения,
+чтобы генераторы и анализаторы работали без повторной выгрузки из Al-Style
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+
+from config import config
+
+
+# Поля, которые хранятся в отдельных колонках; остальные поля товара попадают в extra (JSON)
+PRODUCT_FIELDS = ('article', 'article_pn', 'name', 'brand', 'price1', 'price2', 'quantity')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    key TEXT PRIMARY KEY,
+    article,
+    article_pn TEXT,
+    name TEXT,
+    brand TEXT,
+    price1,
+    price2,
+    quantity,
+    extra TEXT,
+    content_hash TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    changed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_products_article_pn ON products (article_pn);
+CREATE INDEX IF NOT EXISTS idx_products_changed_at ON products (changed_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+UPSERT_SQL = """
+INSERT INTO products (key, article, article_pn, name, brand, price1, price2, quantity, extra,
+                      content_hash, first_seen, last_seen, changed_at)
+VALUES (:key, :article, :article_pn, :name, :brand, :price1, :price2, :quantity, :extra,
+        :content_hash, :seen_at, :seen_at, :seen_at)
+ON CONFLICT (key) DO UPDATE SET
+    article = excluded.article,
+    article_pn = excluded.article_pn,
+    name = excluded.name,
+    brand = excluded.brand,
+    price1 = excluded.price1,
+    price2 = excluded.price2,
+    quantity = excluded.quantity,
+    extra = excluded.extra,
+    last_seen = excluded.last_seen,
+    changed_at = CASE WHEN products.content_hash != excluded.content_hash
+                      THEN excluded.changed_at ELSE products.changed_at END,
+    content_hash = excluded.content_hash
+"""
+
+
+def product_key(product: Dict[str, Any]) -> Optional[str]:
+    """
+    Ключ товара в каталоге: код Al-Style (article), либо артикул производителя (article_pn)
+
+    Returns:
+        Optional[str]: Ключ или None, если у товара нет ни одного идентификатора
+    """
+    if product.get('article') not in (None, ''):
+        return str(product['article'])
+    if product.get('article_pn'):
+        return f"pn:{str(product['article_pn']).strip()}"
+    return None
+
+
+def content_hash(product: Dict[str, Any]) -> str:
+    """Хэш значимых для прайс-листа полей товара"""
+    payload = json.dumps([product.get(field) for field in PRODUCT_FIELDS[2:]], ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class CatalogStore:
+    """Каталог товаров Al-Style в локальной базе SQLite"""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: Путь к файлу базы (по умолчанию config.catalog_db_path)
+        """
+        self.path = path or config.catalog_db_path
+        self.logger = logging.getLogger(__name__)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def get_meta(self, key: str) -> Optional[str]:
+        """Возвращает служебное значение из таблицы meta"""
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row['value'] if row else None
+
+    def set_meta(self, key: str, value: Optional[str]) -> None:
+        """Сохраняет служебное значение в таблицу meta"""
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    @property
+    def data_date(self) -> Optional[str]:
+        """Дата актуальности Al-Style, на которую сохранён каталог"""
+        return self.get_meta('data_date')
+
+    @property
+    def full_synced_at(self) -> Optional[float]:
+        """Время (unix) последней полной выгрузки каталога"""
+        value = self.get_meta('full_synced_at')
+        return float(value) if value else None
+
+    def count(self) -> int:
+        """Количество товаров из последней полной выгрузки"""
+        return self.conn.execute(
+            'SELECT COUNT(*) FROM products WHERE last_seen >= ?', (self._catalog_seen_at(),)
+        ).fetchone()[0]
+
+    def _catalog_seen_at(self) -> float:
+        """Момент начала последней полной выгрузки (более старые товары считаются снятыми)"""
+        value = self.get_meta('catalog_seen_at')
+        return float(value) if value else 0.0
+
+    def load_products(self) -> List[Dict[str, Any]]:
+        """
+        Возвращает товары из последней полной выгрузки
+
+        Returns:
+            List[Dict[str, Any]]: Товары в формате ответа Al-Style
+        """
+        return list(self.iter_products())
+
+    def iter_products(self) -> Iterator[Dict[str, Any]]:
+        """
+        Выдаёт товары из последней полной выгрузки по одному, не загружая весь каталог в память
+
+        Yields:
+            Dict[str, Any]: Товар в формате ответа Al-Style
+        """
+        rows = self.conn.execute(
+            'SELECT * FROM products WHERE last_seen >= ? ORDER BY rowid', (self._catalog_seen_at(),)
+        )
+        for row in rows:
+            product = json.loads(row['extra']) if row['extra'] else {}
+            for field in PRODUCT_FIELDS:
+                if row[field] is not None:
+                    product[field] = row[field]
+            yield product
+
+    def upsert_products(self, products: Iterable[Dict[str, Any]], seen_at: Optional[float] = None) -> int:
+        """
+        Массово добавляет или обновляет товары одной транзакцией
+
+        Args:
+            products: Товары в формате ответа Al-Style
+            seen_at: Время выгрузки (по умолчанию текущее)
+
+        Returns:
+            int: Количество записанных товаров
+        """
+        seen_at = time.time() if seen_at is None else seen_at
+        rows = []
+        for product in products:
+            key = product_key(product)
+            if key is None:
+                continue
+            row = {field: product.get(field) for field in PRODUCT_FIELDS}
+            extra = {k: v for k, v in product.items() if k not in PRODUCT_FIELDS}
+            row.update(
+                key=key,
+                extra=json.dumps(extra, ensure_ascii=False) if extra else None,
+                content_hash=content_hash(product),
+                seen_at=seen_at
+            )
+            rows.append(row)
+
+        with self.conn:
+            self.conn.executemany(UPSERT_SQL, rows)
+        return len(rows)
+
+    def save_products(self, products: List[Dict[str, Any]], data_date: Optional[str],
+                      full_sync: bool = True) -> None:
+        """
+        Сохраняет полную выгрузку каталога
+
+        Args:
+            products: Полный список товаров
+            data_date: Значение /date, соответствующее этим товарам
+            full_sync: True для полной выгрузки, False для обновления только цен и остатков
+        """
+        seen_at = time.time()
+        count = self.upsert_products(products, seen_at)
+        self.finish_sync(data_date, seen_at if full_sync else None)
+        self.logger.info(f"Каталог сохранён: {count} товаров, данные от {data_date}")
+
+    def finish_sync(self, data_date: Optional[str], full_sync_started_at: Optional[float] = None) -> None:
+        """
+        Фиксирует завершение синхронизации
+
+        Args:
+            data_date: Значение /date, соответствующее сохранённым данным
+            full_sync_started_at: Время начала полной выгрузки (None для быстрой синхронизации)
+        """
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', ('data_date', data_date))
+            if full_sync_started_at is not None:
+                self.conn.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', [
+                    ('catalog_seen_at', repr(full_sync_started_at)),
+                    ('full_synced_at', repr(time.time()))
+                ])
+
+    def update_prices(self, prices: Dict[str, Dict[str, Any]]) -> int:
+        """
+        Обновляет цены и остатки по ответу /quantity-price одной транзакцией
+
+        Args:
+            prices: {article: {'quantity': ..., 'price1': ..., 'price2': ...}}
+
+        Returns:
+            int: Количество обновлённых товаров
+        """
+        now = time.time()
+        updated = 0
+        with self.conn:
+            rows = self.conn.execute('SELECT * FROM products WHERE article IS NOT NULL').fetchall()
+            changes = []
+            for row in rows:
+                item = prices.get(str(row['article']))
+                if not item:
+                    continue
+                product = {field: row[field] for field in PRODUCT_FIELDS}
+                for field in ('quantity', 'price1', 'price2'):
+                    if field in item:
+                        product[field] = item[field]
+                new_hash = content_hash(product)
+                if new_hash == row['content_hash']:
+                    continue
+                changes.append((product['quantity'], product['price1'], product['price2'],
+                                new_hash, now, row['key']))
+            self.conn.executemany(
+                'UPDATE products SET quantity = ?, price1 = ?, price2 = ?, content_hash = ?, changed_at = ? '
+                'WHERE key = ?', changes
+            )
+            updated = len(changes)
+        return updated
+
+    def close(self) -> None:
+        """Закрывает соединение с базой"""
+        self.conn.close()
@@ -21,26 +21,39 @@ class Config:
     # API URLs (правильные согласно официальной документации 2025)
     al_style_api_url: str = os.getenv('AL_STYLE_API_URL', 'https://api.al-style.kz/api')
     
-    # Kaspi API - базовый URL (согласно документации Host: kaspi.kz)
-    kaspi_base_url: str = 'https://kaspi.kz'
-    kaspi_api_base: str = os.getenv('KASPI_API_URL', 'https://kaspi.kz/shop/api/v2')
+    # Kaspi API - базовый URL (согласно документации Host: kaspi.kz; для mock_servers.py - локальный адрес)
+    kaspi_base_url: str = os.getenv('KASPI_BASE_URL', 'https://kaspi.kz')
+    kaspi_api_base: str = os.getenv('KASPI_API_URL', f'{kaspi_base_url}/shop/api/v2')
     
     # Kaspi API endpoints (правильные пути)
     kaspi_orders_url: str = f'{kaspi_base_url}/shop/api/v2/orders'
     kaspi_products_url: str = f'{kaspi_base_url}/shop/api/v2/products'
     kaspi_xml_upload_url: str = f'{kaspi_base_url}/shop/api/v2/product/import'
+    kaspi_import_result_url: str = f'{kaspi_base_url}/shop/api/products/import/result'
     
     # Настройки запросов (с timeout)
     request_delay: int = int(os.getenv('REQUEST_DELAY', '5'))
+    # Общий для всех процессов лимит Al-Style (SQLite): процессы должны указывать на один и тот же файл
+    al_style_budget_path: str = os.getenv('AL_STYLE_BUDGET_PATH', 'al_style_budget.db')
     request_timeout: int = int(os.getenv('REQUEST_TIMEOUT', '30'))  # 30 сек для Kaspi API
     max_retries: int = int(os.getenv('MAX_RETRIES', '3'))
+    al_style_page_limit: int = int(os.getenv('AL_STYLE_PAGE_LIMIT', '20000'))  # Товаров на страницу elements-pagination
     
     # User-Agent для запросов (КРИТИЧНО для Kaspi API!)
     user_agent: str = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
     
     # Kaspi pagination (ОБЯЗАТЕЛЬНЫЕ параметры согласно документации!)
-    kaspi_page_size: int = 20  # Количество заказов на странице (макс. 100)
+    kaspi_page_size: int = 100  # Количество заказов на странице (макс. 100)
     kaspi_date_range_days: int = 14  # Максимальный диапазон дат для фильтра (макс. 14 дней!)
+    # За сколько дней забирать заказы: больший период делится на окна по kaspi_date_range_days
+    kaspi_orders_lookback_days: int = int(os.getenv('KASPI_ORDERS_LOOKBACK_DAYS', '14'))
+    # Запас при опросе от последнего обработанного creationDate. Фильтр - APPROVED_BY_BANK, а одобрение
+    # (кредит, рассрочка) может прийти намного позже создания заказа, поэтому запас - сутки
+    kaspi_orders_overlap_minutes: int = int(os.getenv('KASPI_ORDERS_OVERLAP_MINUTES', '1440'))
+    # Как часто опрашивать весь период lookback: ловит заказы, одобренные позже, чем покрывает запас (0 - всегда)
+    kaspi_orders_full_sweep_minutes: int = int(os.getenv('KASPI_ORDERS_FULL_SWEEP_MINUTES', '60'))
+    kaspi_max_concurrency: int = int(os.getenv('KASPI_MAX_CONCURRENCY', '8'))  # Одновременных запросов по заказам
+    kaspi_max_concurrent_pages: int = int(os.getenv('KASPI_MAX_CONCURRENT_PAGES', '4'))  # Параллельных страниц в окне
     
     # Kaspi настройки
     store_id: str = os.getenv('STORE_ID', 'myFavoritePickupPoint1')
@@ -49,6 +62,48 @@ class Config:
     
     # Файлы
     xml_filename: str = 'kaspi_price_list.xml'
+    catalog_db_path: str = os.getenv('CATALOG_DB_PATH', 'kaspi_catalog.db')  # Локальный каталог Al-Style (SQLite)
+    catalog_checkpoint_file: str = os.getenv('CATALOG_CHECKPOINT_FILE', 'al_style_checkpoint.jsonl')  # Прогресс выгрузки
+    order_ledger_path: str = os.getenv('ORDER_LEDGER_PATH', 'kaspi_orders.db')  # Журнал обработанных заказов (SQLite)
+    import_tracker_path: str = os.getenv('IMPORT_TRACKER_PATH', 'kaspi_imports.db')  # Загрузки прайс-листа (SQLite)
+    
+    # Проверка результата загрузки прайс-листа: интервал растёт от initial до max, после max_hours - сдаёмся
+    kaspi_import_poll_initial_seconds: int = int(os.getenv('KASPI_IMPORT_POLL_INITIAL_SECONDS', '30'))
+    kaspi_import_poll_max_seconds: int = int(os.getenv('KASPI_IMPORT_POLL_MAX_SECONDS', '1800'))
+    kaspi_import_poll_max_hours: int = int(os.getenv('KASPI_IMPORT_POLL_MAX_HOURS', '24'))
+    # Сколько разовый запуск (Script.py, CI) ждёт результата загрузки перед выходом (0 - не ждать)
+    kaspi_import_wait_seconds: int = int(os.getenv('KASPI_IMPORT_WAIT_SECONDS', '300'))
+    # Лимит загрузок прайс-листа: окно по умолчанию (пока не изучено по ответам Kaspi) и пауза после отказа,
+    # если Kaspi не сообщил время сброса
+    kaspi_upload_window_hours: int = int(os.getenv('KASPI_UPLOAD_WINDOW_HOURS', '24'))
+    kaspi_upload_retry_minutes: int = int(os.getenv('KASPI_UPLOAD_RETRY_MINUTES', '60'))
+    
+    # Схема XSD прайс-листа: загруженная копия кэшируется на диске и перепроверяется раз в N часов
+    xml_schema_url: str = os.getenv('XML_SCHEMA_URL', 'http://kaspi.kz/kaspishopping.xsd')
+    xml_schema_cache_file: str = os.getenv('XML_SCHEMA_CACHE_FILE', 'kaspishopping_cache.xsd')
+    xml_schema_max_age_hours: int = int(os.getenv('XML_SCHEMA_MAX_AGE_HOURS', '24'))
+    
+    # HTTP-сервер прайс-листа (feed_server.py): адрес, журнал обращений и признаки Kaspi в User-Agent
+    feed_server_host: str = os.getenv('FEED_SERVER_HOST', '0.0.0.0')
+    feed_server_port: int = int(os.getenv('FEED_SERVER_PORT', '8080'))
+    feed_pull_log_path: str = os.getenv('FEED_PULL_LOG_PATH', 'kaspi_feed_pulls.db')
+    feed_kaspi_user_agents: str = os.getenv('FEED_KASPI_USER_AGENTS', 'kaspi')  # Подстроки через запятую
+    
+    # Полная выгрузка каталога (названия, бренды) раз в N часов, между ними - только цены и остатки
+    full_sync_interval_hours: int = int(os.getenv('FULL_SYNC_INTERVAL_HOURS', '24'))
+    
+    # Демон синхронизации (sync_daemon.py): период каждой задачи и случайная добавка к нему (доля периода)
+    daemon_catalog_interval_minutes: int = int(os.getenv('DAEMON_CATALOG_INTERVAL_MINUTES', '60'))
+    daemon_feed_interval_minutes: int = int(os.getenv('DAEMON_FEED_INTERVAL_MINUTES', '15'))
+    daemon_orders_interval_seconds: int = int(os.getenv('DAEMON_ORDERS_INTERVAL_SECONDS', '60'))
+    daemon_imports_interval_seconds: int = int(os.getenv('DAEMON_IMPORTS_INTERVAL_SECONDS', '60'))
+    daemon_jitter_fraction: float = float(os.getenv('DAEMON_JITTER_FRACTION', '0.1'))
+    
+    # Аренда права на синхронизацию: работает только один процесс сервера, остальные ждут.
+    # База - только на локальном диске: WAL и блокировки SQLite ненадёжны на NFS/SMB
+    lease_db_path: str = os.getenv('LEASE_DB_PATH', 'kaspi_lease.db')
+    lease_ttl_seconds: int = int(os.getenv('LEASE_TTL_SECONDS', '120'))  # Срок без продления; продление - каждые ttl/3
+    node_id: str = os.getenv('NODE_ID', '')  # Имя узла (по умолчанию хост:pid)
     
     def validate(self) -> bool:
         """Проверяет, что все обязательные настройки заданы"""
@@ -5,10 +5,10 @@
 import json
 import time
 import logging
-from xml.etree.ElementTree import Element, SubElement, tostring
-import xml.dom.minidom
-from Script import get_al_style_products
+from xml.etree.ElementTree import Element, SubElement
+from Script import get_local_products
 from config import config
+from feed_writer import KaspiFeedWriter, PLAIN_DECLARATION
 
 def generate_correct_xml(products):
     """Генерирует XML с правильным порядком элементов"""
@@ -16,83 +16,81 @@ def generate_correct_xml(products):
     print("🔧 Создание XML с правильным порядком элементов")
     print("=" * 50)
     
-    # Создаем корневой элемент
-    kaspi_catalog = Element('kaspi_catalog', {
+    # Атрибуты корневого элемента
+    catalog_attrs = {
         'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
         'xmlns': 'kaspiShopping',
         'xmlns:xsi': 'http://www.w3.org/2001/XMLSchema-instance',
         'xsi:schemaLocation': 'kaspiShopping http://kaspi.kz/kaspishopping.xsd'
-    })
+    }
     
-    # Компания
-    company = SubElement(kaspi_catalog, 'company')
-    company.text = config.company_name
-    
-    # ID продавца
-    merchantid = SubElement(kaspi_catalog, 'merchantid')
-    merchantid.text = config.merchant_id
-    
-    # Offers
-    offers = SubElement(kaspi_catalog, 'offers')
-    
-    processed_count = 0
-    
-    for product in products:
-        try:
-            # SKU - обязательное поле
-            sku = str(product.get('article_pn') or product.get('article') or '').strip()
-            if not sku:
-                continue
+    # Пишем XML в файл потоком, без построения всего дерева в памяти
+    filename = f'kaspi_correct_{time.strftime("%Y%m%d_%H%M%S")}.xml'
+    with KaspiFeedWriter(filename, catalog_attrs, declaration=PLAIN_DECLARATION) as writer:
+        # Компания
+        company = Element('company')
+        company.text = config.company_name
+        writer.write(company)
+        
+        # ID продавца
+        merchantid = Element('merchantid')
+        merchantid.text = config.merchant_id
+        writer.write(merchantid)
+        
+        # Offers
+        writer.start('offers')
+        
+        processed_count = 0
+        
+        for product in products:
+            try:
+                # SKU - обязательное поле
+                sku = str(product.get('article_pn') or product.get('article') or '').strip()
+                if not sku:
+                    continue
+                    
+                # Название товара
+                name = product.get('name', '').strip()
+                if not name:
+                    continue
+                    
+                offer = Element('offer', {
+                    'sku': sku
+                })
                 
-            # Название товара
-            name = product.get('name', '').strip()
-            if not name:
-                continue
+                # ПРАВИЛЬНЫЙ ПОРЯДОК элементов (как в оригинальном XML):
+                # 1. model
+                model = SubElement(offer, 'model')
+                model.text = name
                 
-            offer = SubElement(offers, 'offer', {
-                'sku': sku
-            })
-            
-            # ПРАВИЛЬНЫЙ ПОРЯДОК элементов (как в оригинальном XML):
-            # 1. model
-            model = SubElement(offer, 'model')
-            model.text = name
-            
-            # 2. brand
-            brand = SubElement(offer, 'brand')
-            brand.text = product.get('brand', 'Unknown').strip()
-            
-            # 3. availabilities (перед price!)
-            availabilities = SubElement(offer, 'availabilities')
-            quantity = get_stock_count(product.get('quantity'))
-            
-            availability = SubElement(availabilities, 'availability', {
-                'available': 'yes' if int(quantity) > 0 else 'no',
-                'storeId': config.store_id,
-                'preOrder': '0',
-                'stockCount': quantity
-            })
-            
-            # 4. price (после availabilities!)
-            price = SubElement(offer, 'price')
-            price_value = product.get('price2') or product.get('price1') or '0'
-            price.text = str(price_value)
-            
-            processed_count += 1
-            
-        except Exception as e:
-            logging.error(f"Ошибка при обработке товара {sku}: {e}")
-            continue
-    
-    # Форматируем XML
-    rough_string = tostring(kaspi_catalog, encoding='utf-8')
-    reparsed = xml.dom.minidom.parseString(rough_string)
-    pretty_xml = reparsed.toprettyxml(indent="  ")
-    
-    # Сохраняем файл
-    filename = f'kaspi_correct_{time.strftime("%Y%m%d_%H%M%S")}.xml'
-    with open(filename, 'w', encoding='utf-8') as f:
-        f.write(pretty_xml)
+                # 2. brand
+                brand = SubElement(offer, 'brand')
+                brand.text = product.get('brand', 'Unknown').strip()
+                
+                # 3. availabilities (перед price!)
+                availabilities = SubElement(offer, 'availabilities')
+                quantity = get_stock_count(product.get('quantity'))
+                
+                availability = SubElement(availabilities, 'availability', {
+                    'available': 'yes' if int(quantity) > 0 else 'no',
+                    'storeId': config.store_id,
+                    'preOrder': '0',
+                    'stockCount': quantity
+                })
+                
+                # 4. price (после availabilities!)
+                price = SubElement(offer, 'price')
+                price_value = product.get('price2') or product.get('price1') or '0'
+                price.text = str(price_value)
+                
+                writer.write(offer)  # Записываем предложение и освобождаем память
+                processed_count += 1
+                
+            except Exception as e:
+                logging.error(f"Ошибка при обработке товара {sku}: {e}")
+                continue
+        
+        writer.end()  # </offers>
     
     print(f"✅ Создан корректный XML: {filename}")
     print(f"📊 Обработано товаров: {processed_count}")
@@ -124,7 +122,7 @@ def main():
     print("=" * 50)
     
     # Получаем товары
-    products = get_al_style_products()
+    products = get_local_products()
     
     if not products:
         print("❌ Не удалось получить товары")
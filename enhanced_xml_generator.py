@@ -5,10 +5,10 @@
 import json
 import time
 import logging
-from xml.etree.ElementTree import Element, SubElement, tostring
-import xml.dom.minidom
-from Script import get_al_style_products
+from xml.etree.ElementTree import Element, SubElement
+from Script import get_local_products
 from config import config
+from feed_writer import KaspiFeedWriter, PLAIN_DECLARATION
 
 def generate_enhanced_xml(products):
     """Генерирует улучшенный XML с дополнительными полями"""
@@ -16,126 +16,125 @@ def generate_enhanced_xml(products):
     print("🔧 Создание улучшенного XML для Kaspi.kz")
     print("=" * 50)
     
-    # Создаем корневой элемент
-    kaspi_catalog = Element('kaspi_catalog', {
+    # Атрибуты корневого элемента
+    catalog_attrs = {
         'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
         'xmlns': 'kaspiShopping',
         'xmlns:xsi': 'http://www.w3.org/2001/XMLSchema-instance',
         'xsi:schemaLocation': 'kaspiShopping http://kaspi.kz/kaspishopping.xsd'
-    })
-    
-    # Компания
-    company = SubElement(kaspi_catalog, 'company')
-    company.text = config.company_name
-    
-    # ID продавца
-    merchantid = SubElement(kaspi_catalog, 'merchantid')
-    merchantid.text = config.merchant_id
-    
-    # Категории (добавляем базовые категории)
-    categories = SubElement(kaspi_catalog, 'categories')
-    
-    # Основные категории для электроники
-    category_mapping = {
-        'Кабели': 'cables',
-        'Клавиатуры': 'keyboards', 
-        'Аксессуары': 'accessories',
-        'Патч-корды': 'patch-cords',
-        'Сетевое оборудование': 'network'
     }
     
-    for cat_name, cat_id in category_mapping.items():
-        category = SubElement(categories, 'category', {
-            'id': cat_id,
-            'parentId': 'electronics'
-        })
-        category.text = cat_name
-    
-    # Предложения
-    offers = SubElement(kaspi_catalog, 'offers')
-    
-    processed_count = 0
-    
-    for product in products:
-        try:
-            # SKU - обязательное поле
-            sku = str(product.get('article_pn') or product.get('article') or '').strip()
-            if not sku:
-                continue
+    # Пишем XML в файл потоком, без построения всего дерева в памяти
+    filename = f'kaspi_enhanced_{time.strftime("%Y%m%d_%H%M%S")}.xml'
+    with KaspiFeedWriter(filename, catalog_attrs, declaration=PLAIN_DECLARATION) as writer:
+        # Компания
+        company = Element('company')
+        company.text = config.company_name
+        writer.write(company)
+        
+        # ID продавца
+        merchantid = Element('merchantid')
+        merchantid.text = config.merchant_id
+        writer.write(merchantid)
+        
+        # Категории (добавляем базовые категории)
+        categories = Element('categories')
+        
+        # Основные категории для электроники
+        category_mapping = {
+            'Кабели': 'cables',
+            'Клавиатуры': 'keyboards', 
+            'Аксессуары': 'accessories',
+            'Патч-корды': 'patch-cords',
+            'Сетевое оборудование': 'network'
+        }
+        
+        for cat_name, cat_id in category_mapping.items():
+            category = SubElement(categories, 'category', {
+                'id': cat_id,
+                'parentId': 'electronics'
+            })
+            category.text = cat_name
+        writer.write(categories)
+        
+        # Предложения
+        writer.start('offers')
+        
+        processed_count = 0
+        
+        for product in products:
+            try:
+                # SKU - обязательное поле
+                sku = str(product.get('article_pn') or product.get('article') or '').strip()
+                if not sku:
+                    continue
+                    
+                # Название товара
+                name = product.get('name', '').strip()
+                if not name:
+                    continue
+                    
+                offer = Element('offer', {
+                    'sku': sku,
+                    'available': 'true'
+                })
                 
-            # Название товара
-            name = product.get('name', '').strip()
-            if not name:
-                continue
+                # Название
+                model = SubElement(offer, 'model')
+                model.text = name
                 
-            offer = SubElement(offers, 'offer', {
-                'sku': sku,
-                'available': 'true'
-            })
-            
-            # Название
-            model = SubElement(offer, 'model')
-            model.text = name
-            
-            # Бренд
-            brand = SubElement(offer, 'brand')
-            brand.text = product.get('brand', 'No Brand').strip()
-            
-            # Категория (пытаемся определить автоматически)
-            category_id = determine_category(name)
-            categoryId = SubElement(offer, 'categoryId')
-            categoryId.text = category_id
-            
-            # Цена
-            price = SubElement(offer, 'price')
-            price_value = product.get('price2') or product.get('price1') or '0'
-            price.text = str(price_value)
-            
-            # Валюта
-            currencyId = SubElement(offer, 'currencyId')
-            currencyId.text = 'KZT'
-            
-            # Описание (важно для распознавания!)
-            description = SubElement(offer, 'description')
-            description.text = create_description(product)
-            
-            # Доступность
-            availabilities = SubElement(offer, 'availabilities')
-            quantity = get_stock_count(product.get('quantity'))
-            
-            availability = SubElement(availabilities, 'availability', {
-                'available': 'yes' if int(quantity) > 0 else 'no',
-                'storeId': config.store_id,
-                'preOrder': '0',
-                'stockCount': quantity
-            })
-            
-            # Дополнительные параметры
-            params = SubElement(offer, 'params')
-            
-            # Добавляем параметры
-            add_param(params, 'Артикул', sku)
-            add_param(params, 'Бренд', product.get('brand', 'No Brand'))
-            
-            # Если есть дополнительная информация
-            if product.get('weight'):
-                add_param(params, 'Вес', str(product.get('weight')))
-            
-            processed_count += 1
-            
-        except Exception as e:
-            logging.error(f"Ошибка при обработке товара {sku}: {e}")
-            continue
-    
-    # Форматируем XML
-    rough_string = tostring(kaspi_catalog, encoding='utf-8')
-    reparsed = xml.dom.minidom.parseString(rough_string)
-    pretty_xml = reparsed.toprettyxml(indent="  ")
-    
-    # Сохраняем файл
-    filename = f'kaspi_enhanced_{time.strftime("%Y%m%d_%H%M%S")}.xml'
-    with open(filename, 'w', encoding='utf-8') as f:
-        f.write(pretty_xml)
+                # Бренд
+                brand = SubElement(offer, 'brand')
+                brand.text = product.get('brand', 'No Brand').strip()
+                
+                # Категория (пытаемся определить автоматически)
+                category_id = determine_category(name)
+                categoryId = SubElement(offer, 'categoryId')
+                categoryId.text = category_id
+                
+                # Цена
+                price = SubElement(offer, 'price')
+                price_value = product.get('price2') or product.get('price1') or '0'
+                price.text = str(price_value)
+                
+                # Валюта
+                currencyId = SubElement(offer, 'currencyId')
+                currencyId.text = 'KZT'
+                
+                # Описание (важно для распознавания!)
+                description = SubElement(offer, 'description')
+                description.text = create_description(product)
+                
+                # Доступность
+                availabilities = SubElement(offer, 'availabilities')
+                quantity = get_stock_count(product.get('quantity'))
+                
+                availability = SubElement(availabilities, 'availability', {
+                    'available': 'yes' if int(quantity) > 0 else 'no',
+                    'storeId': config.store_id,
+                    'preOrder': '0',
+                    'stockCount': quantity
+                })
+                
+                # Дополнительные параметры
+                params = SubElement(offer, 'params')
+                
+                # Добавляем параметры
+                add_param(params, 'Артикул', sku)
+                add_param(params, 'Бренд', product.get('brand', 'No Brand'))
+                
+                # Если есть дополнительная информация
+                if product.get('weight'):
+                    add_param(params, 'Вес', str(product.get('weight')))
+                
+                writer.write(offer)  # Записываем предложение и освобождаем память
+                processed_count += 1
+                
+            except Exception as e:
+                logging.error(f"Ошибка при обработке товара {sku}: {e}")
+                continue
+        
+        writer.end()  # </offers>
     
     print(f"✅ Создан улучшенный XML: {filename}")
     print(f"📊 Обработано товаров: {processed_count}")
@@ -197,7 +196,7 @@ def main():
     print("=" * 50)
     
     # Получаем товары
-    products = get_al_style_products()
+    products = get_local_products()
     
     if not products:
         print("❌ Не удалось получить товары")
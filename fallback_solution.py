@@ -2,14 +2,16 @@
 """
 Обходное решение - работа только с Al-Style до исправления Kaspi API
 """
-import requests
 import json
 import time
 import logging
 import os
-from xml.etree.ElementTree import Element, SubElement, tostring
-import xml.dom.minidom
+from xml.etree.ElementTree import Element, SubElement
 from dotenv import load_dotenv
+from al_style_client import AlStyleClient
+from rate_budget import PRIORITY_CATALOG
+from catalog_store import CatalogStore
+from feed_writer import KaspiFeedWriter, PLAIN_DECLARATION
 
 load_dotenv()
 
@@ -30,19 +32,13 @@ class APIFallback:
         self.al_style_token = os.getenv('AL_STYLE_TOKEN')
         self.kaspi_token = os.getenv('KASPI_TOKEN')
         self.al_style_url = os.getenv('AL_STYLE_API_URL', 'https://api.al-style.kz/api')
+        self.al_style = AlStyleClient(base_url=self.al_style_url, token=self.al_style_token)
         
     def get_al_style_products(self):
         """Получение товаров из Al-Style с обработкой ошибок"""
         logging.info('Получение товаров из Al-Style...')
         
-        url = f"{self.al_style_url}/elements-pagination"
-        headers = {
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        }
-        
         params = {
-            'access-token': self.al_style_token,
             'limit': 100,
             'offset': 0,
             'additional_fields': 'brand,price1,price2,quantity,article_pn'
@@ -52,7 +48,7 @@ class APIFallback:
         
         try:
             while True:
-                response = requests.get(url, headers=headers, params=params, timeout=30)
+                response = self.al_style.get('/elements-pagination', params=params, priority=PRIORITY_CATALOG)
                 
                 if response.status_code != 200:
                     logging.error(f'Ошибка Al-Style API: {response.status_code}')
@@ -69,7 +65,6 @@ class APIFallback:
                     break
                 
                 params['offset'] += params['limit']
-                time.sleep(2)  # Пауза между запросами
                 
         except Exception as e:
             logging.error(f'Ошибка при получении товаров: {e}')
@@ -80,64 +75,63 @@ class APIFallback:
         """Генерация XML файла для ручной загрузки"""
         logging.info('Генерация XML файла...')
         
-        # Создаем XML структуру
-        kaspi_catalog = Element('kaspi_catalog', {
+        # Атрибуты корневого элемента
+        catalog_attrs = {
             'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
             'xmlns': 'kaspiShopping',
             'xmlns:xsi': 'http://www.w3.org/2001/XMLSchema-instance',
             'xsi:schemaLocation': 'kaspiShopping http://kaspi.kz/kaspishopping.xsd'
-        })
-        
-        # Добавляем информацию о компании
-        company = SubElement(kaspi_catalog, 'company')
-        company.text = os.getenv('COMPANY_NAME', 'Al-Style')
-        
-        merchantid = SubElement(kaspi_catalog, 'merchantid')
-        merchantid.text = os.getenv('MERCHANT_ID', '01')
-        
-        offers = SubElement(kaspi_catalog, 'offers')
+        }
         
-        # Добавляем товары
-        for product in products:
-            sku = str(product.get('article_pn') or product.get('article') or '').strip()
-            if not sku:
-                continue
-            
-            offer = SubElement(offers, 'offer', {'sku': sku})
-            
-            # Модель
-            model = SubElement(offer, 'model')
-            model.text = product.get('name', 'No Name').strip()
+        # Пишем XML потоком, без построения всего дерева в памяти
+        filename = f'kaspi_price_list_{time.strftime("%Y%m%d_%H%M%S")}.xml'
+        with KaspiFeedWriter(filename, catalog_attrs, declaration=PLAIN_DECLARATION) as writer:
+            # Добавляем информацию о компании
+            company = Element('company')
+            company.text = os.getenv('COMPANY_NAME', 'Al-Style')
+            writer.write(company)
             
-            # Бренд
-            brand = SubElement(offer, 'brand')
-            brand.text = product.get('brand', 'Unknown').strip()
+            merchantid = Element('merchantid')
+            merchantid.text = os.getenv('MERCHANT_ID', '01')
+            writer.write(merchantid)
             
-            # Доступность
-            availabilities = SubElement(offer, 'availabilities')
-            quantity = product.get('quantity', 0)
-            stock_count = self._get_stock_count(quantity)
+            writer.start('offers')
             
-            availability = SubElement(availabilities, 'availability', {
-                'available': 'yes' if int(stock_count) > 0 else 'no',
-                'storeId': os.getenv('STORE_ID', 'myFavoritePickupPoint1'),
-                'preOrder': '0',
-                'stockCount': stock_count
-            })
+            # Добавляем товары
+            for product in products:
+                sku = str(product.get('article_pn') or product.get('article') or '').strip()
+                if not sku:
+                    continue
+                
+                offer = Element('offer', {'sku': sku})
+                
+                # Модель
+                model = SubElement(offer, 'model')
+                model.text = product.get('name', 'No Name').strip()
+                
+                # Бренд
+                brand = SubElement(offer, 'brand')
+                brand.text = product.get('brand', 'Unknown').strip()
+                
+                # Доступность
+                availabilities = SubElement(offer, 'availabilities')
+                quantity = product.get('quantity', 0)
+                stock_count = self._get_stock_count(quantity)
+                
+                availability = SubElement(availabilities, 'availability', {
+                    'available': 'yes' if int(stock_count) > 0 else 'no',
+                    'storeId': os.getenv('STORE_ID', 'myFavoritePickupPoint1'),
+                    'preOrder': '0',
+                    'stockCount': stock_count
+                })
+                
+                # Цена
+                price = SubElement(offer, 'price')
+                price.text = str(product.get('price2') or product.get('price1') or '0')
+                
+                writer.write(offer)
             
-            # Цена
-            price = SubElement(offer, 'price')
-            price.text = str(product.get('price2') or product.get('price1') or '0')
-        
-        # Форматируем XML
-        rough_string = tostring(kaspi_catalog, encoding='utf-8')
-        reparsed = xml.dom.minidom.parseString(rough_string)
-        pretty_xml = reparsed.toprettyxml(indent="  ")
-        
-        # Сохраняем файл
-        filename = f'kaspi_price_list_{time.strftime("%Y%m%d_%H%M%S")}.xml'
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(pretty_xml)
+            writer.end()
         
         logging.info(f'XML файл сохранен: {filename}')
         return filename
@@ -167,8 +161,8 @@ def main():
     
     fallback = APIFallback()
     
-    # Получаем товары из Al-Style
-    products = fallback.get_al_style_products()
+    # Берём товары из локального каталога, а при его отсутствии - из Al-Style
+    products = CatalogStore().load_products() or fallback.get_al_style_products()
     
     if not products:
         logging.error("Не удалось получить товары из Al-Style")
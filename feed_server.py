@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+"""
+HTTP-сервер прайс-листа Kaspi.kz
+Отдаёт последний сформированный прайс-лист прямо с диска, без публикации через git
+и задержки CDN raw.githubusercontent.com. Сильный ETag (SHA-256 содержимого),
+ответ 304 на If-None-Match / If-Modified-Since, заранее сжатая gzip-версия,
+Range-запросы и передача файла через sendfile без копирования в память.
+Каждое обращение записывается в журнал (SQLite), чтобы было видно, когда Kaspi
+на самом деле забрал новую версию цен
+
+Пример:
+    python feed_server.py --port 8080
+    python feed_server.py --pulls 20
+"""
+
+import os
+import sys
+import gzip
+import time
+import socket
+import sqlite3
+import hashlib
+import logging
+import argparse
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+from typing import List, Dict, Any, BinaryIO, Tuple, Optional, Union
+
+from config import config
+
+
+# Как часто проверять, не появилась ли новая версия файла (чтобы сжать её до первого запроса)
+WATCH_SECONDS = 5
+# Сколько раз пробовать открыть файл, если его заменили во время запроса
+OPEN_ATTEMPTS = 3
+
+PULLS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS feed_pulls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    at REAL NOT NULL,
+    client TEXT,
+    user_agent TEXT,
+    kaspi INTEGER NOT NULL DEFAULT 0,
+    method TEXT,
+    status INTEGER NOT NULL,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    etag TEXT,
+    encoding TEXT,
+    byte_range TEXT,
+    feed_mtime REAL
+);
+CREATE INDEX IF NOT EXISTS idx_feed_pulls_etag ON feed_pulls (etag) WHERE kaspi = 1;
+"""
+
+
+class FeedVersion:
+    """Одна версия файла прайс-листа: признаки файла, ETag и сжатая копия"""
+
+    def __init__(self, stat: os.stat_result, digest: str, gzip_stat: os.stat_result):
+        self.inode = stat.st_ino
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+        self.mtime = stat.st_mtime
+        self.etag = f'"{digest[:32]}"'
+        self.gzip_inode = gzip_stat.st_ino
+        self.gzip_size = gzip_stat.st_size
+        self.gzip_etag = f'"{digest[:32]}-gz"'  # Другое представление - другой ETag
+
+    def matches(self, stat: os.stat_result, compressed: bool = False) -> bool:
+        """True, если открытый файл - именно эта версия"""
+        if compressed:
+            return (stat.st_ino, stat.st_size) == (self.gzip_inode, self.gzip_size)
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns) == (self.inode, self.size, self.mtime_ns)
+
+
+class FeedFile:
+    """Прайс-лист на диске и его gzip-копия, пересчитываемые при замене файла"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Путь к прайс-листу (генератор заменяет его атомарно через os.replace)
+        """
+        self.path = path
+        self.gzip_path = f'{path}.gz'
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self.version: Optional[FeedVersion] = None
+
+    def current(self) -> Optional[FeedVersion]:
+        """Актуальная версия файла (None, если прайс-лист ещё не сформирован)"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            if self.version is None or not self.version.matches(stat):
+                self.version = self._prepare()
+            return self.version
+
+    def _prepare(self) -> FeedVersion:
+        """Считает SHA-256 и записывает gzip-копию за один проход по файлу"""
+        started = time.monotonic()
+        digest = hashlib.sha256()
+        tmp_path = f'{self.gzip_path}.tmp'
+        with open(self.path, 'rb') as source, open(tmp_path, 'wb') as target:
+            stat = os.fstat(source.fileno())  # Признаки именно того файла, который читаем
+            # mtime=0: одинаковое содержимое даёт одинаковый .gz
+            with gzip.GzipFile(fileobj=target, mode='wb', compresslevel=6, mtime=0) as compressed:
+                for chunk in iter(lambda: source.read(1 << 20), b''):
+                    digest.update(chunk)
+                    compressed.write(chunk)
+        os.replace(tmp_path, self.gzip_path)  # Открытые старые копии дочитываются до конца
+        version = FeedVersion(stat, digest.hexdigest(), os.stat(self.gzip_path))
+        self.logger.info(f'Новая версия прайс-листа {version.etag}: {version.size} байт, '
+                         f'gzip {version.gzip_size} байт (подготовлено за {time.monotonic() - started:.1f} с)')
+        return version
+
+    def open(self, compressed: bool) -> Optional[Tuple[BinaryIO, FeedVersion]]:
+        """
+        Открывает файл и проверяет, что он соответствует версии, для которой посчитан ETag
+
+        Args:
+            compressed: Открыть gzip-копию
+
+        Returns:
+            Optional[Tuple[BinaryIO, FeedVersion]]: Открытый файл и его версия (None - прайс-листа нет)
+        """
+        for _ in range(OPEN_ATTEMPTS):
+            version = self.current()
+            if version is None:
+                return None
+            try:
+                f = open(self.gzip_path if compressed else self.path, 'rb')
+            except FileNotFoundError:
+                continue
+            if version.matches(os.fstat(f.fileno()), compressed):
+                return f, version
+            f.close()  # Файл заменили между проверкой и открытием - берём новую версию
+        return None
+
+
+class PullLog:
+    """Журнал обращений к прайс-листу (SQLite)"""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: Путь к файлу базы (по умолчанию config.feed_pull_log_path)
+        """
+        self.path = path or config.feed_pull_log_path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(PULLS_SCHEMA)
+
+    def record(self, pull: Dict[str, Any]) -> bool:
+        """
+        Записывает обращение
+
+        Args:
+            pull: Поля таблицы feed_pulls
+
+        Returns:
+            bool: True, если Kaspi впервые получил эту версию файла
+        """
+        columns = ', '.join(pull)
+        placeholders = ', '.join('?' for _ in pull)
+        with self._lock, self.conn:
+            first = False
+            if pull.get('kaspi') and pull['status'] in (200, 206):
+                first = self.conn.execute(
+                    'SELECT 1 FROM feed_pulls WHERE kaspi = 1 AND status IN (200, 206) AND etag = ? LIMIT 1',
+                    (pull['etag'],)
+                ).fetchone() is None
+            self.conn.execute(f'INSERT INTO feed_pulls ({columns}) VALUES ({placeholders})', tuple(pull.values()))
+        return first
+
+    def recent(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Последние обращения (для вывода в консоль)"""
+        with self._lock:
+            rows = self.conn.execute('SELECT * FROM feed_pulls ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def deliveries(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Версии прайс-листа и когда Kaspi впервые их забрал"""
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT etag, feed_mtime, MIN(at) AS first_pull, COUNT(*) AS pulls FROM feed_pulls '
+                'WHERE kaspi = 1 AND status IN (200, 206) GROUP BY etag ORDER BY first_pull DESC LIMIT ?',
+                (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self) -> None:
+        """Закрывает соединение с базой"""
+        self.conn.close()
+
+
+def accepts_gzip(header: Optional[str]) -> bool:
+    """True, если клиент принимает gzip (Accept-Encoding без q=0 для gzip)"""
+    for item in (header or '').split(','):
+        name, _, params = item.strip().partition(';')
+        if name.strip().lower() in ('gzip', 'x-gzip', '*'):
+            quality = params.strip()
+            if quality.startswith('q='):
+                try:
+                    return float(quality[2:]) > 0
+                except ValueError:
+                    return False
+            return True
+    return False
+
+
+def parse_range(header: str, size: int) -> Union[Tuple[int, int], bool, None]:
+    """
+    Разбирает заголовок Range для одного диапазона байт
+
+    Args:
+        header: Значение Range, например 'bytes=0-1023' или 'bytes=-500'
+        size: Размер представления
+
+    Returns:
+        (start, end) включительно; None - заголовок не поддерживается и отдаётся весь файл
+        (несколько диапазонов, другие единицы); False - диапазон вне файла (416)
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, dash, last = spec.strip().partition('-')
+    if not dash or not (first or last) or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if not first:  # Последние N байт
+        length = int(last)
+        return (max(size - length, 0), size - 1) if length and size else False
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        return False
+    return start, end
+
+
+def is_kaspi(user_agent: str) -> bool:
+    """Обращение от Kaspi (по подстрокам из config.feed_kaspi_user_agents)"""
+    agent = (user_agent or '').lower()
+    return any(marker.strip().lower() in agent for marker in config.feed_kaspi_user_agents.split(',')
+               if marker.strip())
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    """GET/HEAD прайс-листа с проверкой ETag, gzip и Range"""
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'KaspiFeed/1.0'
+    feed: FeedFile
+    pulls: PullLog
+    url_path = '/'
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logging.getLogger(__name__).debug(format % args)
+
+    def do_GET(self) -> None:
+        self.serve(head=False)
+
+    def do_HEAD(self) -> None:
+        self.serve(head=True)
+
+    def serve(self, head: bool) -> None:
+        if urlsplit(self.path).path not in ('/', self.url_path):
+            self.send_error(404)
+            return
+        compressed = accepts_gzip(self.headers.get('Accept-Encoding'))
+        opened = self.feed.open(compressed)
+        if opened is None:
+            self.send_response(503)
+            self.send_header('Retry-After', str(WATCH_SECONDS * 12))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            self.record(503, 0, None, compressed)
+            return
+
+        f, version = opened
+        with f:
+            etag = version.gzip_etag if compressed else version.etag
+            size = version.gzip_size if compressed else version.size
+            headers = {
+                'ETag': etag,
+                'Last-Modified': formatdate(version.mtime, usegmt=True),
+                'Cache-Control': 'no-cache',  # Кэшировать можно, но перед использованием - сверять ETag
+                'Vary': 'Accept-Encoding',
+                'Accept-Ranges': 'bytes',
+            }
+            if self.not_modified(etag, version.mtime):
+                self.send_headers(304, headers)
+                self.record(304, 0, version, compressed)
+                return
+
+            headers['Content-Type'] = 'application/xml; charset=utf-8'
+            if compressed:
+                headers['Content-Encoding'] = 'gzip'
+            byte_range = self.requested_range(etag, version.mtime, size)
+            if byte_range is False:
+                headers['Content-Range'] = f'bytes */{size}'
+                headers['Content-Length'] = '0'
+                self.send_headers(416, headers)
+                self.record(416, 0, version, compressed)
+                return
+            status, start, end = (206, *byte_range) if byte_range else (200, 0, size - 1)
+            if status == 206:
+                headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+            length = end - start + 1 if size else 0
+            headers['Content-Length'] = str(length)
+            self.send_headers(status, headers)
+
+            sent = 0
+            if not head and length:
+                try:
+                    # socket.sendfile использует os.sendfile: данные идут из кэша ФС прямо в сокет
+                    sent = self.connection.sendfile(f, start, length)
+                except (BrokenPipeError, ConnectionResetError, socket.timeout):
+                    self.close_connection = True
+                    sent = f.tell() - start
+            self.record(status, sent, version, compressed)
+
+    def send_headers(self, status: int, headers: Dict[str, str]) -> None:
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def not_modified(self, etag: str, mtime: float) -> bool:
+        """Проверка If-None-Match, а без него - If-Modified-Since"""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            # Слабое сравнение: W/"..." совпадает с "..."
+            tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+            return '*' in tags or etag in tags
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def requested_range(self, etag: str, mtime: float, size: int) -> Union[Tuple[int, int], bool, None]:
+        """Диапазон из Range с учётом If-Range (если версия сменилась - отдаётся весь файл)"""
+        header = self.headers.get('Range')
+        if not header:
+            return None
+        if_range = self.headers.get('If-Range')
+        if if_range:
+            if_range = if_range.strip()
+            if if_range.startswith('"'):
+                if if_range != etag:  # Для If-Range - только строгое сравнение
+                    return None
+            elif if_range != formatdate(mtime, usegmt=True):
+                return None
+        return parse_range(header, size)
+
+    def record(self, status: int, sent: int, version: Optional[FeedVersion], compressed: bool) -> None:
+        """Записывает обращение в журнал и сообщает, когда Kaspi забрал новую версию"""
+        etag = version.etag if version else None  # Версия файла; gzip отмечается в encoding
+        user_agent = self.headers.get('User-Agent') or ''
+        kaspi = is_kaspi(user_agent)
+        pull = {
+            'at': time.time(),
+            'client': self.client_address[0],
+            'user_agent': user_agent,
+            'kaspi': int(kaspi),
+            'method': self.command,
+            'status': status,
+            'bytes': sent,
+            'etag': etag,
+            'encoding': 'gzip' if compressed else None,
+            'byte_range': self.headers.get('Range'),
+            'feed_mtime': version.mtime if version else None,
+        }
+        logger = logging.getLogger(__name__)
+        try:
+            first = self.pulls.record(pull)
+        except sqlite3.Error as e:
+            logger.error(f'Не удалось записать обращение к прайс-листу: {e}')
+            first = False
+        source = 'Kaspi' if kaspi else self.client_address[0]
+        if first:
+            lag = (pull['at'] - version.mtime) / 60
+            logger.info(f'Kaspi забрал новую версию прайс-листа {etag} '
+                        f'через {lag:.1f} мин после её формирования')
+        else:
+            logger.info(f'{source}: {self.command} {status}, {sent} байт{", gzip" if compressed else ""}, '
+                        f'{etag or "-"} ({user_agent or "-"})')
+
+
+class FeedServer:
+    """Сервер прайс-листа с фоновой подготовкой новых версий"""
+
+    def __init__(self, path: Optional[str] = None, host: Optional[str] = None, port: Optional[int] = None,
+                 pull_log_path: Optional[str] = None):
+        """
+        Args:
+            path: Прайс-лист (по умолчанию config.xml_filename)
+            host: Адрес (по умолчанию config.feed_server_host)
+            port: Порт (по умолчанию config.feed_server_port; 0 - любой свободный)
+            pull_log_path: Журнал обращений (по умолчанию config.feed_pull_log_path)
+        """
+        self.feed = FeedFile(path or config.xml_filename)
+        self.pulls = PullLog(pull_log_path)
+        handler = type('BoundFeedHandler', (FeedHandler,), {
+            'feed': self.feed, 'pulls': self.pulls,
+            'url_path': '/' + os.path.basename(self.feed.path),
+        })
+        self.httpd = ThreadingHTTPServer((host or config.feed_server_host,
+                                          config.feed_server_port if port is None else port), handler)
+        self.httpd.daemon_threads = True
+        self.logger = logging.getLogger(__name__)
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{'127.0.0.1' if host in ('0.0.0.0', '') else host}:{port}/{os.path.basename(self.feed.path)}"
+
+    def _watch(self) -> None:
+        """Готовит ETag и gzip новой версии сразу после её появления, а не при первом запросе"""
+        while not self._stop.wait(WATCH_SECONDS):
+            try:
+                self.feed.current()
+            except OSError as e:
+                self.logger.error(f'Не удалось подготовить прайс-лист: {e}')
+
+    def start(self) -> 'FeedServer':
+        """Запускает сервер в фоновых потоках"""
+        self.feed.current()
+        self._threads = [threading.Thread(target=self.httpd.serve_forever, name='feed-server', daemon=True),
+                         threading.Thread(target=self._watch, name='feed-watch', daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        self.logger.info(f'Прайс-лист доступен по адресу {self.url}')
+        return self
+
+    def stop(self) -> None:
+        """Останавливает сервер и закрывает журнал"""
+        self._stop.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        for thread in self._threads:
+            thread.join()
+        self.pulls.close()
+
+
+def show_pulls(limit: int) -> None:
+    """Выводит версии прайс-листа, которые забрал Kaspi, и последние обращения"""
+    pulls = PullLog()
+    try:
+        print('Версии, полученные Kaspi:')
+        for row in pulls.deliveries(limit):
+            lag = (row['first_pull'] - row['feed_mtime']) / 60 if row['feed_mtime'] else None
+            print(f"  {row['etag']}: сформирована {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(row['feed_mtime']))}, "
+                  f"получена {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(row['first_pull']))}"
+                  f"{f' (через {lag:.1f} мин)' if lag is not None else ''}, обращений {row['pulls']}")
+        print('Последние обращения:')
+        for row in pulls.recent(limit):
+            print(f"  {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(row['at']))} {row['client']} "
+                  f"{row['method']} {row['status']} {row['bytes']} байт {row['etag'] or '-'} "
+                  f"{'[Kaspi] ' if row['kaspi'] else ''}{row['user_agent'] or '-'}")
+    finally:
+        pulls.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP-сервер прайс-листа Kaspi.kz')
+    parser.add_argument('--path', help='Прайс-лист (по умолчанию config.xml_filename)')
+    parser.add_argument('--host', help='Адрес (по умолчанию config.feed_server_host)')
+    parser.add_argument('--port', type=int, help='Порт (по умолчанию config.feed_server_port)')
+    parser.add_argument('--pulls', type=int, metavar='N', help='Показать журнал обращений и выйти')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.pulls:
+        show_pulls(args.pulls)
+        return 0
+
+    server = FeedServer(args.path, args.host, args.port).start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        logging.info('Сервер прайс-листа остановлен')
+    finally:
+        server.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
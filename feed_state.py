@@ -0,0 +1,71 @@
+"""
+Состояние опубликованных прайс-листов
+Хранит хэш секции offers последнего записанного и последнего успешно опубликованного файла,
+чтобы не перезаписывать и не загружать повторно прайс-лист без изменений
+"""
+
+import os
+import logging
+from typing import Optional
+
+from catalog_store import CatalogStore
+from feed_writer import offers_hash_of_file
+
+
+class FeedState:
+    """Хэши прайс-листов в таблице meta локального каталога"""
+
+    def __init__(self, store: Optional[CatalogStore] = None):
+        """
+        Args:
+            store: Локальный каталог (по умолчанию открывается новый CatalogStore)
+        """
+        self.store = store or CatalogStore()
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def _key(kind: str, path: str) -> str:
+        return f"feed:{kind}:{os.path.abspath(path)}"
+
+    def written_hash(self, path: str) -> Optional[str]:
+        """
+        Хэш предложений файла, лежащего на диске
+
+        Если хэш ещё не сохранялся (например, новая машина или CI) или файл менялся
+        в обход FeedState, хэш считается по самому файлу.
+        """
+        if not os.path.exists(path):
+            return None
+        saved = self.store.get_meta(self._key('written', path))
+        if saved:
+            offers_hash, signature = saved.split('|', 1)
+            if signature == self._signature(path):
+                return offers_hash
+        # Файл изменён не нами (или хэш не сохранялся) - считаем по содержимому
+        return offers_hash_of_file(path)
+
+    def mark_written(self, path: str, offers_hash: str) -> None:
+        """Запоминает хэш только что записанного и проверенного файла"""
+        self.store.set_meta(self._key('written', path), f"{offers_hash}|{self._signature(path)}")
+
+    @staticmethod
+    def _signature(path: str) -> str:
+        """Размер и время изменения файла - признак того, что файл не трогали"""
+        stat = os.stat(path)
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    def is_published(self, path: str, target: str) -> bool:
+        """
+        Проверяет, опубликован ли уже текущий файл в target ('kaspi', 'github', ...)
+
+        Returns:
+            bool: True, если предложения не менялись с последней успешной публикации
+        """
+        current = self.written_hash(path)
+        return bool(current) and current == self.store.get_meta(self._key(f'published:{target}', path))
+
+    def mark_published(self, path: str, target: str) -> None:
+        """Запоминает, что текущий файл успешно опубликован в target"""
+        current = self.written_hash(path)
+        if current:
+            self.store.set_meta(self._key(f'published:{target}', path), current)
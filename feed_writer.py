@@ -0,0 +1,247 @@
+"""
+Потоковая запись XML прайс-листа Kaspi.kz
+Предложения записываются в файл по мере поступления товаров, без построения всего дерева в памяти.
+Формат вывода совпадает с прежним ElementTree + minidom.toprettyxml (или компактным tostring)
+"""
+
+import os
+import hashlib
+import logging
+from typing import Callable, Dict, List, Optional
+from xml.etree.ElementTree import Element
+
+
+# Заголовок, который давал toprettyxml(encoding='utf-8')
+UTF8_DECLARATION = '<?xml version="1.0" encoding="utf-8"?>'
+# Заголовок, который давал toprettyxml() без кодировки
+PLAIN_DECLARATION = '<?xml version="1.0" ?>'
+
+# Секция, по которой считается хэш содержимого прайс-листа (без атрибута date и шапки)
+OFFERS_OPEN = '<offers>'
+OFFERS_CLOSE = '</offers>'
+
+
+def _escape_minidom(value: str) -> str:
+    """Экранирование как в xml.dom.minidom (одинаково для текста и атрибутов)"""
+    return (value.replace('&', '&amp;').replace('<', '&lt;')
+                 .replace('"', '&quot;').replace('>', '&gt;'))
+
+
+def _escape_etree_text(value: str) -> str:
+    """Экранирование текста как в xml.etree.ElementTree.tostring"""
+    return value.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _escape_etree_attr(value: str) -> str:
+    """Экранирование атрибутов как в xml.etree.ElementTree.tostring"""
+    return (_escape_etree_text(value).replace('"', '&quot;').replace('\r', '&#13;')
+            .replace('\n', '&#10;').replace('\t', '&#09;'))
+
+
+class KaspiFeedWriter:
+    """
+    Пишет документ kaspi_catalog в файл потоком
+
+    Пример:
+        with KaspiFeedWriter('kaspi_price_list.xml', root_attrs) as writer:
+            writer.write(company_element)
+            writer.start('offers')
+            for offer in offers:
+                writer.write(offer)
+            writer.end()
+    """
+
+    def __init__(self, path: str, root_attrs: Dict[str, str], pretty: bool = True,
+                 declaration: Optional[str] = UTF8_DECLARATION, indent: str = '  ',
+                 root_tag: str = 'kaspi_catalog', keep_if_hash: Optional[str] = None,
+                 tee: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            path: Итоговый путь файла (запись идёт во временный файл и атомарно переименовывается)
+            root_attrs: Атрибуты корневого элемента
+            pretty: True - отступы как у minidom.toprettyxml, False - компактно как ElementTree.tostring
+            declaration: XML-декларация (None - без декларации)
+            indent: Отступ одного уровня для pretty-режима
+            root_tag: Имя корневого элемента
+            keep_if_hash: Хэш секции offers уже лежащего на диске файла; если новый хэш совпал,
+                          файл не перезаписывается (unchanged=True)
+            tee: Получает каждый записанный фрагмент (например, FeedValidation.feed для проверки
+                 документа во время записи)
+        """
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.root_tag = root_tag
+        self.root_attrs = root_attrs
+        self.pretty = pretty
+        self.declaration = declaration
+        self.indent = indent
+        self.logger = logging.getLogger(__name__)
+        self.file = None
+        self.stack: List[str] = []
+        self.keep_if_hash = keep_if_hash
+        self.tee = tee
+        self.unchanged = False
+        self.discarded = False
+        self._digest = hashlib.sha256()
+        self._hashing = False
+
+    def __enter__(self) -> 'KaspiFeedWriter':
+        self.file = open(self.tmp_path, 'w', encoding='utf-8')
+        if self.declaration:
+            self._emit(self.declaration + '\n')
+        self.start(self.root_tag, self.root_attrs)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is not None:
+            self.file.close()
+            os.remove(self.tmp_path)
+            return
+        if self.discarded:
+            # Незавершённый документ не заменяет лежащий на диске файл
+            self.file.close()
+            os.remove(self.tmp_path)
+            return
+        while self.stack:
+            self.end()
+        self.file.close()
+        if self.keep_if_hash and self.keep_if_hash == self.offers_hash and os.path.exists(self.path):
+            # Предложения не изменились - оставляем прежний файл (и прежнюю дату)
+            os.remove(self.tmp_path)
+            self.unchanged = True
+            return
+        os.replace(self.tmp_path, self.path)
+
+    def discard(self) -> None:
+        """Отменяет запись: при выходе из with временный файл удаляется, прежний файл остаётся"""
+        self.discarded = True
+
+    @property
+    def offers_hash(self) -> str:
+        """SHA-256 секции <offers>...</offers> в том виде, в каком она записана в файл"""
+        return self._digest.hexdigest()
+
+    def _emit(self, text: str) -> None:
+        """Записывает готовый фрагмент в файл"""
+        self.file.write(text)
+        if self.tee is not None:
+            self.tee(text)
+        if self._hashing:
+            self._digest.update(text.encode('utf-8'))
+
+    def _attrs(self, attrs: Optional[Dict[str, str]]) -> str:
+        """Сериализует атрибуты в нужном стиле"""
+        if not attrs:
+            return ''
+        items = list(attrs.items())
+        if self.pretty:
+            # minidom при разборе ставит объявления пространств имён первыми
+            items = ([item for item in items if item[0].startswith('xmlns')] +
+                     [item for item in items if not item[0].startswith('xmlns')])
+            return ''.join(f' {name}="{_escape_minidom(str(value))}"' for name, value in items)
+        return ''.join(f' {name}="{_escape_etree_attr(str(value))}"' for name, value in items)
+
+    def start(self, tag: str, attrs: Optional[Dict[str, str]] = None) -> None:
+        """Открывает контейнерный элемент (например, offers)"""
+        prefix = self.indent * len(self.stack) if self.pretty else ''
+        newline = '\n' if self.pretty else ''
+        self._emit(prefix)
+        if tag == 'offers' and not attrs:
+            self._hashing = True  # Хэш считается с открывающего тега offers
+        self._emit(f"<{tag}{self._attrs(attrs)}>{newline}")
+        self.stack.append(tag)
+
+    def end(self) -> None:
+        """Закрывает последний открытый контейнерный элемент"""
+        tag = self.stack.pop()
+        prefix = self.indent * len(self.stack) if self.pretty else ''
+        newline = '\n' if self.pretty else ''
+        self._emit(f"{prefix}</{tag}>")
+        if tag == 'offers':
+            self._hashing = False  # ...и заканчивается закрывающим тегом
+        self._emit(newline)
+
+    def write(self, element: Element) -> None:
+        """
+        Записывает готовый элемент (с вложенными элементами) на текущем уровне
+
+        Args:
+            element: Небольшое поддерево ElementTree, например один offer
+        """
+        parts: List[str] = []
+        if self.pretty:
+            self._serialize_pretty(element, len(self.stack), parts)
+        else:
+            self._serialize_compact(element, parts)
+        self._emit(''.join(parts))
+
+    def _serialize_pretty(self, element: Element, level: int, parts: List[str]) -> None:
+        """Сериализация в стиле minidom.toprettyxml"""
+        prefix = self.indent * level
+        head = f"{prefix}<{element.tag}{self._attrs(element.attrib)}"
+        if len(element):
+            parts.append(head + '>\n')
+            for child in element:
+                self._serialize_pretty(child, level + 1, parts)
+            parts.append(f"{prefix}</{element.tag}>\n")
+        elif element.text:
+            parts.append(f"{head}>{_escape_minidom(element.text)}</{element.tag}>\n")
+        else:
+            parts.append(head + '/>\n')
+
+    def _serialize_compact(self, element: Element, parts: List[str]) -> None:
+        """Сериализация в стиле ElementTree.tostring"""
+        head = f"<{element.tag}{self._attrs(element.attrib)}"
+        if len(element) or element.text:
+            parts.append(head + '>')
+            if element.text:
+                parts.append(_escape_etree_text(element.text))
+            for child in element:
+                self._serialize_compact(child, parts)
+            parts.append(f"</{element.tag}>")
+        else:
+            parts.append(head + ' />')
+
+
+def offers_hash_of_file(path: str, chunk_size: int = 1 << 20) -> Optional[str]:
+    """
+    Считает тот же хэш секции offers, что и KaspiFeedWriter, по уже записанному файлу.
+    Файл читается блоками, без разбора XML.
+
+    Args:
+        path: Путь к XML файлу
+        chunk_size: Размер блока чтения
+
+    Returns:
+        Optional[str]: SHA-256 секции или None, если файла или секции нет
+    """
+    if not os.path.exists(path):
+        return None
+
+    open_tag = OFFERS_OPEN.encode('utf-8')
+    close_tag = OFFERS_CLOSE.encode('utf-8')
+    digest = hashlib.sha256()
+    buffer = b''
+    inside = False
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            buffer += chunk
+            if not inside:
+                start = buffer.find(open_tag)
+                if start == -1:
+                    if not chunk:
+                        return None
+                    buffer = buffer[-(len(open_tag) - 1):]  # Тег может быть разрезан границей блока
+                    continue
+                buffer = buffer[start:]
+                inside = True
+            end = buffer.find(close_tag)
+            if end != -1:
+                digest.update(buffer[:end + len(close_tag)])
+                return digest.hexdigest()
+            if not chunk:
+                return None
+            keep = len(close_tag) - 1
+            digest.update(buffer[:-keep])
+            buffer = buffer[-keep:]
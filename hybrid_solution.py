@@ -21,10 +21,10 @@ def create_hybrid_solution():
     # Импортируем нашу функцию генерации XML
     import sys
     sys.path.append('.')
-    from Script import get_al_style_products, update_kaspi_prices_stock
+    from Script import get_local_products, update_kaspi_prices_stock
     
-    print("📦 Получение товаров из Al-Style...")
-    products = get_al_style_products()
+    print("📦 Получение товаров из локального каталога Al-Style...")
+    products = get_local_products()
     
     if not products:
         print("❌ Не удалось получить товары")
@@ -0,0 +1,288 @@
+"""
+Отслеживание обработки загруженных прайс-листов Kaspi.kz
+Код загрузки из ответа на POST сохраняется в SQLite (режим WAL), результат импорта
+(/shop/api/products/import/result) опрашивается с экспоненциально растущим интервалом
+(задачей демона или ограниченное время в конце разового запуска),
+итоговые счётчики принятых и отклонённых предложений записываются в базу
+"""
+
+import json
+import time
+import sqlite3
+import logging
+from typing import List, Dict, Any, Optional
+
+import requests
+
+from config import config
+
+
+# Статусы загрузки в журнале
+STATUS_PENDING = 'PENDING'        # Kaspi ещё обрабатывает загрузку
+STATUS_FINISHED = 'FINISHED'      # Результат получен
+STATUS_ABANDONED = 'ABANDONED'    # Результат не получен за kaspi_import_poll_max_hours
+
+# Статусы Kaspi, при которых обработка ещё не закончена
+KASPI_PROCESSING_STATUSES = ('UPLOADED', 'PROCESSING', 'IN_PROGRESS', 'QUEUED')
+
+# Сколько отклонённых SKU выводить в лог
+MAX_LOGGED_REJECTS = 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS imports (
+    code TEXT PRIMARY KEY,
+    feed_path TEXT,
+    offers_hash TEXT,
+    status TEXT NOT NULL,
+    uploaded_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_check_at REAL NOT NULL,
+    checked_at REAL,
+    finished_at REAL,
+    total INTEGER,
+    errors INTEGER,
+    warnings INTEGER,
+    skipped INTEGER,
+    accepted INTEGER,
+    result TEXT,
+    note TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_imports_pending ON imports (next_check_at) WHERE status = 'PENDING';
+"""
+
+
+def import_code(response: requests.Response) -> Optional[str]:
+    """
+    Код загрузки из ответа Kaspi на загрузку прайс-листа
+
+    Returns:
+        Optional[str]: Код или None, если в ответе его нет
+    """
+    try:
+        body = response.json()
+    except ValueError:
+        return None
+    if isinstance(body, dict):
+        data = body.get('data')
+        code = body.get('code') or (data.get('id') if isinstance(data, dict) else None)
+        return str(code) if code else None
+    return None
+
+
+def _to_int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ImportTracker:
+    """Журнал загрузок прайс-листа и опрос их результата"""
+
+    def __init__(self, path: Optional[str] = None, session: Optional[requests.Session] = None):
+        """
+        Args:
+            path: Путь к файлу базы (по умолчанию config.import_tracker_path)
+            session: HTTP-сессия для запросов к Kaspi (по умолчанию новая)
+        """
+        self.path = path or config.import_tracker_path
+        self.logger = logging.getLogger(__name__)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+        self.session = session or requests.Session()
+        self.session.headers.update({
+            'User-Agent': config.user_agent,
+            'Accept': 'application/json',
+            'X-Auth-Token': config.kaspi_token,
+        })
+
+    def record_upload(self, code: str, feed_path: Optional[str] = None, offers_hash: Optional[str] = None) -> None:
+        """
+        Записывает новую загрузку; первая проверка - через kaspi_import_poll_initial_seconds
+
+        Args:
+            code: Код загрузки из ответа Kaspi
+            feed_path: Загруженный файл
+            offers_hash: Хэш предложений загруженного файла
+        """
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR IGNORE INTO imports (code, feed_path, offers_hash, status, uploaded_at, next_check_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (code, feed_path, offers_hash, STATUS_PENDING, now, now + config.kaspi_import_poll_initial_seconds)
+            )
+        self.logger.info(f'Загрузка {code} записана, результат будет проверяться до завершения обработки')
+
+    def _backoff(self, attempts: int) -> float:
+        """Интервал до следующей проверки: initial, 2*initial, 4*initial ... не больше max"""
+        return min(config.kaspi_import_poll_initial_seconds * 2 ** attempts, config.kaspi_import_poll_max_seconds)
+
+    def due(self, now: Optional[float] = None) -> List[sqlite3.Row]:
+        """Незавершённые загрузки, которые пора проверить"""
+        now = time.time() if now is None else now
+        return self.conn.execute(
+            'SELECT * FROM imports WHERE status = ? AND next_check_at <= ? ORDER BY next_check_at',
+            (STATUS_PENDING, now)
+        ).fetchall()
+
+    def next_check_in(self) -> Optional[float]:
+        """Через сколько секунд следующая проверка (None - незавершённых загрузок нет)"""
+        row = self.conn.execute(
+            'SELECT MIN(next_check_at) AS next_check_at FROM imports WHERE status = ?', (STATUS_PENDING,)
+        ).fetchone()
+        if row['next_check_at'] is None:
+            return None
+        return max(row['next_check_at'] - time.time(), 0.0)
+
+    def check(self, row: sqlite3.Row) -> str:
+        """
+        Один запрос результата загрузки
+
+        Args:
+            row: Строка таблицы imports
+
+        Returns:
+            str: Новый статус загрузки в журнале
+        """
+        code = row['code']
+        now = time.time()
+        attempts = row['attempts'] + 1
+        result: Optional[Dict[str, Any]] = None
+        note = None
+        try:
+            response = self.session.get(config.kaspi_import_result_url, params={'i': code},
+                                        timeout=config.request_timeout)
+            if response.status_code == 200:
+                result = response.json()
+            else:
+                note = f'HTTP {response.status_code}'
+        except (requests.exceptions.RequestException, ValueError) as e:
+            note = str(e)
+
+        if result is not None and not self._processing(result):
+            self._finish(code, result, now)
+            return STATUS_FINISHED
+
+        if now - row['uploaded_at'] > config.kaspi_import_poll_max_hours * 3600:
+            with self.conn:
+                self.conn.execute(
+                    'UPDATE imports SET status = ?, attempts = ?, checked_at = ?, note = ? WHERE code = ?',
+                    (STATUS_ABANDONED, attempts, now, note, code)
+                )
+            self.logger.error(f'Результат загрузки {code} не получен за {config.kaspi_import_poll_max_hours} ч')
+            return STATUS_ABANDONED
+
+        with self.conn:
+            self.conn.execute(
+                'UPDATE imports SET attempts = ?, checked_at = ?, next_check_at = ?, note = ? WHERE code = ?',
+                (attempts, now, now + self._backoff(attempts), note, code)
+            )
+        self.logger.info(f'Загрузка {code} ещё обрабатывается{f" ({note})" if note else ""}')
+        return STATUS_PENDING
+
+    @staticmethod
+    def _processing(result: Dict[str, Any]) -> bool:
+        """True, если Kaspi ещё не закончил обработку загрузки"""
+        if str(result.get('status') or '').upper() in KASPI_PROCESSING_STATUSES:
+            return True
+        offers = result.get('result')
+        if isinstance(offers, dict):
+            return any(isinstance(offer, dict) and str(offer.get('state') or '').upper() in KASPI_PROCESSING_STATUSES
+                       for offer in offers.values())
+        return False
+
+    def _finish(self, code: str, result: Dict[str, Any], now: float) -> None:
+        """Сохраняет итоговые счётчики загрузки и сообщает об отклонённых предложениях"""
+        total = _to_int(result.get('total'))
+        errors = _to_int(result.get('errors')) or 0
+        warnings = _to_int(result.get('warnings')) or 0
+        skipped = _to_int(result.get('skipped')) or 0
+        accepted = max(total - errors - skipped, 0) if total is not None else None
+        with self.conn:
+            self.conn.execute(
+                'UPDATE imports SET status = ?, attempts = attempts + 1, checked_at = ?, finished_at = ?, '
+                'total = ?, errors = ?, warnings = ?, skipped = ?, accepted = ?, result = ?, note = NULL '
+                'WHERE code = ?',
+                (STATUS_FINISHED, now, now, total, errors, warnings, skipped, accepted,
+                 json.dumps(result, ensure_ascii=False), code)
+            )
+
+        summary = (f'Загрузка {code} обработана: всего {total}, принято {accepted}, '
+                   f'ошибок {errors}, предупреждений {warnings}, пропущено {skipped}')
+        if errors or skipped:
+            self.logger.warning(summary)
+            offers = result.get('result')
+            if isinstance(offers, dict):
+                rejected = [sku for sku, offer in offers.items()
+                            if isinstance(offer, dict) and str(offer.get('state') or '').upper() != 'FINISHED']
+                if rejected:
+                    self.logger.warning(f"Отклонённые SKU: {', '.join(rejected[:MAX_LOGGED_REJECTS])}"
+                                        f"{' ...' if len(rejected) > MAX_LOGGED_REJECTS else ''}")
+        else:
+            self.logger.info(summary)
+
+    def poll_due(self) -> int:
+        """
+        Проверяет все загрузки, для которых подошло время
+
+        Returns:
+            int: Сколько загрузок проверено
+        """
+        rows = self.due()
+        for row in rows:
+            self.check(row)
+        return len(rows)
+
+    def recent(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Последние загрузки (для вывода в консоль)"""
+        rows = self.conn.execute(
+            'SELECT code, feed_path, status, uploaded_at, total, accepted, errors, warnings, skipped '
+            'FROM imports ORDER BY uploaded_at DESC LIMIT ?', (limit,)
+        )
+        return [dict(row) for row in rows]
+
+    def close(self) -> None:
+        """Закрывает соединение с базой и HTTP-сессию"""
+        self.conn.close()
+        self.session.close()
+
+
+def wait_for_results(timeout: float, path: Optional[str] = None) -> int:
+    """
+    Опрашивает результаты незавершённых загрузок в текущем потоке, но не дольше timeout секунд
+
+    Для разовых запусков (python Script.py, CI): фоновый поток завершился бы вместе с процессом.
+    Загрузки, не обработанные за это время, остаются в журнале и проверяются следующим
+    запуском, задачей демона sync_daemon или режимом import-status.
+
+    Args:
+        timeout: Сколько секунд ждать (0 - не ждать)
+        path: Путь к журналу загрузок (по умолчанию config.import_tracker_path)
+
+    Returns:
+        int: Сколько загрузок осталось незавершёнными
+    """
+    deadline = time.monotonic() + max(timeout, 0)
+    tracker = ImportTracker(path)
+    try:
+        while True:
+            tracker.poll_due()
+            wait = tracker.next_check_in()
+            if wait is None:
+                return 0
+            if time.monotonic() + wait > deadline:
+                break
+            time.sleep(wait)
+        pending = tracker.conn.execute(
+            'SELECT COUNT(*) AS count FROM imports WHERE status = ?', (STATUS_PENDING,)
+        ).fetchone()['count']
+    finally:
+        tracker.close()
+    logging.getLogger(__name__).info(f'Результат загрузки ещё не готов (незавершённых: {pending}) - '
+                                     'будет проверен следующим запуском или демоном')
+    return pending
@@ -0,0 +1,310 @@
+"""
+Загрузка заказов Kaspi.kz вместе с составом и кодами товаров
+Использует составные документы JSON:API (заказы сразу со строками и товарами строк) и кэш
+кодов товаров по id: товар, которого нет в included, запрашивается один раз, даже если он
+нужен нескольким потокам одновременно.
+Заказы забираются со всех страниц, период длиннее 14 дней делится на окна
+"""
+
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import config, KASPI_HEADERS
+
+
+# Связанные ресурсы, которые просим вернуть в included вместе с основным ответом
+INCLUDE_ORDERS = 'entries,entries.product'  # include[orders]: состав заказа и товары строк
+INCLUDE_ENTRIES = 'product'     # include[orderentries]: товар строки заказа
+
+# Миллисекунд в сутках (creationDate в Kaspi API - unix-время в миллисекундах)
+DAY_MS = 24 * 60 * 60 * 1000
+
+IncludedIndex = Dict[Tuple[str, str], Dict[str, Any]]
+
+
+def order_windows(since_ms: int, until_ms: int, max_days: Optional[int] = None) -> Iterator[Tuple[int, int]]:
+    """
+    Делит период на последовательные окна, каждое не длиннее допустимого фильтра creationDate
+
+    Args:
+        since_ms: Начало периода (включительно), мс
+        until_ms: Конец периода (включительно), мс
+        max_days: Максимальная длина окна в днях (по умолчанию config.kaspi_date_range_days)
+
+    Yields:
+        Tuple[int, int]: Границы окна ($ge, $le)
+    """
+    span = (config.kaspi_date_range_days if max_days is None else max_days) * DAY_MS
+    start = since_ms
+    while start <= until_ms:
+        end = min(start + span, until_ms)
+        yield start, end
+        start = end + 1
+
+
+def index_included(document: Dict[str, Any], index: Optional[IncludedIndex] = None) -> IncludedIndex:
+    """
+    Раскладывает ресурсы из included по (type, id)
+
+    Args:
+        document: Ответ Kaspi API в формате JSON:API
+        index: Существующий индекс, который нужно дополнить
+
+    Returns:
+        IncludedIndex: {(type, id): ресурс}
+    """
+    index = {} if index is None else index
+    for resource in document.get('included') or []:
+        if resource.get('type') and resource.get('id'):
+            index[(resource['type'], resource['id'])] = resource
+    return index
+
+
+class KaspiOrdersClient:
+    """Клиент заказов Kaspi.kz на общей requests.Session с кэшем кодов товаров на время запуска"""
+
+    def __init__(self, timeout: Optional[float] = None, max_concurrent_pages: Optional[int] = None,
+                 max_pool_size: int = 4):
+        """
+        Args:
+            timeout: Таймаут запроса в секундах (по умолчанию config.request_timeout)
+            max_concurrent_pages: Сколько страниц окна запрашивать параллельно
+                                  (по умолчанию config.kaspi_max_concurrent_pages)
+            max_pool_size: Сколько соединений держать открытыми для параллельных запросов
+        """
+        self.timeout = config.request_timeout if timeout is None else timeout
+        self.max_concurrent_pages = max(1, config.kaspi_max_concurrent_pages
+                                        if max_concurrent_pages is None else max_concurrent_pages)
+        self.logger = logging.getLogger(__name__)
+        self.product_codes: Dict[str, str] = {}  # id товара (masterproducts) -> код товара
+        self._product_lookups: Dict[str, Future] = {}  # Запросы товаров, которые уже выполняются
+        self._product_lock = threading.Lock()
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.headers.update(KASPI_HEADERS)
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+        self.session.headers['Connection'] = 'keep-alive'
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(max_pool_size, self.max_concurrent_pages))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def reset_run(self) -> None:
+        """
+        Начинает новый цикл: обнуляет счётчик запросов и кэш кодов товаров
+
+        Клиент живёт между циклами демона, поэтому без сброса кэш рос бы без ограничений,
+        а счётчики в логе были бы накопительными.
+        """
+        with self._count_lock:
+            self.request_count = 0
+        with self._product_lock:
+            self.product_codes.clear()  # Выполняющиеся запросы (_product_lookups) завершатся сами
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None) -> requests.Response:
+        """GET-запрос к Kaspi API"""
+        with self._count_lock:
+            self.request_count += 1
+        return self.session.get(url, params=params, timeout=self.timeout)
+
+    def post(self, url: str, json: Dict[str, Any]) -> requests.Response:
+        """POST-запрос к Kaspi API"""
+        with self._count_lock:
+            self.request_count += 1
+        return self.session.post(url, json=json, timeout=self.timeout)
+
+    def get_orders(self, params: Dict[str, Any]) -> requests.Response:
+        """
+        Запрашивает страницу заказов вместе с составом и товарами строк (include[orders]=entries,entries.product)
+
+        Args:
+            params: Параметры фильтра и пагинации
+
+        Returns:
+            requests.Response: Ответ Kaspi API
+        """
+        query = dict(params)
+        query.setdefault('include[orders]', INCLUDE_ORDERS)
+        return self.get(config.kaspi_orders_url, params=query)
+
+    def get_order(self, order_id: str) -> Dict[str, Any]:
+        """
+        Текущее состояние одного заказа (для сверки журнала с Kaspi)
+
+        Args:
+            order_id: id заказа Kaspi
+
+        Returns:
+            Dict[str, Any]: Заказ (requests.HTTPError при ответе не 200)
+        """
+        response = self.get(f'{config.kaspi_orders_url}/{order_id}')
+        response.raise_for_status()
+        return response.json()['data']
+
+    def _get_page(self, params: Dict[str, Any], number: int) -> Dict[str, Any]:
+        """Одна страница заказов (requests.HTTPError при ответе не 200)"""
+        response = self.get_orders({**params, 'page[number]': number})
+        response.raise_for_status()
+        return response.json()
+
+    def _window_pages(self, filters: Dict[str, Any], since_ms: int, until_ms: int) -> List[Dict[str, Any]]:
+        """
+        Все страницы одного окна: первая страница сообщает meta.pageCount,
+        остальные запрашиваются параллельно (не более max_concurrent_pages одновременно)
+        """
+        params = {
+            'page[size]': config.kaspi_page_size,
+            'filter[orders][creationDate][$ge]': str(since_ms),
+            'filter[orders][creationDate][$le]': str(until_ms),
+            **filters
+        }
+        first = self._get_page(params, 0)
+        documents = [first]
+        page_count = (first.get('meta') or {}).get('pageCount')
+
+        if page_count is None:
+            # Без meta идём по страницам, пока не придёт неполная
+            number = 0
+            while len(documents[-1].get('data') or []) >= config.kaspi_page_size:
+                number += 1
+                documents.append(self._get_page(params, number))
+            return documents
+
+        remaining = range(1, int(page_count))
+        if remaining:
+            workers = min(self.max_concurrent_pages, len(remaining))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                documents.extend(pool.map(lambda number: self._get_page(params, number), remaining))
+        return documents
+
+    def fetch_orders(self, filters: Dict[str, Any], since_ms: int,
+                     until_ms: int) -> Tuple[List[Dict[str, Any]], IncludedIndex]:
+        """
+        Забирает все заказы за период: все страницы каждого окна creationDate
+
+        Args:
+            filters: Дополнительные фильтры, например {'filter[orders][status]': 'APPROVED_BY_BANK'}
+            since_ms: Начало периода, мс
+            until_ms: Конец периода, мс
+
+        Returns:
+            Tuple[List[Dict[str, Any]], IncludedIndex]: Заказы (без повторов) и индекс included
+        """
+        orders: Dict[str, Dict[str, Any]] = {}
+        included: IncludedIndex = {}
+        for window_start, window_end in order_windows(since_ms, until_ms):
+            documents = self._window_pages(filters, window_start, window_end)
+            for document in documents:
+                for order in document.get('data') or []:
+                    orders.setdefault(order['id'], order)
+                index_included(document, included)
+            self.logger.info(f"Окно {window_start}-{window_end}: страниц {len(documents)}")
+        return list(orders.values()), included
+
+    def order_entries(self, order: Dict[str, Any], included: IncludedIndex) -> List[Dict[str, Any]]:
+        """
+        Состав заказа: из included, а если Kaspi его не вернул - одним запросом
+        (сразу с товарами строк, include[orderentries]=product)
+
+        Args:
+            order: Заказ из ответа get_orders
+            included: Индекс included (дополняется ответом запроса состава)
+
+        Returns:
+            List[Dict[str, Any]]: Строки заказа (orderentries)
+        """
+        relationship = order['relationships']['entries']
+        refs = relationship.get('data')
+        if isinstance(refs, list):
+            entries = [included.get((ref['type'], ref['id'])) for ref in refs]
+            if all(entries):
+                return entries
+
+        response = self.get(relationship['links']['related'], params={'include[orderentries]': INCLUDE_ENTRIES})
+        response.raise_for_status()
+        document = response.json()
+        index_included(document, included)
+        return document.get('data', [])
+
+    def product_code(self, entry: Dict[str, Any], included: IncludedIndex) -> str:
+        """
+        Код товара строки заказа: из кэша, из included или отдельным запросом (один раз на товар,
+        параллельные потоки ждут уже начатый запрос того же товара)
+
+        Args:
+            entry: Строка заказа (orderentries)
+            included: Индекс included
+
+        Returns:
+            str: Код товара в Kaspi
+        """
+        relationship = entry['relationships']['product']
+        ref = relationship.get('data') or {}
+        product_id = ref.get('id')
+        if not product_id:
+            # Без id товар не закэшировать - запрашиваем по ссылке
+            return self._fetch_product(relationship)['attributes']['code']
+
+        with self._product_lock:
+            code = self.product_codes.get(product_id)
+            if code is not None:
+                return code
+            product = included.get((ref.get('type'), product_id))
+            if product is not None:
+                code = self.product_codes[product_id] = product['attributes']['code']
+                return code
+            lookup = self._product_lookups.get(product_id)
+            owner = lookup is None
+            if owner:
+                lookup = self._product_lookups[product_id] = Future()
+
+        if not owner:
+            return lookup.result()
+        try:
+            code = self._fetch_product(relationship)['attributes']['code']
+        except Exception as e:
+            with self._product_lock:
+                del self._product_lookups[product_id]
+            lookup.set_exception(e)
+            raise
+        with self._product_lock:
+            self.product_codes[product_id] = code
+            del self._product_lookups[product_id]
+        lookup.set_result(code)
+        return code
+
+    def _fetch_product(self, relationship: Dict[str, Any]) -> Dict[str, Any]:
+        """Товар строки заказа отдельным запросом"""
+        response = self.get(relationship['links']['related'])
+        response.raise_for_status()
+        return response.json()['data']
+
+    def order_lines(self, order: Dict[str, Any], included: IncludedIndex) -> List[Dict[str, Any]]:
+        """
+        Строки заказа с кодами товаров
+
+        Args:
+            order: Заказ из ответа get_orders
+            included: Индекс included
+
+        Returns:
+            List[Dict[str, Any]]: [{'entry_id': ..., 'product_code': ..., 'quantity': ...}]
+        """
+        lines = []
+        for entry in self.order_entries(order, included):
+            lines.append({
+                'entry_id': entry['id'],
+                'product_code': self.product_code(entry, included),
+                'quantity': entry['attributes']['quantity']
+            })
+        return lines
+
+    def close(self) -> None:
+        """Закрывает пул соединений"""
+        self.session.close()
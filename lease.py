@@ -0,0 +1,227 @@
+"""
+Аренда (lease) права на синхронизацию между процессами загрузчика на одном сервере
+Запись об аренде хранится в локальной базе SQLite (режим WAL): кто держит аренду,
+до какого времени и её номер. Номер растёт при каждой смене владельца, поэтому процесс,
+потерявший аренду (например, после долгой паузы), узнаёт об этом перед действием
+с побочными эффектами и не выполняет его. Просроченную аренду забирает любой другой процесс.
+
+Ограничения: аренда только локальная. WAL и блокировки SQLite ненадёжны на сетевых
+дисках (NFS, SMB), поэтому базу нельзя класть на общий диск для нескольких серверов -
+два сервера могут одновременно считать аренду своей. Номер аренды сверяется только
+с этой же базой (fencing_ok) и не передаётся в Al-Style или Kaspi, поэтому он сужает
+окно гонки, но не защищает от запроса, уже отправленного процессом без аренды
+"""
+
+import os
+import time
+import socket
+import sqlite3
+import logging
+import threading
+from typing import Dict, Any, Optional
+
+from config import config
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    token INTEGER NOT NULL,
+    acquired_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+# Аренда, которую держит текущий процесс (для проверок перед загрузкой и списанием остатков)
+_active_lease: Optional['Lease'] = None
+
+
+class LeaseUnavailable(Exception):
+    """Аренду держит другой узел"""
+
+
+def default_holder() -> str:
+    """Имя держателя: NODE_ID или хост:pid"""
+    return config.node_id or f'{socket.gethostname()}:{os.getpid()}'
+
+
+class Lease:
+    """Аренда с ограниченным сроком, продлением в фоне и номером (только для процессов одного сервера)"""
+
+    def __init__(self, name: str = 'sync', path: Optional[str] = None, ttl: Optional[float] = None,
+                 holder: Optional[str] = None):
+        """
+        Args:
+            name: Имя аренды (одна аренда - одна защищаемая работа)
+            path: Путь к файлу базы (по умолчанию config.lease_db_path)
+            ttl: Срок аренды в секундах без продления (по умолчанию config.lease_ttl_seconds)
+            holder: Имя этого узла (по умолчанию default_holder())
+        """
+        self.name = name
+        self.path = path or config.lease_db_path
+        self.ttl = config.lease_ttl_seconds if ttl is None else ttl
+        self.holder = holder or default_holder()
+        self.token: Optional[int] = None  # Номер аренды, пока мы её держим
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._heartbeat: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        # isolation_level=None: транзакции открываем сами (BEGIN IMMEDIATE)
+        self.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+
+    @property
+    def held(self) -> bool:
+        """Держим ли аренду (по последнему захвату или продлению)"""
+        return self.token is not None
+
+    def _row(self) -> Optional[sqlite3.Row]:
+        return self.conn.execute('SELECT * FROM leases WHERE name = ?', (self.name,)).fetchone()
+
+    def acquire(self) -> bool:
+        """
+        Захватывает свободную или просроченную аренду либо продлевает свою
+
+        Returns:
+            bool: True, если аренда теперь наша
+        """
+        global _active_lease
+        with self._lock:
+            now = time.time()
+            self.conn.execute('BEGIN IMMEDIATE')  # Блокирует запись для других узлов до COMMIT
+            try:
+                row = self._row()
+                if row is None:
+                    token = 1
+                    self.conn.execute(
+                        'INSERT INTO leases (name, holder, token, acquired_at, expires_at) VALUES (?, ?, ?, ?, ?)',
+                        (self.name, self.holder, token, now, now + self.ttl)
+                    )
+                elif row['holder'] == self.holder and row['token'] == self.token and row['expires_at'] > now:
+                    token = row['token']  # Продление своей аренды
+                    self.conn.execute('UPDATE leases SET expires_at = ? WHERE name = ?', (now + self.ttl, self.name))
+                elif row['expires_at'] <= now:
+                    token = row['token'] + 1  # Забираем просроченную аренду - номер растёт
+                    self.conn.execute(
+                        'UPDATE leases SET holder = ?, token = ?, acquired_at = ?, expires_at = ? WHERE name = ?',
+                        (self.holder, token, now, now + self.ttl, self.name)
+                    )
+                    if row['holder'] != self.holder and row['expires_at']:  # 0 - аренду освободили сами
+                        self.logger.warning(f"Аренда {self.name} узла {row['holder']} истекла, забираем её")
+                else:
+                    self.conn.execute('ROLLBACK')
+                    self._lost()
+                    return False
+                self.conn.execute('COMMIT')
+            except sqlite3.Error:
+                self.conn.execute('ROLLBACK')
+                raise
+
+            if self.token != token:
+                self.logger.info(f'Аренда {self.name} получена: узел {self.holder}, номер {token}')
+            self.token = token
+            _active_lease = self
+            return True
+
+    def is_valid(self) -> bool:
+        """Проверяет по базе, что аренда всё ещё наша и номер не сменился (перед действием с побочным эффектом)"""
+        if self.token is None:
+            return False
+        with self._lock:
+            row = self._row()
+        return (row is not None and row['holder'] == self.holder and row['token'] == self.token
+                and row['expires_at'] > time.time())
+
+    def _lost(self) -> None:
+        if self.token is not None:
+            self.logger.error(f'Аренда {self.name} потеряна (номер {self.token})')
+        self.token = None
+
+    def owner(self) -> Optional[Dict[str, Any]]:
+        """Текущий владелец аренды (None, если аренды нет или она просрочена)"""
+        with self._lock:
+            row = self._row()
+        if row is None or row['expires_at'] <= time.time():
+            return None
+        return dict(row)
+
+    def release(self) -> None:
+        """Освобождает аренду, чтобы другой узел мог взять её сразу, не дожидаясь срока"""
+        global _active_lease
+        self.stop_heartbeat()
+        with self._lock:
+            if self.token is not None:
+                # Срок обнуляется, номер остаётся: следующий владелец получит номер больше
+                self.conn.execute('UPDATE leases SET expires_at = 0 WHERE name = ? AND holder = ? AND token = ?',
+                                  (self.name, self.holder, self.token))
+                self.logger.info(f'Аренда {self.name} освобождена')
+            self.token = None
+        if _active_lease is self:
+            _active_lease = None
+
+    def start_heartbeat(self) -> None:
+        """Продлевает аренду в фоновом потоке каждые ttl/3 секунд"""
+        if self._heartbeat is not None:
+            return
+        self._stop.clear()
+
+        def beat() -> None:
+            while not self._stop.wait(self.ttl / 3):
+                try:
+                    if not self.acquire():
+                        return
+                except sqlite3.Error as e:
+                    self.logger.error(f'Не удалось продлить аренду {self.name}: {e}')
+
+        self._heartbeat = threading.Thread(target=beat, name=f'lease-{self.name}', daemon=True)
+        self._heartbeat.start()
+
+    def stop_heartbeat(self) -> None:
+        if self._heartbeat is not None:
+            self._stop.set()
+            self._heartbeat.join()
+            self._heartbeat = None
+
+    def close(self) -> None:
+        """Освобождает аренду и закрывает соединение с базой"""
+        self.release()
+        self.conn.close()
+
+    def __enter__(self) -> 'Lease':
+        if not self.acquire():
+            owner = self.owner()
+            self.conn.close()
+            raise LeaseUnavailable(f"Аренду {self.name} держит {owner['holder'] if owner else 'другой узел'}")
+        self.start_heartbeat()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+def active_lease() -> Optional[Lease]:
+    """Аренда, которую держит текущий процесс (None, если процесс работает без аренды)"""
+    return _active_lease
+
+
+def fencing_ok(action: str) -> bool:
+    """
+    Проверка перед действием с побочным эффектом (загрузка прайс-листа, списание остатков)
+
+    Номер аренды сверяется с локальной базой аренды; внешней стороне он не передаётся.
+
+    Args:
+        action: Что собираемся сделать (для лога)
+
+    Returns:
+        bool: False, если процесс работал по аренде и потерял её - действие выполнять нельзя
+    """
+    lease = _active_lease
+    if lease is None or lease.is_valid():
+        return True
+    logging.getLogger(__name__).error(f'{action}: аренда {lease.name} потеряна (номер {lease.token}), пропускаем')
+    return False
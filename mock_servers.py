@@ -0,0 +1,746 @@
+"""
+Локальные заглушки API Al-Style и Kaspi.kz для нагрузочного тестирования
+Позволяют прогнать полный запуск Script.py без сети: каталог любого размера,
+заказы с составом, загрузка прайс-листа и результат импорта. Задержка ответа,
+доля ошибок и ограничение частоты запросов настраиваются отдельно для каждого API.
+
+Пример:
+    python mock_servers.py --products 100000 --orders 500 --al-style-rate 0.2 --kaspi-latency-ms 80
+
+    AL_STYLE_API_URL=http://127.0.0.1:8801/api KASPI_BASE_URL=http://127.0.0.1:8802 \\
+    XML_SCHEMA_URL=http://127.0.0.1:8802/kaspishopping.xsd AL_STYLE_TOKEN=mock KASPI_TOKEN=mock \\
+    REQUEST_DELAY=0 python Script.py
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import logging
+import argparse
+import threading
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+from urllib.parse import urlparse, parse_qs
+
+
+# Первый артикул сгенерированного каталога
+FIRST_ARTICLE = 10000
+
+# Бренды сгенерированных товаров
+BRANDS = ('Xiaomi', 'Samsung', 'Lenovo', 'HP', 'Logitech', 'Defender', 'Canon', 'TP-Link')
+
+# Ограничения Kaspi API: не больше 100 заказов на странице и фильтр creationDate не длиннее 14 дней
+KASPI_MAX_PAGE_SIZE = 100
+KASPI_MAX_RANGE_MS = 14 * 24 * 60 * 60 * 1000
+
+# Схема прайс-листа, которую отдаёт заглушка Kaspi (/kaspishopping.xsd) - структурная резервная схема
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schemas', 'kaspishopping_fallback.xsd')
+
+
+@dataclass
+class UpstreamProfile:
+    """Поведение одного API: задержка, ошибки и ограничение частоты"""
+
+    latency_ms: float = 0.0    # Задержка каждого ответа
+    jitter_ms: float = 0.0     # Случайная добавка к задержке (0..jitter_ms)
+    error_rate: float = 0.0    # Доля запросов, на которые отвечаем 500
+    rate_limit: float = 0.0    # Запросов в секунду (0 - без ограничения); сверх лимита - 429
+    burst: int = 1             # Сколько запросов можно сделать подряд без паузы
+
+
+class RateLimiter:
+    """Token bucket, который не ждёт, а отказывает (как API, отвечающий 429)"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        Args:
+            rate: Запросов в секунду (0 - без ограничения)
+            burst: Максимальное количество накопленных токенов
+        """
+        self.rate = max(float(rate), 0.0)
+        self.burst = max(int(burst), 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self) -> Optional[float]:
+        """
+        Returns:
+            Optional[float]: None, если запрос разрешён, иначе через сколько секунд появится токен
+        """
+        if not self.rate:
+            return None
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return None
+            return (1 - self.tokens) / self.rate
+
+
+class MockCatalog:
+    """
+    Каталог Al-Style, вычисляемый по номеру товара
+
+    Товары не хранятся в памяти (каталог на миллион позиций ничего не стоит),
+    хранятся только остатки, изменённые через /update-quantity.
+    """
+
+    def __init__(self, size: int, data_date: Optional[str] = None):
+        """
+        Args:
+            size: Количество товаров
+            data_date: Дата актуальности данных для /date (по умолчанию время запуска)
+        """
+        self.size = size
+        self.data_date = data_date or time.strftime('%Y-%m-%d %H:%M:%S')
+        self.quantities: Dict[int, int] = {}  # Остатки, изменённые через /update-quantity
+        self.lock = threading.Lock()
+
+    def article(self, index: int) -> int:
+        return FIRST_ARTICLE + index
+
+    def index(self, article: Any) -> Optional[int]:
+        """Номер товара по артикулу (None, если такого артикула нет)"""
+        try:
+            index = int(article) - FIRST_ARTICLE
+        except (TypeError, ValueError):
+            return None
+        return index if 0 <= index < self.size else None
+
+    def quantity(self, index: int) -> Any:
+        """Остаток в формате Al-Style: число или строка вида '>50'"""
+        if index in self.quantities:
+            return self.quantities[index]
+        if index % 7 == 0:
+            return '>50'
+        if index % 5 == 0:
+            return 0
+        return index % 40
+
+    def product(self, index: int, fields: Tuple[str, ...] = ()) -> Dict[str, Any]:
+        """Товар для /elements-pagination с запрошенными дополнительными полями"""
+        article = self.article(index)
+        # Каждый 11-й товар со спецсимволами в названии - чтобы проверять экранирование XML
+        name = f'Товар {article} "Модель {index % 997}" & Co' if index % 11 == 0 else f'Товар {article}'
+        product = {
+            'article': article,
+            'name': name,
+            'full_name': f'{name}, {BRANDS[index % len(BRANDS)]}',
+            'category': 3000 + index % 50,
+            'isnew': int(index % 13 == 0),
+        }
+        price1 = 1000 + (index * 7919) % 200000
+        extra = {
+            'brand': BRANDS[index % len(BRANDS)],
+            'price1': price1,
+            'price2': price1 * 115 // 100,
+            'quantity': self.quantity(index),
+            'article_pn': f'PN-{article}',
+        }
+        product.update({field: extra[field] for field in fields if field in extra})
+        return product
+
+    def quantity_price(self, index: int) -> Dict[str, Any]:
+        """Строка ответа /quantity-price"""
+        product = self.product(index, ('price1', 'price2', 'quantity'))
+        return {
+            'quantity': product['quantity'],
+            'price1': product['price1'],
+            'price2': product['price2'],
+            'discountPrice': product['price2'],
+            'discount': 0,
+            'warehouse': 'mock',
+        }
+
+    def set_quantity(self, article: Any, quantity: int) -> bool:
+        index = self.index(article)
+        if index is None:
+            return False
+        with self.lock:
+            self.quantities[index] = int(quantity)
+        return True
+
+
+class MockOrders:
+    """Заказы Kaspi.kz в статусе APPROVED_BY_BANK с составом из товаров MockCatalog"""
+
+    def __init__(self, count: int, catalog: MockCatalog, entries_per_order: int = 2,
+                 days: float = 3.0, seed: int = 1):
+        """
+        Args:
+            count: Количество заказов
+            catalog: Каталог, из которого берутся товары
+            entries_per_order: Максимум строк в заказе
+            days: За сколько последних дней распределены creationDate
+            seed: Начальное значение генератора случайных чисел
+        """
+        rnd = random.Random(seed)
+        now = int(time.time() * 1000)
+        self.lock = threading.Lock()
+        self.orders: List[Dict[str, Any]] = []
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        for number in range(count):
+            order_id = f'ORD{number:07d}'
+            entry_ids = []
+            for position in range(rnd.randint(1, max(1, entries_per_order))):
+                entry_id = f'{order_id}E{position}'
+                # Популярные товары повторяются в разных заказах, как в реальном потоке
+                index = min(int(rnd.paretovariate(1.2)) - 1, catalog.size - 1) if catalog.size else 0
+                self.entries[entry_id] = {
+                    'order_id': order_id,
+                    'article': catalog.article(index),
+                    'quantity': rnd.randint(1, 3),
+                }
+                entry_ids.append(entry_id)
+            self.orders.append({
+                'id': order_id,
+                'code': str(500000000 + number),
+                'status': 'APPROVED_BY_BANK',
+                'creationDate': now - int(rnd.random() * days * 24 * 60 * 60 * 1000),
+                'entries': entry_ids,
+            })
+        self.orders.sort(key=lambda order: order['creationDate'])
+        self.by_id = {order['id']: order for order in self.orders}
+
+    def select(self, status: Optional[str], since_ms: int, until_ms: int) -> List[Dict[str, Any]]:
+        with self.lock:
+            return [order for order in self.orders
+                    if since_ms <= order['creationDate'] <= until_ms
+                    and (status is None or order['status'] == status)]
+
+    def set_status(self, order_id: str, status: str) -> bool:
+        with self.lock:
+            order = self.by_id.get(order_id)
+            if order is None:
+                return False
+            order['status'] = status
+            return True
+
+
+class MockImports:
+    """Загрузки прайс-листов: код загрузки, статус обработки и итоговые счётчики"""
+
+    def __init__(self, processing_seconds: float = 5.0, error_rate: float = 0.0,
+                 upload_limit: int = 0, upload_window: float = 3600.0):
+        """
+        Args:
+            processing_seconds: Сколько секунд загрузка находится в обработке
+            error_rate: Доля предложений, которые попадут в счётчик errors
+            upload_limit: Загрузок за окно upload_window (0 - без ограничения)
+            upload_window: Длина окна квоты загрузок, секунд
+        """
+        self.processing_seconds = processing_seconds
+        self.error_rate = error_rate
+        self.upload_limit = upload_limit
+        self.upload_window = upload_window
+        self.uploads: Dict[str, Dict[str, Any]] = {}
+        self.window_started = time.time()
+        self.window_uploads = 0
+        self.lock = threading.Lock()
+
+    def quota_wait(self) -> Optional[float]:
+        """None, если загрузка разрешена квотой, иначе через сколько секунд квота обновится"""
+        if not self.upload_limit:
+            return None
+        with self.lock:
+            now = time.time()
+            if now - self.window_started >= self.upload_window:
+                self.window_started = now
+                self.window_uploads = 0
+            if self.window_uploads < self.upload_limit:
+                self.window_uploads += 1
+                return None
+            return self.window_started + self.upload_window - now
+
+    def add(self, body: bytes) -> str:
+        """Регистрирует загрузку и возвращает её код"""
+        code = hashlib.sha1(body + str(time.time()).encode()).hexdigest()[:16]
+        total = len(re.findall(rb'<offer[\s>]', body))
+        if not total and body.lstrip().startswith(b'['):
+            try:
+                total = len(json.loads(body))
+            except ValueError:
+                total = 0
+        with self.lock:
+            self.uploads[code] = {'total': total, 'uploaded_at': time.time()}
+        return code
+
+    def status(self, code: str) -> Optional[str]:
+        upload = self.uploads.get(code)
+        if upload is None:
+            return None
+        return 'FINISHED' if time.time() - upload['uploaded_at'] >= self.processing_seconds else 'PROCESSING'
+
+    def result(self, code: str) -> Optional[Dict[str, Any]]:
+        upload = self.uploads.get(code)
+        if upload is None:
+            return None
+        total = upload['total']
+        errors = int(total * self.error_rate) if self.status(code) == 'FINISHED' else 0
+        return {'errors': errors, 'warnings': 0, 'skipped': 0, 'total': total,
+                'status': self.status(code), 'result': {}}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Общая часть обработчиков: задержка, ошибки, ограничение частоты, ответы JSON"""
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, как у настоящих API
+    profile = UpstreamProfile()
+    limiter: Optional[RateLimiter] = None
+    stats: Dict[str, int] = {}
+    stats_lock = threading.Lock()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logging.getLogger(__name__).debug(format % args)
+
+    def send_json(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None,
+                  content_type: str = 'application/json') -> None:
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def read_body(self) -> bytes:
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def count(self, key: str) -> None:
+        with self.stats_lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def simulate(self) -> bool:
+        """
+        Применяет профиль API к запросу
+
+        Returns:
+            bool: False, если ответ (429 или 500) уже отправлен
+        """
+        wait = self.limiter.try_acquire() if self.limiter else None
+        if wait is not None:
+            self.count('429')
+            self.send_json(429, {'error': 'Too many requests'}, {'Retry-After': str(max(1, round(wait)))})
+            return False
+        delay = self.profile.latency_ms + random.random() * self.profile.jitter_ms
+        if delay:
+            time.sleep(delay / 1000)
+        if self.profile.error_rate and random.random() < self.profile.error_rate:
+            self.count('500')
+            self.send_json(500, {'error': 'Internal server error (mock)'})
+            return False
+        return True
+
+    def handle_method(self, method: str) -> None:
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        body = self.read_body() if method == 'POST' else b''
+        if url.path == '/_mock/stats':
+            with self.stats_lock:
+                self.send_json(200, dict(self.stats))
+            return
+        self.count(f"{method} {re.sub(r'/ORD[0-9E]+(?=/|$)', '/{id}', url.path)}")
+        if not self.simulate():
+            return
+        self.route(method, url.path, query, body)
+
+    def route(self, method: str, path: str, query: Dict[str, str], body: bytes) -> None:
+        raise NotImplementedError
+
+    def do_GET(self) -> None:
+        self.handle_method('GET')
+
+    def do_POST(self) -> None:
+        self.handle_method('POST')
+
+
+class AlStyleHandler(MockHandler):
+    """Заглушка api.al-style.kz/api"""
+
+    catalog: MockCatalog = MockCatalog(0)
+    max_page_size = 0  # Ограничение limit (в документации Al-Style - 250); 0 - без ограничения
+
+    def route(self, method: str, path: str, query: Dict[str, str], body: bytes) -> None:
+        params = dict(query)
+        if method == 'POST':
+            try:
+                params.update(json.loads(body or b'{}'))
+            except ValueError:
+                self.send_json(400, {'error': 'Invalid JSON'})
+                return
+        if not params.get('access-token'):
+            self.send_json(401, {'error': 'access-token is required'})
+            return
+
+        endpoint = path[len('/api'):] if path.startswith('/api/') else path
+        if method == 'GET' and endpoint == '/date':
+            self.send_json(200, {'date': self.catalog.data_date})
+        elif method == 'GET' and endpoint == '/elements-pagination':
+            self.elements_pagination(params)
+        elif method == 'GET' and endpoint == '/quantity':
+            indexes = self.selected(params)
+            if indexes is not None:
+                self.send_json(200, {str(self.catalog.article(i)): self.catalog.quantity(i) for i in indexes})
+        elif method == 'GET' and endpoint == '/quantity-price':
+            indexes = self.selected(params)
+            if indexes is not None:
+                self.send_json(200, {str(self.catalog.article(i)): self.catalog.quantity_price(i) for i in indexes})
+        elif method == 'POST' and endpoint == '/update-quantity':
+            if self.catalog.set_quantity(params.get('article'), int(params.get('quantity') or 0)):
+                self.send_json(200, {'success': True})
+            else:
+                self.send_json(404, {'error': 'Article not found'})
+        else:
+            self.send_json(404, {'error': 'Not found'})
+
+    def selected(self, params: Dict[str, Any]) -> Optional[Sequence[int]]:
+        """Номера товаров из параметра article (не больше 1000) или весь каталог"""
+        articles = [a for a in str(params.get('article') or '').split(',') if a]
+        if not articles:
+            return range(self.catalog.size)
+        if len(articles) > 1000:
+            self.send_json(400, {'error': 'Too many articles (max 1000)'})
+            return None
+        indexes = [self.catalog.index(article) for article in articles]
+        return [index for index in indexes if index is not None]
+
+    def elements_pagination(self, params: Dict[str, Any]) -> None:
+        limit = int(params.get('limit') or 100)
+        if self.max_page_size:
+            limit = min(limit, self.max_page_size)
+        offset = int(params.get('offset') or 0)
+        fields = tuple(field.strip() for field in str(params.get('additional_fields') or '').split(','))
+        size = self.catalog.size
+        self.send_json(200, {
+            'elements': [self.catalog.product(i, fields) for i in range(offset, min(offset + limit, size))],
+            'pagination': {
+                'totalCount': size,
+                'totalPages': max(1, -(-size // limit)),
+                'currentPage': offset // limit + 1,
+                'limit': limit,
+                'offset': offset,
+            },
+        })
+
+
+class KaspiHandler(MockHandler):
+    """Заглушка kaspi.kz/shop/api"""
+
+    catalog: MockCatalog = MockCatalog(0)
+    orders: MockOrders = MockOrders(0, catalog)
+    imports: MockImports = MockImports()
+    base_url = ''
+
+    def route(self, method: str, path: str, query: Dict[str, str], body: bytes) -> None:
+        if method == 'GET' and path == '/kaspishopping.xsd':
+            self.send_schema()
+            return
+        if not self.headers.get('X-Auth-Token'):
+            self.send_json(401, {'message': 'Unauthorized'})
+            return
+
+        parts = path.strip('/').split('/')
+        if method == 'GET' and path == '/shop/api/v2/orders':
+            self.list_orders(query)
+        elif method == 'POST' and path == '/shop/api/v2/orders':
+            self.accept_order(body)
+        elif method == 'GET' and len(parts) == 5 and parts[:4] == ['shop', 'api', 'v2', 'orders']:
+            self.get_order(parts[4])
+        elif method == 'GET' and len(parts) == 6 and parts[:4] == ['shop', 'api', 'v2', 'orders'] \
+                and parts[5] == 'entries':
+            self.order_entries(parts[4], query)
+        elif method == 'GET' and len(parts) == 6 and parts[:4] == ['shop', 'api', 'v2', 'orderentries'] \
+                and parts[5] == 'product':
+            self.entry_product(parts[4])
+        elif method == 'GET' and path == '/shop/api/v2/products':
+            self.list_products(query)
+        elif method == 'POST' and path in ('/shop/api/v2/product/import', '/shop/api/products/import'):
+            self.upload(body)
+        elif method == 'GET' and path == '/shop/api/products/import':
+            status = self.imports.status(query.get('i', ''))
+            if status is None:
+                self.send_json(404, {'message': 'Import not found'})
+            else:
+                self.send_json(200, {'code': query['i'], 'status': status})
+        elif method == 'GET' and path == '/shop/api/products/import/result':
+            result = self.imports.result(query.get('i', ''))
+            if result is None:
+                self.send_json(404, {'message': 'Import not found'})
+            else:
+                self.send_json(200, result)
+        else:
+            self.send_json(404, {'message': 'Not found'})
+
+    def send_jsonapi(self, status: int, body: Any) -> None:
+        self.send_json(status, body, content_type='application/vnd.api+json')
+
+    def send_schema(self) -> None:
+        with open(SCHEMA_PATH, 'rb') as f:
+            payload = f.read()
+        etag = '"' + hashlib.sha1(payload).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def entry_resource(self, entry_id: str) -> Dict[str, Any]:
+        entry = self.orders.entries[entry_id]
+        return {
+            'type': 'orderentries',
+            'id': entry_id,
+            'attributes': {'quantity': entry['quantity'], 'basePrice': 1000},
+            'relationships': {'product': {
+                'data': {'type': 'masterproducts', 'id': f"MP{entry['article']}"},
+                'links': {'related': f'{self.base_url}/shop/api/v2/orderentries/{entry_id}/product'},
+            }},
+        }
+
+    def product_resource(self, article: int) -> Dict[str, Any]:
+        return {
+            'type': 'masterproducts',
+            'id': f'MP{article}',
+            'attributes': {'code': str(article), 'name': f'Товар {article}'},
+        }
+
+    def order_resource(self, order: Dict[str, Any], with_entries: bool) -> Dict[str, Any]:
+        entries = {'links': {'related': f"{self.base_url}/shop/api/v2/orders/{order['id']}/entries"}}
+        if with_entries:
+            entries['data'] = [{'type': 'orderentries', 'id': entry_id} for entry_id in order['entries']]
+        return {
+            'type': 'orders',
+            'id': order['id'],
+            'attributes': {
+                'code': order['code'],
+                'status': order['status'],
+                'creationDate': order['creationDate'],
+            },
+            'relationships': {'entries': entries},
+        }
+
+    def list_orders(self, query: Dict[str, str]) -> None:
+        try:
+            number = int(query.get('page[number]', 0))
+            size = int(query.get('page[size]', 20))
+            since_ms = int(query['filter[orders][creationDate][$ge]'])
+            until_ms = int(query.get('filter[orders][creationDate][$le]') or time.time() * 1000)
+        except (KeyError, ValueError):
+            self.send_jsonapi(400, {'errors': [{'title': 'creationDate filter and paging are required'}]})
+            return
+        if size > KASPI_MAX_PAGE_SIZE or until_ms - since_ms > KASPI_MAX_RANGE_MS:
+            self.send_jsonapi(400, {'errors': [{'title': 'page[size] <= 100, creationDate range <= 14 days'}]})
+            return
+
+        selected = self.orders.select(query.get('filter[orders][status]'), since_ms, until_ms)
+        page = selected[number * size:(number + 1) * size]
+        include = query.get('include[orders]', '').split(',')
+        with_entries = 'entries' in include
+        document = {
+            'data': [self.order_resource(order, with_entries) for order in page],
+            'meta': {'pageCount': -(-len(selected) // size), 'totalCount': len(selected)},
+        }
+        if with_entries:
+            entry_ids = [entry_id for order in page for entry_id in order['entries']]
+            document['included'] = [self.entry_resource(entry_id) for entry_id in entry_ids]
+            if 'entries.product' in include:
+                articles = sorted({self.orders.entries[entry_id]['article'] for entry_id in entry_ids})
+                document['included'] += [self.product_resource(article) for article in articles]
+        self.send_jsonapi(200, document)
+
+    def accept_order(self, body: bytes) -> None:
+        try:
+            data = json.loads(body)['data']
+            ok = self.orders.set_status(data['id'], data['attributes']['status'])
+        except (ValueError, KeyError, TypeError):
+            self.send_jsonapi(400, {'errors': [{'title': 'Invalid order payload'}]})
+            return
+        if not ok:
+            self.send_jsonapi(404, {'errors': [{'title': 'Order not found'}]})
+            return
+        self.send_jsonapi(200, {'data': self.order_resource(self.orders.by_id[data['id']], False)})
+
+    def get_order(self, order_id: str) -> None:
+        order = self.orders.by_id.get(order_id)
+        if order is None:
+            self.send_jsonapi(404, {'errors': [{'title': 'Order not found'}]})
+            return
+        self.send_jsonapi(200, {'data': self.order_resource(order, False)})
+
+    def order_entries(self, order_id: str, query: Dict[str, str]) -> None:
+        order = self.orders.by_id.get(order_id)
+        if order is None:
+            self.send_jsonapi(404, {'errors': [{'title': 'Order not found'}]})
+            return
+        document = {'data': [self.entry_resource(entry_id) for entry_id in order['entries']]}
+        if 'product' in query.get('include[orderentries]', '').split(','):
+            articles = sorted({self.orders.entries[entry_id]['article'] for entry_id in order['entries']})
+            document['included'] = [self.product_resource(article) for article in articles]
+        self.send_jsonapi(200, document)
+
+    def entry_product(self, entry_id: str) -> None:
+        entry = self.orders.entries.get(entry_id)
+        if entry is None:
+            self.send_jsonapi(404, {'errors': [{'title': 'Entry not found'}]})
+            return
+        self.send_jsonapi(200, {'data': self.product_resource(entry['article'])})
+
+    def list_products(self, query: Dict[str, str]) -> None:
+        number = int(query.get('page[number]', 0))
+        size = min(int(query.get('page[size]', 20)), KASPI_MAX_PAGE_SIZE)
+        indexes = range(number * size, min((number + 1) * size, self.catalog.size))
+        self.send_jsonapi(200, {
+            'data': [self.product_resource(self.catalog.article(index)) for index in indexes],
+            'meta': {'pageCount': -(-self.catalog.size // size), 'totalCount': self.catalog.size},
+        })
+
+    def upload(self, body: bytes) -> None:
+        wait = self.imports.quota_wait()
+        if wait is not None:
+            self.send_json(429, {'message': 'Upload limit exceeded'}, {'Retry-After': str(max(1, round(wait)))})
+            return
+        code = self.imports.add(body)
+        self.send_json(200, {'code': code, 'status': 'UPLOADED'})
+
+
+class MockServers:
+    """Обе заглушки в фоновых потоках (для бенчмарков и запуска из кода)"""
+
+    def __init__(self, catalog: MockCatalog, orders: MockOrders, imports: MockImports,
+                 al_style: UpstreamProfile, kaspi: UpstreamProfile, host: str = '127.0.0.1',
+                 al_style_port: int = 0, kaspi_port: int = 0, al_style_max_page_size: int = 0):
+        """
+        Args:
+            catalog: Каталог Al-Style
+            orders: Заказы Kaspi
+            imports: Загрузки прайс-листов
+            al_style: Профиль API Al-Style
+            kaspi: Профиль API Kaspi
+            host: Адрес, на котором слушают заглушки
+            al_style_port: Порт Al-Style (0 - любой свободный)
+            kaspi_port: Порт Kaspi (0 - любой свободный)
+            al_style_max_page_size: Ограничение limit в /elements-pagination (0 - без ограничения)
+        """
+        al_style_handler = type('AlStyle', (AlStyleHandler,), {
+            'catalog': catalog, 'profile': al_style, 'limiter': RateLimiter(al_style.rate_limit, al_style.burst),
+            'max_page_size': al_style_max_page_size, 'stats': {},
+        })
+        kaspi_handler = type('Kaspi', (KaspiHandler,), {
+            'catalog': catalog, 'orders': orders, 'imports': imports, 'profile': kaspi,
+            'limiter': RateLimiter(kaspi.rate_limit, kaspi.burst), 'stats': {},
+        })
+        self.al_style = ThreadingHTTPServer((host, al_style_port), al_style_handler)
+        self.kaspi = ThreadingHTTPServer((host, kaspi_port), kaspi_handler)
+        for server in (self.al_style, self.kaspi):
+            server.daemon_threads = True
+        kaspi_handler.base_url = self.kaspi_url
+        self.threads: List[threading.Thread] = []
+
+    @property
+    def al_style_url(self) -> str:
+        """Значение для AL_STYLE_API_URL"""
+        host, port = self.al_style.server_address[:2]
+        return f'http://{host}:{port}/api'
+
+    @property
+    def kaspi_url(self) -> str:
+        """Значение для KASPI_BASE_URL"""
+        host, port = self.kaspi.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def environment(self) -> Dict[str, str]:
+        """Переменные окружения, которые направляют Script.py на заглушки"""
+        return {
+            'AL_STYLE_API_URL': self.al_style_url,
+            'KASPI_BASE_URL': self.kaspi_url,
+            'XML_SCHEMA_URL': f'{self.kaspi_url}/kaspishopping.xsd',
+            'AL_STYLE_TOKEN': 'mock',
+            'KASPI_TOKEN': 'mock',
+            'REQUEST_DELAY': '0',
+        }
+
+    def start(self) -> 'MockServers':
+        for server in (self.al_style, self.kaspi):
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self) -> None:
+        for server in (self.al_style, self.kaspi):
+            server.shutdown()
+            server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальные заглушки API Al-Style и Kaspi.kz')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--al-style-port', type=int, default=8801)
+    parser.add_argument('--kaspi-port', type=int, default=8802)
+    parser.add_argument('--products', type=int, default=10000, help='Товаров в каталоге Al-Style')
+    parser.add_argument('--orders', type=int, default=100, help='Заказов APPROVED_BY_BANK')
+    parser.add_argument('--entries-per-order', type=int, default=3, help='Максимум строк в заказе')
+    parser.add_argument('--orders-days', type=float, default=3.0, help='За сколько дней созданы заказы')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--al-style-max-limit', type=int, default=0,
+                        help='Ограничение limit в /elements-pagination (0 - без ограничения)')
+    for name, title in (('al-style', 'Al-Style'), ('kaspi', 'Kaspi')):
+        parser.add_argument(f'--{name}-latency-ms', type=float, default=0.0, help=f'Задержка ответа {title}')
+        parser.add_argument(f'--{name}-jitter-ms', type=float, default=0.0, help=f'Разброс задержки {title}')
+        parser.add_argument(f'--{name}-error-rate', type=float, default=0.0, help=f'Доля ответов 500 от {title}')
+        parser.add_argument(f'--{name}-rate', type=float, default=0.0,
+                            help=f'Запросов в секунду к {title} (0 - без ограничения, сверх - 429)')
+        parser.add_argument(f'--{name}-burst', type=int, default=1, help=f'Запросов к {title} подряд без паузы')
+    parser.add_argument('--import-seconds', type=float, default=5.0, help='Длительность обработки загрузки')
+    parser.add_argument('--import-error-rate', type=float, default=0.0, help='Доля предложений с ошибкой импорта')
+    parser.add_argument('--upload-limit', type=int, default=0, help='Загрузок прайс-листа за окно (0 - без лимита)')
+    parser.add_argument('--upload-window', type=float, default=3600.0, help='Окно лимита загрузок, секунд')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    def profile(name: str) -> UpstreamProfile:
+        return UpstreamProfile(
+            latency_ms=getattr(args, f'{name}_latency_ms'), jitter_ms=getattr(args, f'{name}_jitter_ms'),
+            error_rate=getattr(args, f'{name}_error_rate'), rate_limit=getattr(args, f'{name}_rate'),
+            burst=getattr(args, f'{name}_burst'),
+        )
+
+    catalog = MockCatalog(args.products)
+    orders = MockOrders(args.orders, catalog, args.entries_per_order, args.orders_days, args.seed)
+    imports = MockImports(args.import_seconds, args.import_error_rate, args.upload_limit, args.upload_window)
+    servers = MockServers(catalog, orders, imports, profile('al_style'), profile('kaspi'), args.host,
+                          args.al_style_port, args.kaspi_port, args.al_style_max_limit).start()
+
+    logging.info(f'Al-Style: {servers.al_style_url} ({catalog.size} товаров)')
+    logging.info(f'Kaspi: {servers.kaspi_url} ({len(orders.orders)} заказов)')
+    logging.info('Переменные окружения для Script.py:')
+    for name, value in servers.environment().items():
+        print(f'export {name}={value}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        logging.info('Остановка заглушек')
+        servers.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
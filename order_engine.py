@@ -0,0 +1,260 @@
+"""
+Асинхронная обработка заказов Kaspi.kz
+Принятие заказов и получение их состава выполняются параллельно для многих заказов
+(с ограничением числа одновременных запросов к Kaspi), а списание остатков Al-Style -
+строго последовательно, за его ограничителем частоты запросов
+"""
+
+import time
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Optional, Tuple
+
+import requests
+
+from config import config
+from lease import fencing_ok
+from kaspi_orders import KaspiOrdersClient, IncludedIndex
+from order_ledger import (OrderLedger, PROCESSED_STATUSES, STATUS_ACCEPTED, STATUS_ACCEPTING,
+                          STATUS_ACCEPT_FAILED, STATUS_CANCELLED)
+from stock_updates import apply_decrements
+
+
+# Фильтр заказов, которые нужно принять (даты и пагинацию добавляет KaspiOrdersClient)
+ORDER_FILTERS = {
+    'filter[orders][status]': 'APPROVED_BY_BANK',  # Только подтвержденные заказы
+}
+
+# Статусы Kaspi при сверке журнала: заказ ещё ждёт принятия или отменён (остатки не списываются).
+# Любой другой статус означает, что заказ уже принят
+KASPI_AWAITING_STATUS = 'APPROVED_BY_BANK'
+KASPI_CANCELLED_STATUSES = ('CANCELLED', 'CANCELLING')
+
+
+class OrderEngine:
+    """
+    Обработчик заказов на asyncio
+
+    Блокирующие клиенты (requests) выполняются в собственном пуле потоков движка,
+    у каждого внешнего сервиса свой семафор: Kaspi - до kaspi_max_concurrency запросов
+    одновременно, Al-Style - по одному.
+    """
+
+    def __init__(self, kaspi: Optional[KaspiOrdersClient] = None, ledger: Optional[OrderLedger] = None,
+                 kaspi_concurrency: Optional[int] = None):
+        """
+        Args:
+            kaspi: Клиент заказов Kaspi (по умолчанию новый)
+            ledger: Журнал заказов (по умолчанию новый OrderLedger)
+            kaspi_concurrency: Одновременных запросов к Kaspi (по умолчанию config.kaspi_max_concurrency)
+        """
+        self.kaspi_concurrency = max(1, config.kaspi_max_concurrency
+                                     if kaspi_concurrency is None else kaspi_concurrency)
+        self.kaspi = kaspi or KaspiOrdersClient(max_pool_size=self.kaspi_concurrency)
+        self.ledger = ledger or OrderLedger()
+        self.logger = logging.getLogger(__name__)
+        self.kaspi_limit: Optional[asyncio.Semaphore] = None
+        self.al_style_limit: Optional[asyncio.Semaphore] = None
+        # Потоков хватает на все разрешённые запросы к Kaspi плюс один для Al-Style
+        self.executor = ThreadPoolExecutor(max_workers=self.kaspi_concurrency + 1, thread_name_prefix='orders')
+
+    async def _in_thread(self, func: Callable, *args, **kwargs) -> Any:
+        """Выполняет блокирующий вызов в пуле потоков движка"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def _call_kaspi(self, func: Callable, *args, **kwargs) -> Any:
+        """Вызов Kaspi в потоке, не больше kaspi_concurrency одновременно"""
+        async with self.kaspi_limit:
+            return await self._in_thread(func, *args, **kwargs)
+
+    async def _call_al_style(self, func: Callable, *args, **kwargs) -> Any:
+        """Вызов Al-Style в потоке, строго по одному"""
+        async with self.al_style_limit:
+            return await self._in_thread(func, *args, **kwargs)
+
+    async def process_order(self, order: Dict[str, Any], included: IncludedIndex,
+                            status: Optional[str]) -> Tuple[bool, int]:
+        """
+        Записывает состав заказа в журнал и принимает заказ в Kaspi
+
+        Args:
+            order: Заказ из ответа Kaspi
+            included: Индекс included
+            status: Статус заказа в журнале (None - заказ новый)
+
+        Returns:
+            Tuple[bool, int]: (обработан ли заказ, его creationDate)
+        """
+        order_id = order['id']  # ID заказа
+        order_code = order['attributes']['code']  # Код заказа
+        creation_date = int(order['attributes'].get('creationDate') or 0)
+
+        if status in PROCESSED_STATUSES:
+            self.logger.info(f"Заказ {order_code} уже обработан ранее, пропускаем")
+            return True, creation_date
+
+        try:
+            if status is None:
+                # Сначала записываем состав заказа: списания не потеряются, даже если процесс упадёт после принятия
+                lines = await self._call_kaspi(self.kaspi.order_lines, order, included)
+                self.ledger.record_order(order_id, order_code, lines)
+
+            # ACCEPTING до запроса: если процесс упадёт после ответа Kaspi, заказ будет сверен при запуске
+            self.ledger.set_status(order_id, STATUS_ACCEPTING)
+
+            # Принимаем заказ
+            accept_order_payload = {
+                "data": {
+                    "type": "orders",
+                    "id": order_id,
+                    "attributes": {
+                        "code": order_code,
+                        "status": "ACCEPTED_BY_MERCHANT"  # Меняем статус на "Принят"
+                    }
+                }
+            }
+            response = await self._call_kaspi(self.kaspi.post, config.kaspi_orders_url, json=accept_order_payload)
+        except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+            # Если запрос на принятие ушёл, заказ остался в ACCEPTING и будет сверен со статусом в Kaspi
+            self.logger.error(f"Ошибка при обработке заказа {order_code}: {e}")
+            return False, creation_date
+
+        if response.status_code == 200:
+            self.ledger.set_status(order_id, STATUS_ACCEPTED)
+            self.logger.info(f"Заказ {order_code} принят")
+            return True, creation_date
+
+        self.ledger.set_status(order_id, STATUS_ACCEPT_FAILED, note=f"HTTP {response.status_code}")
+        self.logger.error(f"Ошибка при принятии заказа {order_code}: {response.status_code}")
+        return False, creation_date
+
+    async def reconcile(self) -> None:
+        """
+        Сверяет с Kaspi заказы, оставшиеся в NEW/ACCEPTING после прошлого запуска
+
+        Процесс мог упасть после успешного принятия, но до записи ACCEPTED: такой заказ
+        уже не приходит в выборке APPROVED_BY_BANK, и его списания иначе потерялись бы.
+        Принятые в Kaspi заказы переводятся в ACCEPTED (остатки спишутся), отменённые -
+        в CANCELLED, ещё не принятые принимаются повторно.
+        """
+        unsettled = self.ledger.unsettled()
+        if not unsettled:
+            return
+        self.logger.info(f'Сверка с Kaspi незавершённых заказов: {len(unsettled)}')
+
+        async def settle(row: Dict[str, Any]) -> None:
+            try:
+                order = await self._call_kaspi(self.kaspi.get_order, row['order_id'])
+                kaspi_status = order['attributes']['status']
+            except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+                self.logger.error(f"Не удалось сверить заказ {row['code']}: {e}")
+                return
+            if kaspi_status == KASPI_AWAITING_STATUS:
+                await self.process_order(order, {}, row['status'])  # Состав уже в журнале
+            elif kaspi_status in KASPI_CANCELLED_STATUSES:
+                self.ledger.set_status(row['order_id'], STATUS_CANCELLED, note=f'Kaspi: {kaspi_status}')
+                self.logger.warning(f"Заказ {row['code']} отменён в Kaspi ({kaspi_status}), остатки не списываются")
+            else:
+                self.ledger.set_status(row['order_id'], STATUS_ACCEPTED, note=f'Сверка с Kaspi: {kaspi_status}')
+                self.logger.info(f"Заказ {row['code']} уже принят в Kaspi ({kaspi_status}) - списываем остатки")
+
+        await asyncio.gather(*(settle(row) for row in unsettled))
+
+    def _advance_watermark(self, results: List[Tuple[bool, int]], watermark: Optional[int]) -> None:
+        """Сдвигает отметку creationDate, но не дальше заказов, которые нужно повторить"""
+        processed = [creation_date for ok, creation_date in results if ok]
+        failed = [creation_date for ok, creation_date in results if not ok]
+        if not processed:
+            return
+        newest_processed = max(processed)
+        if failed:
+            newest_processed = min(newest_processed, min(failed) - 1)
+        if newest_processed > (watermark or 0):
+            self.ledger.set_watermark(newest_processed)
+
+    async def apply_stock(self) -> None:
+        """Списывает остатки по всем принятым заказам, включая недописанные в прошлых запусках"""
+        decrements = self.ledger.pending_decrements()
+        if decrements and not fencing_ok('Списание остатков'):
+            return  # Списания останутся в журнале до следующего запуска
+        if decrements:
+            # Один пакетный /quantity и по одному /update-quantity на артикул
+            results = await self._call_al_style(apply_decrements, decrements, on_applied=self.ledger.mark_applied,
+                                                on_skipped=self.ledger.mark_skipped)
+            failed = [article for article, quantity in results.items() if quantity is None]
+            self.logger.info(f'Остатки обновлены: {len(results) - len(failed)} из {len(results)} товаров')
+        completed = self.ledger.complete_orders()
+        if completed:
+            self.logger.info(f'Заказов обработано полностью: {completed}')
+
+    async def run(self) -> None:
+        """Один цикл: забрать новые заказы, принять их и списать остатки"""
+        # Семафоры привязаны к текущему циклу событий, поэтому создаются при каждом запуске
+        self.kaspi_limit = asyncio.Semaphore(self.kaspi_concurrency)
+        self.al_style_limit = asyncio.Semaphore(1)
+        # Счётчики запросов и кэш товаров - за этот цикл (движок живёт между циклами демона)
+        self.kaspi.reset_run()
+
+        # Заказы, принятие которых прервалось в прошлый раз, - до новой выборки
+        await self.reconcile()
+
+        # Период выборки: от последнего обработанного creationDate (с запасом), но не дальше lookback.
+        # Отметка идёт по creationDate, а банк может одобрить заказ позже, чем покрывает запас, поэтому
+        # раз в kaspi_orders_full_sweep_minutes опрашивается весь lookback; обработанные заказы
+        # отсеиваются по журналу, так что полный опрос стоит только страниц списка.
+        # Kaspi допускает фильтр не длиннее 14 дней, поэтому длинный период делится на окна
+        started = time.time()
+        timestamp_now = int(started * 1000)
+        timestamp_past = timestamp_now - (config.kaspi_orders_lookback_days * 24 * 60 * 60 * 1000)
+        watermark = self.ledger.watermark
+        last_sweep = self.ledger.last_full_sweep
+        full_sweep = not last_sweep or started - last_sweep >= config.kaspi_orders_full_sweep_minutes * 60
+        if watermark and not full_sweep:
+            timestamp_past = max(timestamp_past, watermark - config.kaspi_orders_overlap_minutes * 60 * 1000)
+
+        orders: List[Dict[str, Any]] = []
+        included: IncludedIndex = {}
+        try:
+            # Забираем все страницы всех окон вместе с составом заказов (include)
+            orders, included = await self._in_thread(
+                self.kaspi.fetch_orders, ORDER_FILTERS, timestamp_past, timestamp_now
+            )
+            self.logger.info(f'Найдено {len(orders)} заказов для обработки'
+                             + (' (полный опрос периода)' if full_sweep else ''))
+        except requests.exceptions.HTTPError as e:
+            self.logger.error(f'Ошибка при получении заказов: {e.response.status_code} - {e.response.text}')
+            return
+        except requests.exceptions.RequestException as e:
+            self.logger.error(f'Ошибка при подключении к Kaspi API: {e}')
+            return
+
+        # Уже обработанные заказы определяются по журналу, без обращений к Kaspi
+        known_statuses = self.ledger.statuses(order['id'] for order in orders)
+        results = await asyncio.gather(*(
+            self.process_order(order, included, known_statuses.get(order['id'])) for order in orders
+        ))
+        self._advance_watermark(results, watermark)
+        if full_sweep:
+            self.ledger.set_last_full_sweep(started)
+        self.logger.info(f'Запросов к Kaspi: {self.kaspi.request_count}, '
+                         f'разных товаров: {len(self.kaspi.product_codes)}')
+
+        await self.apply_stock()
+
+    def close(self) -> None:
+        """Закрывает пул потоков, клиент Kaspi и журнал"""
+        self.executor.shutdown(wait=True)
+        self.kaspi.close()
+        self.ledger.close()
+
+
+def run_order_engine() -> None:
+    """Запускает один цикл обработки заказов (синхронная обёртка)"""
+    engine = OrderEngine()
+    try:
+        asyncio.run(engine.run())
+    finally:
+        engine.close()
@@ -0,0 +1,287 @@
+"""
+Журнал обработанных заказов Kaspi.kz в SQLite (режим WAL)
+Хранит заказы, смену их статусов и списания остатков по каждой строке заказа,
+чтобы повторный запуск не принимал заказ и не списывал остаток второй раз,
+а неприменённые списания довыполнялись
+"""
+
+import time
+import sqlite3
+import logging
+from typing import List, Dict, Any, Iterable, Optional
+
+from config import config
+
+
+# Статусы заказа в журнале
+STATUS_NEW = 'NEW'                      # Состав записан, заказ ещё не принят
+STATUS_ACCEPTING = 'ACCEPTING'          # Запрос на принятие отправляется; результат неизвестен до ответа
+STATUS_ACCEPT_FAILED = 'ACCEPT_FAILED'  # Kaspi не принял заказ, попробуем снова
+STATUS_ACCEPTED = 'ACCEPTED'            # Принят в Kaspi, остатки списываются
+STATUS_DONE = 'DONE'                    # Принят и все остатки списаны
+STATUS_CANCELLED = 'CANCELLED'          # Отменён в Kaspi до завершения обработки, остатки не списываются
+
+# Заказы в этих статусах больше не требуют обращений к Kaspi
+PROCESSED_STATUSES = (STATUS_ACCEPTED, STATUS_DONE, STATUS_CANCELLED)
+
+# Заказы, состояние которых нужно сверить с Kaspi при запуске (процесс мог упасть после принятия)
+UNSETTLED_STATUSES = (STATUS_NEW, STATUS_ACCEPTING)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    order_id TEXT PRIMARY KEY,
+    code TEXT,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status);
+CREATE TABLE IF NOT EXISTS order_transitions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id TEXT NOT NULL,
+    from_status TEXT,
+    to_status TEXT NOT NULL,
+    at REAL NOT NULL,
+    note TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_order_transitions_order ON order_transitions (order_id);
+CREATE TABLE IF NOT EXISTS stock_effects (
+    order_id TEXT NOT NULL,
+    entry_id TEXT NOT NULL,
+    article TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    applied_at REAL,
+    skipped_at REAL,
+    PRIMARY KEY (order_id, entry_id)
+);
+CREATE INDEX IF NOT EXISTS idx_stock_effects_pending ON stock_effects (article) WHERE applied_at IS NULL;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Максимум параметров в одном запросе IN (...) для старых сборок SQLite
+IN_BATCH_SIZE = 500
+
+
+class OrderLedger:
+    """Журнал заказов и списаний остатков в локальной базе SQLite"""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: Путь к файлу базы (по умолчанию config.order_ledger_path)
+        """
+        self.path = path or config.order_ledger_path
+        self.logger = logging.getLogger(__name__)
+        # Журнал используется и из пула потоков OrderEngine (по очереди, не одновременно)
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self) -> None:
+        """Добавляет столбцы, появившиеся после создания базы"""
+        columns = {row['name'] for row in self.conn.execute('PRAGMA table_info(stock_effects)')}
+        if 'skipped_at' not in columns:
+            with self.conn:
+                self.conn.execute('ALTER TABLE stock_effects ADD COLUMN skipped_at REAL')
+
+    def get_meta(self, key: str) -> Optional[str]:
+        """Возвращает служебное значение из таблицы meta"""
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row['value'] if row else None
+
+    def set_meta(self, key: str, value: Optional[str]) -> None:
+        """Сохраняет служебное значение в таблицу meta"""
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    @property
+    def watermark(self) -> Optional[int]:
+        """creationDate (мс) самого нового заказа, до которого все заказы обработаны"""
+        value = self.get_meta('creation_watermark')
+        return int(value) if value else None
+
+    def set_watermark(self, creation_date: int) -> None:
+        """Сохраняет новую отметку creationDate (мс)"""
+        self.set_meta('creation_watermark', str(int(creation_date)))
+
+    @property
+    def last_full_sweep(self) -> Optional[float]:
+        """Время (unix, с) последнего успешного опроса всего периода lookback"""
+        value = self.get_meta('last_full_sweep')
+        return float(value) if value else None
+
+    def set_last_full_sweep(self, timestamp: float) -> None:
+        """Сохраняет время успешного опроса всего периода lookback"""
+        self.set_meta('last_full_sweep', str(timestamp))
+
+    def statuses(self, order_ids: Iterable[str]) -> Dict[str, str]:
+        """
+        Статусы известных журналу заказов (поиск по первичному ключу)
+
+        Args:
+            order_ids: id заказов Kaspi
+
+        Returns:
+            Dict[str, str]: {order_id: статус}; заказов, которых нет в журнале, в ответе нет
+        """
+        order_ids = list(order_ids)
+        result: Dict[str, str] = {}
+        for start in range(0, len(order_ids), IN_BATCH_SIZE):
+            batch = order_ids[start:start + IN_BATCH_SIZE]
+            placeholders = ','.join('?' * len(batch))
+            rows = self.conn.execute(
+                f'SELECT order_id, status FROM orders WHERE order_id IN ({placeholders})', batch
+            )
+            result.update({row['order_id']: row['status'] for row in rows})
+        return result
+
+    def _transition(self, order_id: str, from_status: Optional[str], to_status: str,
+                    now: float, note: Optional[str] = None) -> None:
+        """Записывает смену статуса (вызывается внутри транзакции)"""
+        self.conn.execute(
+            'INSERT INTO order_transitions (order_id, from_status, to_status, at, note) VALUES (?, ?, ?, ?, ?)',
+            (order_id, from_status, to_status, now, note)
+        )
+
+    def record_order(self, order_id: str, code: str, lines: List[Dict[str, Any]]) -> None:
+        """
+        Записывает новый заказ и списания по его строкам (ещё не применённые)
+
+        Args:
+            order_id: id заказа Kaspi
+            code: Код заказа
+            lines: Строки заказа с ключами entry_id, product_code, quantity
+        """
+        now = time.time()
+        with self.conn:
+            cursor = self.conn.execute(
+                'INSERT OR IGNORE INTO orders (order_id, code, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+                (order_id, code, STATUS_NEW, now, now)
+            )
+            if cursor.rowcount == 0:
+                return  # Заказ уже в журнале
+            self._transition(order_id, None, STATUS_NEW, now)
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO stock_effects (order_id, entry_id, article, quantity) VALUES (?, ?, ?, ?)',
+                [(order_id, str(line['entry_id']), str(line['product_code']), int(line['quantity']))
+                 for line in lines]
+            )
+
+    def set_status(self, order_id: str, status: str, note: Optional[str] = None) -> None:
+        """
+        Меняет статус заказа и записывает переход
+
+        Args:
+            order_id: id заказа Kaspi
+            status: Новый статус
+            note: Пояснение (например, код ответа Kaspi)
+        """
+        now = time.time()
+        with self.conn:
+            row = self.conn.execute('SELECT status FROM orders WHERE order_id = ?', (order_id,)).fetchone()
+            if row is None:
+                raise KeyError(f"Заказ {order_id} отсутствует в журнале")
+            if row['status'] == status:
+                return
+            self.conn.execute('UPDATE orders SET status = ?, updated_at = ? WHERE order_id = ?',
+                              (status, now, order_id))
+            self._transition(order_id, row['status'], status, now, note)
+
+    def unsettled(self) -> List[Dict[str, Any]]:
+        """
+        Заказы в NEW и ACCEPTING: принятие не было доведено до конца (или его результат не записан)
+
+        Returns:
+            List[Dict[str, Any]]: [{'order_id': ..., 'code': ..., 'status': ...}]
+        """
+        placeholders = ','.join('?' * len(UNSETTLED_STATUSES))
+        rows = self.conn.execute(
+            f'SELECT order_id, code, status FROM orders WHERE status IN ({placeholders}) ORDER BY created_at',
+            UNSETTLED_STATUSES
+        )
+        return [dict(row) for row in rows]
+
+    def pending_decrements(self) -> Dict[str, int]:
+        """
+        Неприменённые списания по принятым заказам (в том числе оставшиеся с прошлых запусков)
+
+        Пропущенные списания (неточный остаток ">N") сюда не входят: иначе они копились бы
+        и при появлении точного остатка списались бы одним запросом.
+
+        Returns:
+            Dict[str, int]: {артикул: сколько списать}
+        """
+        rows = self.conn.execute(
+            'SELECT e.article, SUM(e.quantity) AS quantity FROM stock_effects e '
+            'JOIN orders o ON o.order_id = e.order_id '
+            'WHERE e.applied_at IS NULL AND e.skipped_at IS NULL AND o.status = ? GROUP BY e.article',
+            (STATUS_ACCEPTED,)
+        )
+        return {row['article']: row['quantity'] for row in rows}
+
+    def mark_applied(self, article: str, new_quantity: Optional[int] = None) -> None:
+        """
+        Отмечает списания артикула по принятым заказам как применённые
+
+        Сигнатура подходит для on_applied из stock_updates.apply_decrements.
+
+        Args:
+            article: Артикул
+            new_quantity: Новый остаток (только для журнала)
+        """
+        with self.conn:
+            self.conn.execute(
+                'UPDATE stock_effects SET applied_at = ? WHERE article = ? AND applied_at IS NULL '
+                'AND skipped_at IS NULL AND order_id IN (SELECT order_id FROM orders WHERE status = ?)',
+                (time.time(), article, STATUS_ACCEPTED)
+            )
+
+    def mark_skipped(self, article: str) -> None:
+        """
+        Отмечает неприменённые списания артикула по принятым заказам как пропущенные
+
+        Остаток Al-Style неточный (">N"), поэтому списание требует ручной обработки;
+        заказ при этом может перейти в DONE. Сигнатура подходит для on_skipped
+        из stock_updates.apply_decrements.
+
+        Args:
+            article: Артикул
+        """
+        with self.conn:
+            self.conn.execute(
+                'UPDATE stock_effects SET skipped_at = ? WHERE article = ? AND applied_at IS NULL '
+                'AND skipped_at IS NULL AND order_id IN (SELECT order_id FROM orders WHERE status = ?)',
+                (time.time(), article, STATUS_ACCEPTED)
+            )
+
+    def complete_orders(self) -> int:
+        """
+        Переводит в DONE принятые заказы, по которым не осталось неприменённых списаний
+        (пропущенные из-за неточного остатка считаются обработанными)
+
+        Returns:
+            int: Сколько заказов завершено
+        """
+        now = time.time()
+        with self.conn:
+            rows = self.conn.execute(
+                'SELECT order_id FROM orders o WHERE status = ? AND NOT EXISTS ('
+                'SELECT 1 FROM stock_effects e WHERE e.order_id = o.order_id '
+                'AND e.applied_at IS NULL AND e.skipped_at IS NULL)',
+                (STATUS_ACCEPTED,)
+            ).fetchall()
+            for row in rows:
+                self.conn.execute('UPDATE orders SET status = ?, updated_at = ? WHERE order_id = ?',
+                                  (STATUS_DONE, now, row['order_id']))
+                self._transition(row['order_id'], STATUS_ACCEPTED, STATUS_DONE, now)
+        return len(rows)
+
+    def close(self) -> None:
+        """Закрывает соединение с базой"""
+        self.conn.close()
@@ -3,7 +3,7 @@
 Скрипт для анализа цен в исходных данных из Al-Style API
 """
 import json
-from Script import get_al_style_products
+from Script import get_local_products
 
 def analyze_prices():
     """Анализирует цены в исходных данных"""
@@ -11,7 +11,7 @@ def analyze_prices():
     print("=" * 60)
     
     # Получаем товары
-    products = get_al_style_products()
+    products = get_local_products()
     
     if not products:
         print("❌ Не удалось получить товары")
@@ -0,0 +1,153 @@
+"""
+Общий для всех процессов лимит запросов к Al-Style
+Al-Style допускает один запрос в REQUEST_DELAY секунд на access-token, поэтому время
+следующего разрешённого запроса хранится в SQLite (одна строка на токен), и все процессы
+узла (Script.py, генераторы, демон, анализ цен) расходуют один бюджет. Ожидающие запросы
+записываются в очередь с приоритетом: списание остатков по заказам идёт раньше страниц
+каталога, при равном приоритете - в порядке очереди
+"""
+
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+from typing import Tuple, Optional
+
+from config import config
+
+
+# Приоритеты запросов: меньшее число обслуживается раньше
+PRIORITY_ORDERS = 0    # Остатки по заказам Kaspi
+PRIORITY_DEFAULT = 1   # Одиночные запросы (/date, проверки)
+PRIORITY_CATALOG = 2   # Страницы каталога и массовое обновление цен
+
+# Ожидающий, который не обновлял свою запись дольше этого, считается завершившимся (процесс упал)
+STALE_WAITER_SECONDS = 30
+# Как часто проверять очередь, пока впереди есть запросы с более высоким приоритетом
+POLL_SECONDS = 0.2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS budgets (
+    name TEXT PRIMARY KEY,
+    next_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS budget_waiters (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    enqueued_at REAL NOT NULL,
+    seen_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_budget_waiters_queue ON budget_waiters (name, priority, id);
+"""
+
+
+def budget_name(token: str) -> str:
+    """Имя бюджета по access-token (сам токен в базу не пишется)"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()[:16]
+
+
+class SharedRateBudget:
+    """Один запрос в interval секунд на токен для всех процессов, использующих одну базу"""
+
+    def __init__(self, token: str, interval: float, path: Optional[str] = None):
+        """
+        Args:
+            token: access-token, к которому относится лимит
+            interval: Минимальный интервал между запросами, секунд (0 - без ограничения)
+            path: Путь к файлу базы (по умолчанию config.al_style_budget_path)
+        """
+        self.name = budget_name(token)
+        self.interval = max(float(interval), 0.0)
+        self.path = path or config.al_style_budget_path
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self.conn: Optional[sqlite3.Connection] = None
+        if self.interval:
+            # isolation_level=None: транзакции открываем сами (BEGIN IMMEDIATE)
+            self.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.executescript(SCHEMA)
+
+    def acquire(self, priority: int = PRIORITY_DEFAULT) -> float:
+        """
+        Ждёт своей очереди и забирает право на один запрос
+
+        Args:
+            priority: Приоритет запроса (PRIORITY_ORDERS, PRIORITY_DEFAULT, PRIORITY_CATALOG)
+
+        Returns:
+            float: Сколько секунд пришлось ждать
+        """
+        if not self.interval:
+            return 0.0
+        started = time.time()
+        with self._lock:
+            waiter_id = self.conn.execute(
+                'INSERT INTO budget_waiters (name, priority, enqueued_at, seen_at) VALUES (?, ?, ?, ?)',
+                (self.name, priority, started, started)
+            ).lastrowid
+
+        granted = False
+        try:
+            while True:
+                with self._lock:
+                    granted, wait = self._try_take(waiter_id)
+                if granted:
+                    return time.time() - started
+                time.sleep(wait)
+        finally:
+            if not granted:  # Прервали ожидание - не задерживаем остальных
+                with self._lock:
+                    self.conn.execute('DELETE FROM budget_waiters WHERE id = ?', (waiter_id,))
+
+    def _try_take(self, waiter_id: int) -> Tuple[bool, float]:
+        """Одна попытка: (True, 0) если запрос разрешён, иначе (False, сколько спать)"""
+        self.conn.execute('BEGIN IMMEDIATE')  # Остальные процессы ждут до COMMIT
+        try:
+            now = time.time()
+            self.conn.execute('DELETE FROM budget_waiters WHERE name = ? AND seen_at < ?',
+                              (self.name, now - STALE_WAITER_SECONDS))
+            self.conn.execute('UPDATE budget_waiters SET seen_at = ? WHERE id = ?', (now, waiter_id))
+            head = self.conn.execute(
+                'SELECT id FROM budget_waiters WHERE name = ? ORDER BY priority, id LIMIT 1', (self.name,)
+            ).fetchone()
+            row = self.conn.execute('SELECT next_at FROM budgets WHERE name = ?', (self.name,)).fetchone()
+            next_at = row[0] if row else 0.0
+
+            first = head is not None and head[0] == waiter_id
+            if first and next_at <= now:
+                # Запас не копится: после простоя следующий запрос - через interval от этого
+                self.conn.execute('INSERT OR REPLACE INTO budgets (name, next_at) VALUES (?, ?)',
+                                  (self.name, now + self.interval))
+                self.conn.execute('DELETE FROM budget_waiters WHERE id = ?', (waiter_id,))
+                self.conn.execute('COMMIT')
+                return True, 0.0
+            self.conn.execute('COMMIT')
+        except sqlite3.Error:
+            self.conn.execute('ROLLBACK')
+            raise
+
+        wait = next_at - now if first else max(next_at - now, POLL_SECONDS)
+        # Не дольше трети срока, чтобы запись ожидающего не сочли устаревшей
+        return False, min(max(wait, 0.01), STALE_WAITER_SECONDS / 3)
+
+    def defer(self, seconds: float) -> None:
+        """Откладывает следующий запрос всех процессов (например, после HTTP 429 от Al-Style)"""
+        if not self.interval or seconds <= 0:
+            return
+        until = time.time() + seconds
+        with self._lock:
+            self.conn.execute(
+                'INSERT INTO budgets (name, next_at) VALUES (?, ?) '
+                'ON CONFLICT(name) DO UPDATE SET next_at = MAX(next_at, excluded.next_at)',
+                (self.name, until)
+            )
+        self.logger.warning(f'Al-Style ограничил частоту запросов, пауза {seconds:.0f} с для всех процессов')
+
+    def close(self) -> None:
+        """Закрывает соединение с базой"""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
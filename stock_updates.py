@@ -0,0 +1,140 @@
+"""
+Списание остатков Al-Style по принятым заказам Kaspi.kz
+Строки заказов сводятся в одно списание на артикул: текущие остатки читаются пакетным
+запросом /quantity, затем по каждому артикулу отправляется один /update-quantity.
+Остаток вида ">N" - только нижняя граница, настоящий остаток неизвестен: для таких артикулов
+абсолютное значение не отправляется, списание отмечается в журнале как пропущенное
+(для ручной обработки) и больше не накапливается
+"""
+
+import logging
+from typing import List, Dict, Any, Callable, Iterable, Optional
+
+from al_style_client import AlStyleClient, get_al_style_client
+from rate_budget import PRIORITY_ORDERS
+
+
+# Сколько артикулов можно передать в одном запросе /quantity (ограничение Al-Style)
+QUANTITY_BATCH_SIZE = 1000
+
+def parse_quantity(value: Any) -> Optional[int]:
+    """
+    Преобразует остаток из ответа Al-Style в число
+
+    Args:
+        value: Значение остатка (число, строка с числом или ">N")
+
+    Returns:
+        Optional[int]: Точный остаток; None для ">N" - настоящий остаток неизвестен, и его нельзя
+                       использовать для расчёта (значение для прайс-листа - get_valid_stock_count в Script.py)
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = value.strip()
+        if '>' in value:
+            return None
+        if value.isdigit():
+            return int(value)
+    return 0
+
+
+def collect_decrements(lines: Iterable[Dict[str, Any]],
+                       decrements: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+    """
+    Суммирует заказанное количество по артикулам
+
+    Args:
+        lines: Строки заказов с ключами product_code и quantity
+        decrements: Существующая карта списаний, которую нужно дополнить
+
+    Returns:
+        Dict[str, int]: {артикул: сколько списать}
+    """
+    decrements = {} if decrements is None else decrements
+    for line in lines:
+        article = str(line['product_code'])
+        decrements[article] = decrements.get(article, 0) + int(line['quantity'])
+    return decrements
+
+
+def fetch_quantities(articles: List[str], client: Optional[AlStyleClient] = None) -> Dict[str, Optional[int]]:
+    """
+    Читает текущие остатки пакетами по QUANTITY_BATCH_SIZE артикулов
+
+    Args:
+        articles: Артикулы
+        client: Клиент Al-Style (по умолчанию общий)
+
+    Returns:
+        Dict[str, Optional[int]]: {артикул: остаток или None для ">N"}; артикулы, для которых
+                                  запрос не удался, отсутствуют
+    """
+    client = client or get_al_style_client()
+    logger = logging.getLogger(__name__)
+    quantities: Dict[str, Optional[int]] = {}
+    for start in range(0, len(articles), QUANTITY_BATCH_SIZE):
+        batch = articles[start:start + QUANTITY_BATCH_SIZE]
+        response = client.get('/quantity', params={'article': ','.join(batch)}, priority=PRIORITY_ORDERS)
+        if response.status_code != 200:
+            logger.error(f"Ошибка при получении остатков ({len(batch)} товаров): {response.status_code}")
+            continue
+        data = response.json()
+        for article in batch:
+            quantities[article] = parse_quantity(data.get(article, 0))
+    return quantities
+
+
+def apply_decrements(decrements: Dict[str, int], client: Optional[AlStyleClient] = None,
+                     on_applied: Optional[Callable[[str, int], None]] = None,
+                     on_skipped: Optional[Callable[[str], None]] = None) -> Dict[str, Optional[int]]:
+    """
+    Списывает остатки: один пакетный /quantity и один /update-quantity на артикул
+
+    Args:
+        decrements: {артикул: сколько списать}
+        client: Клиент Al-Style (по умолчанию общий)
+        on_applied: Вызывается сразу после успешного обновления артикула (article, new_quantity),
+                    например чтобы отметить списание в журнале заказов
+        on_skipped: Вызывается для артикула с неточным остатком ">N" (article): списание
+                    не отправляется и должно быть отмечено как пропущенное, а не повторяться
+
+    Returns:
+        Dict[str, Optional[int]]: {артикул: новый остаток или None, если остаток не обновлён
+                                  (ошибка или неточный остаток ">N")}
+    """
+    client = client or get_al_style_client()
+    logger = logging.getLogger(__name__)
+    articles = [article for article, quantity in decrements.items() if quantity]
+    current = fetch_quantities(articles, client)
+
+    results: Dict[str, Optional[int]] = {}
+    for article in articles:
+        if article not in current:
+            logger.error(f"Ошибка при получении остатка товара {article}")
+            results[article] = None
+            continue
+        if current[article] is None:
+            # ">N" - не настоящий остаток: записать "N - заказано" значило бы выдумать остаток поставщика
+            logger.warning(f"Остаток товара {article} в Al-Style указан неточно (больше N) - "
+                           f"списание {decrements[article]} шт. пропущено, требуется ручная обработка")
+            results[article] = None
+            if on_skipped is not None:
+                on_skipped(article)
+            continue
+
+        # Вычитаем всё заказанное количество сразу; остаток не может быть отрицательным
+        new_quantity = max(current[article] - decrements[article], 0)
+        update_response = client.post('/update-quantity', json={
+            'article': article,
+            'quantity': new_quantity
+        }, priority=PRIORITY_ORDERS)
+        if update_response.status_code == 200:
+            logger.info(f"Остаток товара {article} обновлен до {new_quantity} (списано {decrements[article]})")
+            results[article] = new_quantity
+            if on_applied is not None:
+                on_applied(article, new_quantity)
+        else:
+            logger.error(f"Ошибка при обновлении остатка товара {article}")
+            results[article] = None
+    return results
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Демон синхронизации Al-Style и Kaspi.kz на таймерах asyncio
+Выгрузка каталога, публикация прайс-листа, обработка заказов и проверка результатов
+загрузок - независимые задачи со своим периодом и случайной добавкой к нему.
+Задача не запускается повторно, пока не закончился её предыдущий запуск, а задачи
+одной группы (каталог и прайс-лист) не выполняются одновременно. Поэтому заказы
+обрабатываются по своему расписанию, даже пока идёт долгая выгрузка каталога.
+Если на сервере запущено несколько демонов, задачи выполняет только держатель аренды
+(lease.Lease), остальные ждут и забирают аренду, когда она истечёт. Аренда локальная:
+для нескольких серверов она не подходит
+"""
+
+import time
+import random
+import signal
+import asyncio
+import logging
+from typing import List, Dict, Any, Callable, Optional
+
+from Script import iter_al_style_products, update_kaspi_prices_stock, upload_xml_to_kaspi
+from catalog_store import CatalogStore
+from config import config
+from import_tracker import ImportTracker
+from lease import Lease
+from order_engine import OrderEngine
+
+
+class Job:
+    """Периодическая задача демона"""
+
+    def __init__(self, name: str, func: Callable[[], Any], interval: float,
+                 jitter: Optional[float] = None, group: Optional[str] = None, is_async: bool = False):
+        """
+        Args:
+            name: Имя задачи (для логов)
+            func: Блокирующая функция (выполняется в потоке) или корутинная функция (is_async=True)
+            interval: Период в секундах - от начала одного запуска до начала следующего
+            jitter: Максимальная случайная добавка к периоду, секунд
+                    (по умолчанию config.daemon_jitter_fraction от периода)
+            group: Задачи одной группы не выполняются одновременно
+            is_async: func - корутинная функция
+        """
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = interval * config.daemon_jitter_fraction if jitter is None else jitter
+        self.group = group
+        self.is_async = is_async
+        self.runs = 0
+        self.failures = 0
+        self.last_duration: Optional[float] = None
+
+    def next_delay(self, started: float) -> float:
+        """Сколько ждать до следующего запуска, если текущий начался в started (time.monotonic)"""
+        elapsed = time.monotonic() - started
+        return max(self.interval - elapsed, 0.0) + random.uniform(0, self.jitter)
+
+
+class SyncDaemon:
+    """Запускает задачи по их таймерам до остановки"""
+
+    def __init__(self, jobs: Optional[List[Job]] = None, lease: Optional[Lease] = None):
+        """
+        Args:
+            jobs: Задачи (по умолчанию задачи добавляются через add)
+            lease: Аренда; если задана, задачи выполняются только пока она у этого узла
+        """
+        self.jobs: List[Job] = list(jobs or [])
+        self.lease = lease
+        self.logger = logging.getLogger(__name__)
+        self.group_locks: Dict[str, asyncio.Lock] = {}
+        self.stopping: Optional[asyncio.Event] = None
+
+    def add(self, job: Job) -> None:
+        self.jobs.append(job)
+
+    async def run_once(self, job: Job) -> None:
+        """Один запуск задачи; ошибка задачи не останавливает демон"""
+        if self.lease is not None and not self.lease.held:
+            self.logger.debug(f'{job.name}: аренда у другого узла, пропускаем')
+            return
+        lock = self.group_locks.get(job.group) if job.group else None
+        if lock is not None and lock.locked():
+            self.logger.info(f'{job.name}: ждём завершения другой задачи группы {job.group}')
+        started = time.monotonic()
+        try:
+            if lock is not None:
+                async with lock:
+                    await self._call(job)
+            else:
+                await self._call(job)
+        except Exception as e:
+            job.failures += 1
+            self.logger.error(f'{job.name}: ошибка - {e}')
+        finally:
+            job.runs += 1
+            job.last_duration = time.monotonic() - started
+            self.logger.info(f'{job.name}: завершено за {job.last_duration:.1f} с')
+
+    async def _call(self, job: Job) -> None:
+        if job.is_async:
+            await job.func()
+        else:
+            await asyncio.to_thread(job.func)
+
+    async def _job_loop(self, job: Job) -> None:
+        """Таймер задачи: следующий запуск планируется только после окончания текущего"""
+        # Первые запуски разносятся во времени, чтобы задачи не стартовали одновременно
+        if await self._sleep(random.uniform(0, job.jitter)):
+            return
+        while True:
+            started = time.monotonic()
+            await self.run_once(job)
+            if await self._sleep(job.next_delay(started)):
+                return
+
+    async def _lease_loop(self) -> None:
+        """Захватывает и продлевает аренду каждые ttl/3 секунд"""
+        while True:
+            try:
+                if not await asyncio.to_thread(self.lease.acquire):
+                    owner = self.lease.owner()
+                    self.logger.info(f"Резерв: аренду держит {owner['holder'] if owner else 'другой узел'}")
+            except Exception as e:
+                self.logger.error(f'Ошибка аренды: {e}')
+            if await self._sleep(self.lease.ttl / 3):
+                return
+
+    async def _sleep(self, seconds: float) -> bool:
+        """Ждёт seconds секунд; True, если за это время пришёл сигнал остановки"""
+        try:
+            await asyncio.wait_for(self.stopping.wait(), timeout=seconds)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def run(self) -> None:
+        """Работает до вызова stop() (или SIGINT/SIGTERM); начатые задачи дорабатывают до конца"""
+        self.stopping = asyncio.Event()
+        self.group_locks = {job.group: asyncio.Lock() for job in self.jobs if job.group}
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows: остановка через KeyboardInterrupt
+
+        for job in self.jobs:
+            self.logger.info(f'{job.name}: каждые {job.interval:.0f} с (+ до {job.jitter:.0f} с)')
+        loops = [self._job_loop(job) for job in self.jobs]
+        if self.lease is not None:
+            await asyncio.to_thread(self.lease.acquire)  # До первых запусков задач
+            loops.append(self._lease_loop())
+        try:
+            await asyncio.gather(*loops)
+        finally:
+            if self.lease is not None:
+                self.lease.release()  # Резервный узел заберёт работу сразу
+        self.logger.info('Демон остановлен')
+
+    def stop(self) -> None:
+        """Останавливает таймеры; выполняющиеся задачи не прерываются"""
+        if self.stopping is not None and not self.stopping.is_set():
+            self.logger.info('Остановка демона: ждём завершения начатых задач')
+            self.stopping.set()
+
+
+def sync_catalog() -> None:
+    """Выгрузка каталога Al-Style: полная или только цены и остатки (решает iter_al_style_products)"""
+    count = sum(1 for _ in iter_al_style_products())
+    logging.info(f'Каталог синхронизирован: {count} товаров')
+
+
+def publish_feed() -> None:
+    """Формирует прайс-лист из локального каталога и загружает его в Kaspi (с учётом лимита загрузок)"""
+    store = CatalogStore()
+    try:
+        if not store.count():
+            logging.info('Локальный каталог пуст - прайс-лист будет сформирован после выгрузки каталога')
+            return
+        if update_kaspi_prices_stock(store.iter_products()):
+            upload_xml_to_kaspi(config.xml_filename)
+    finally:
+        store.close()
+
+
+def poll_imports() -> None:
+    """Проверяет результаты загрузок, для которых подошло время"""
+    tracker = ImportTracker()
+    try:
+        tracker.poll_due()
+    finally:
+        tracker.close()
+
+
+def default_jobs(engine: OrderEngine) -> List[Job]:
+    """Задачи демона с периодами из config"""
+    return [
+        Job('Каталог Al-Style', sync_catalog, config.daemon_catalog_interval_minutes * 60, group='catalog'),
+        Job('Прайс-лист Kaspi', publish_feed, config.daemon_feed_interval_minutes * 60, group='catalog'),
+        Job('Заказы Kaspi', engine.run, config.daemon_orders_interval_seconds, is_async=True),
+        Job('Результаты загрузок', poll_imports, config.daemon_imports_interval_seconds),
+    ]
+
+
+def main():
+    """Запускает демон до Ctrl+C / SIGTERM"""
+    engine = OrderEngine()
+    lease = Lease()
+    daemon = SyncDaemon(default_jobs(engine), lease=lease)
+    try:
+        asyncio.run(daemon.run())
+    except KeyboardInterrupt:
+        logging.info('Демон остановлен (Ctrl+C)')
+    finally:
+        engine.close()
+        lease.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,20 @@
+"""
+Общие настройки тестов
+config читает окружение при импорте, поэтому токены и паузы заглушек задаются
+до импорта модулей проекта; каждый тест работает во временном каталоге
+"""
+
+import os
+
+os.environ.setdefault('AL_STYLE_TOKEN', 'mock')
+os.environ.setdefault('KASPI_TOKEN', 'mock')
+os.environ['REQUEST_DELAY'] = '0'
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_cwd(tmp_path, monkeypatch):
+    """Базы SQLite с путями по умолчанию создаются во временном каталоге, а не в репозитории"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
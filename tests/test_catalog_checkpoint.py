@@ -0,0 +1,69 @@
+"""Контрольная точка выгрузки каталога: продолжение, недописанный хвост и устаревание"""
+
+import os
+
+from catalog_checkpoint import CatalogCheckpoint
+
+
+def page(offset, count):
+    return [{'article': offset + number} for number in range(count)]
+
+
+def test_resume_returns_saved_pages(tmp_path):
+    path = str(tmp_path / 'checkpoint.jsonl')
+    checkpoint = CatalogCheckpoint(path)
+    checkpoint.start('2026-10-18 10:00', 2, 123.0)
+    checkpoint.append_page(0, page(0, 2))
+    checkpoint.append_page(2, page(2, 2))
+
+    resumed = CatalogCheckpoint(path)
+    assert resumed.resume('2026-10-18 10:00', 2)
+    assert resumed.header['started_at'] == 123.0
+    assert resumed.next_offset == 4
+    assert list(resumed.iter_pages()) == [page(0, 2), page(2, 2)]
+
+
+def test_truncated_tail_is_cut_and_appending_continues(tmp_path):
+    path = str(tmp_path / 'checkpoint.jsonl')
+    checkpoint = CatalogCheckpoint(path)
+    checkpoint.start('d1', 2, 1.0)
+    checkpoint.append_page(0, page(0, 2))
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"offset": 2, "elements": [{"arti')  # Процесс упал посреди записи
+
+    resumed = CatalogCheckpoint(path)
+    assert resumed.resume('d1', 2)
+    assert resumed.next_offset == 2
+    resumed.append_page(2, page(2, 1))
+
+    again = CatalogCheckpoint(path)
+    assert again.resume('d1', 2)
+    assert list(again.iter_pages()) == [page(0, 2), page(2, 1)]
+
+
+def test_stale_checkpoint_is_removed(tmp_path):
+    path = str(tmp_path / 'checkpoint.jsonl')
+    checkpoint = CatalogCheckpoint(path)
+    checkpoint.start('d1', 2, 1.0)
+    checkpoint.append_page(0, page(0, 2))
+
+    assert not CatalogCheckpoint(path).resume('d2', 2)  # Данные Al-Style изменились
+    assert not os.path.exists(path)
+
+
+def test_other_page_size_or_unknown_date_starts_over(tmp_path):
+    path = str(tmp_path / 'checkpoint.jsonl')
+    for data_date, limit in (('d1', 3), (None, 2)):
+        checkpoint = CatalogCheckpoint(path)
+        checkpoint.start('d1', 2, 1.0)
+        assert not CatalogCheckpoint(path).resume(data_date, limit)
+        assert not os.path.exists(path)
+
+
+def test_corrupted_header_is_removed(tmp_path):
+    path = str(tmp_path / 'checkpoint.jsonl')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('not json\n')
+
+    assert not CatalogCheckpoint(path).resume('d1', 2)
+    assert not os.path.exists(path)
@@ -0,0 +1,129 @@
+"""Потоковая запись прайс-листа: совпадение байт с ElementTree/minidom, хэш и атомарная замена"""
+
+import os
+from xml.dom import minidom
+from xml.etree.ElementTree import Element, SubElement, tostring
+
+import pytest
+
+from feed_writer import KaspiFeedWriter, offers_hash_of_file
+
+
+ROOT_ATTRS = {
+    'date': '2026-10-18T12:00:00',
+    'xmlns': 'kaspiShopping',
+    'xmlns:xsi': 'http://www.w3.org/2001/XMLSchema-instance',
+    'xsi:schemaLocation': 'kaspiShopping http://kaspi.kz/kaspishopping.xsd',
+}
+
+
+def make_offer(sku, model, price, available='yes'):
+    offer = Element('offer', {'sku': sku})
+    SubElement(offer, 'model').text = model
+    SubElement(offer, 'brand').text = ''
+    availabilities = SubElement(offer, 'availabilities')
+    SubElement(availabilities, 'availability', {'available': available, 'storeId': 'PP1', 'stockCount': '3'})
+    SubElement(offer, 'price').text = price
+    return offer
+
+
+OFFERS = [
+    make_offer('A-1', 'Товар "Модель 1" & Co <new>', '1000'),
+    make_offer('B&2', "Кабель 'USB-C'\tдлинный", '25.5', 'no'),
+]
+
+
+def legacy_tree(offers):
+    """Документ целиком в памяти, как его строил Script.py до потоковой записи"""
+    root = Element('kaspi_catalog', ROOT_ATTRS)
+    SubElement(root, 'company').text = 'Магазин & Ко'
+    SubElement(root, 'merchantid').text = '123'
+    offers_element = SubElement(root, 'offers')
+    for offer in offers:
+        offers_element.append(offer)
+    return root
+
+
+def write_feed(path, offers, **kwargs):
+    with KaspiFeedWriter(path, ROOT_ATTRS, **kwargs) as writer:
+        company = Element('company')
+        company.text = 'Магазин & Ко'
+        writer.write(company)
+        merchantid = Element('merchantid')
+        merchantid.text = '123'
+        writer.write(merchantid)
+        writer.start('offers')
+        for offer in offers:
+            writer.write(offer)
+        writer.end()
+    return writer
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_pretty_output_matches_minidom(tmp_path):
+    path = str(tmp_path / 'feed.xml')
+    write_feed(path, OFFERS)
+
+    expected = minidom.parseString(tostring(legacy_tree(OFFERS))).toprettyxml(indent='  ', encoding='utf-8')
+    assert read(path) == expected
+
+
+def test_compact_output_matches_elementtree(tmp_path):
+    path = str(tmp_path / 'feed.xml')
+    write_feed(path, OFFERS, pretty=False, declaration=None)
+
+    assert read(path) == tostring(legacy_tree(OFFERS), encoding='unicode').encode('utf-8')
+
+
+def test_offers_hash_matches_file(tmp_path):
+    path = str(tmp_path / 'feed.xml')
+    writer = write_feed(path, OFFERS)
+
+    assert writer.offers_hash == offers_hash_of_file(path)
+
+
+def test_unchanged_offers_keep_previous_file(tmp_path):
+    path = str(tmp_path / 'feed.xml')
+    first = write_feed(path, OFFERS)
+    before = os.stat(path).st_mtime_ns
+    content = read(path)
+
+    second = write_feed(path, OFFERS, keep_if_hash=first.offers_hash)
+    assert second.unchanged
+    assert read(path) == content and os.stat(path).st_mtime_ns == before
+    assert not os.path.exists(path + '.tmp')
+
+    third = write_feed(path, OFFERS[:1], keep_if_hash=first.offers_hash)
+    assert not third.unchanged
+    assert read(path) != content
+
+
+def test_discard_and_errors_keep_last_good_file(tmp_path):
+    path = str(tmp_path / 'feed.xml')
+    write_feed(path, OFFERS)
+    content = read(path)
+
+    with KaspiFeedWriter(path, ROOT_ATTRS) as writer:
+        writer.start('offers')
+        writer.end()
+        writer.discard()
+    assert read(path) == content
+
+    with pytest.raises(RuntimeError):
+        with KaspiFeedWriter(path, ROOT_ATTRS) as writer:
+            writer.start('offers')
+            raise RuntimeError('Al-Style недоступен')
+    assert read(path) == content
+    assert not os.path.exists(path + '.tmp')
+
+
+def test_tee_receives_whole_document(tmp_path):
+    path = str(tmp_path / 'feed.xml')
+    chunks = []
+    write_feed(path, OFFERS, tee=chunks.append)
+
+    assert ''.join(chunks).encode('utf-8') == read(path)
@@ -0,0 +1,85 @@
+"""Аренда: захват, продление, истечение срока, освобождение и проверка перед действием"""
+
+import time
+
+import pytest
+
+import lease as lease_module
+from lease import Lease, LeaseUnavailable, fencing_ok
+
+
+@pytest.fixture
+def make_lease(tmp_path, monkeypatch):
+    """Аренды разных «процессов» в одной базе; активная аренда процесса сбрасывается после теста"""
+    monkeypatch.setattr(lease_module, '_active_lease', None)
+    path = str(tmp_path / 'lease.db')
+    created = []
+
+    def make(holder, ttl=60.0):
+        item = Lease(path=path, ttl=ttl, holder=holder)
+        created.append(item)
+        return item
+
+    yield make
+    for item in created:
+        item.stop_heartbeat()
+        item.conn.close()
+
+
+def test_only_one_holder(make_lease):
+    a, b = make_lease('a'), make_lease('b')
+
+    assert a.acquire()
+    assert a.token == 1
+    assert not b.acquire()
+    assert b.owner()['holder'] == 'a'
+
+    assert a.acquire()  # Продление своей аренды не меняет номер
+    assert a.token == 1 and a.is_valid()
+
+
+def test_expired_lease_is_taken_over_with_new_token(make_lease):
+    a, b = make_lease('a', ttl=0.2), make_lease('b', ttl=0.2)
+    assert a.acquire()
+    time.sleep(0.3)
+
+    assert b.acquire()
+    assert b.token == 2
+    assert not a.is_valid()
+    assert not a.acquire()  # Прежний владелец узнаёт о потере аренды
+    assert a.token is None
+
+
+def test_fencing_blocks_side_effects_after_loss(make_lease, monkeypatch):
+    a, b = make_lease('a', ttl=0.2), make_lease('b', ttl=0.2)
+    assert a.acquire()
+    assert fencing_ok('Загрузка')
+
+    time.sleep(0.3)
+    assert b.acquire()
+    monkeypatch.setattr(lease_module, '_active_lease', a)  # Этот процесс всё ещё считает аренду своей
+    assert not fencing_ok('Загрузка')
+
+
+def test_fencing_without_lease_allows_action(make_lease):
+    assert lease_module.active_lease() is None
+    assert fencing_ok('Разовый запуск')
+
+
+def test_release_hands_over_immediately(make_lease):
+    a, b = make_lease('a'), make_lease('b')
+    assert a.acquire()
+    a.release()
+
+    assert lease_module.active_lease() is None
+    assert b.acquire()
+    assert b.token == 2  # Номер растёт и после добровольного освобождения
+
+
+def test_context_manager_raises_when_held(tmp_path, make_lease):
+    a = make_lease('a')
+    assert a.acquire()
+
+    with pytest.raises(LeaseUnavailable):
+        with Lease(path=str(tmp_path / 'lease.db'), ttl=60, holder='b'):
+            pass
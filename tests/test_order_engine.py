@@ -0,0 +1,96 @@
+"""Обработка заказов целиком на заглушках mock_servers: принятие, списание остатков и сверка журнала"""
+
+import asyncio
+from collections import defaultdict
+
+import pytest
+
+import al_style_client
+from config import config
+from mock_servers import MockCatalog, MockOrders, MockImports, MockServers, UpstreamProfile
+from order_engine import OrderEngine
+from order_ledger import OrderLedger, STATUS_ACCEPTING, STATUS_CANCELLED, STATUS_DONE
+
+
+@pytest.fixture
+def mock(monkeypatch):
+    catalog = MockCatalog(100)
+    orders = MockOrders(20, catalog, entries_per_order=3, days=2.0, seed=7)
+    servers = MockServers(catalog, orders, MockImports(processing_seconds=0), UpstreamProfile(),
+                          UpstreamProfile()).start()
+    monkeypatch.setattr(config, 'al_style_api_url', servers.al_style_url)
+    monkeypatch.setattr(config, 'kaspi_orders_url', f'{servers.kaspi_url}/shop/api/v2/orders')
+    monkeypatch.setattr(al_style_client, '_client', None)  # Общий клиент - на адрес заглушки
+    yield servers, catalog, orders
+    servers.stop()
+
+
+@pytest.fixture
+def engine(tmp_path, mock):
+    ledger = OrderLedger(str(tmp_path / 'orders.db'))
+    engine = OrderEngine(ledger=ledger, kaspi_concurrency=4)
+    yield engine
+    engine.close()
+
+
+def ordered_by_article(orders):
+    totals = defaultdict(int)
+    for entry in orders.entries.values():
+        totals[str(entry['article'])] += entry['quantity']
+    return totals
+
+
+def ledger_statuses(ledger):
+    rows = ledger.conn.execute('SELECT status, COUNT(*) AS count FROM orders GROUP BY status')
+    return {row['status']: row['count'] for row in rows}
+
+
+def test_run_accepts_orders_and_applies_stock(mock, engine):
+    _, catalog, orders = mock
+    initial = {article: catalog.quantity(catalog.index(article)) for article in ordered_by_article(orders)}
+
+    asyncio.run(engine.run())
+
+    assert all(order['status'] == 'ACCEPTED_BY_MERCHANT' for order in orders.orders)
+    assert ledger_statuses(engine.ledger) == {STATUS_DONE: len(orders.orders)}
+    for article, ordered in ordered_by_article(orders).items():
+        index = catalog.index(article)
+        if isinstance(initial[article], str):
+            # ">50" - настоящий остаток неизвестен: ничего не записано, списание пропущено
+            assert index not in catalog.quantities
+        else:
+            assert catalog.quantities[index] == max(initial[article] - ordered, 0)
+
+
+def test_second_run_does_not_touch_processed_orders(mock, engine):
+    _, catalog, _ = mock
+    asyncio.run(engine.run())
+    quantities = dict(catalog.quantities)
+
+    asyncio.run(engine.run())
+
+    assert engine.kaspi.request_count == 1  # Только страница списка заказов
+    assert catalog.quantities == quantities
+
+
+def test_startup_reconciles_interrupted_acceptance(mock, engine):
+    _, catalog, orders = mock
+    accepted, cancelled = orders.orders[0], orders.orders[1]
+    for order in (accepted, cancelled):
+        lines = [{'entry_id': entry_id, 'product_code': str(orders.entries[entry_id]['article']),
+                  'quantity': orders.entries[entry_id]['quantity']} for entry_id in order['entries']]
+        engine.ledger.record_order(order['id'], order['code'], lines)
+        engine.ledger.set_status(order['id'], STATUS_ACCEPTING)
+    # Процесс упал после принятия первого заказа; второй покупатель отменил
+    orders.set_status(accepted['id'], 'ACCEPTED_BY_MERCHANT')
+    orders.set_status(cancelled['id'], 'CANCELLED')
+
+    asyncio.run(engine.run())
+
+    statuses = engine.ledger.statuses([accepted['id'], cancelled['id']])
+    assert statuses == {accepted['id']: STATUS_DONE, cancelled['id']: STATUS_CANCELLED}
+    pending_or_applied = engine.ledger.conn.execute(
+        'SELECT COUNT(*) FROM stock_effects WHERE order_id = ? AND applied_at IS NULL AND skipped_at IS NULL',
+        (accepted['id'],)
+    ).fetchone()[0]
+    assert pending_or_applied == 0
@@ -0,0 +1,138 @@
+"""Журнал заказов: переходы статусов, списания и миграция базы"""
+
+import sqlite3
+
+import pytest
+
+from order_ledger import (OrderLedger, STATUS_NEW, STATUS_ACCEPTING, STATUS_ACCEPTED, STATUS_ACCEPT_FAILED,
+                          STATUS_DONE, STATUS_CANCELLED)
+
+
+def lines(*items):
+    """Строки заказа: (entry_id, артикул, количество)"""
+    return [{'entry_id': entry_id, 'product_code': article, 'quantity': quantity}
+            for entry_id, article, quantity in items]
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = OrderLedger(str(tmp_path / 'orders.db'))
+    yield ledger
+    ledger.close()
+
+
+def transitions(ledger, order_id):
+    rows = ledger.conn.execute(
+        'SELECT from_status, to_status FROM order_transitions WHERE order_id = ? ORDER BY id', (order_id,)
+    )
+    return [(row['from_status'], row['to_status']) for row in rows]
+
+
+def test_record_order_is_idempotent(ledger):
+    ledger.record_order('o1', '100', lines(('e1', 'A', 2)))
+    ledger.record_order('o1', '100', lines(('e1', 'A', 5), ('e2', 'B', 1)))
+
+    assert ledger.statuses(['o1', 'unknown']) == {'o1': STATUS_NEW}
+    effects = ledger.conn.execute('SELECT entry_id, quantity FROM stock_effects').fetchall()
+    assert [(row['entry_id'], row['quantity']) for row in effects] == [('e1', 2)]
+    assert transitions(ledger, 'o1') == [(None, STATUS_NEW)]
+
+
+def test_status_transitions_are_logged_once(ledger):
+    ledger.record_order('o1', '100', lines(('e1', 'A', 1)))
+    ledger.set_status('o1', STATUS_ACCEPTING)
+    ledger.set_status('o1', STATUS_ACCEPTING)
+    ledger.set_status('o1', STATUS_ACCEPTED)
+
+    assert transitions(ledger, 'o1') == [
+        (None, STATUS_NEW), (STATUS_NEW, STATUS_ACCEPTING), (STATUS_ACCEPTING, STATUS_ACCEPTED),
+    ]
+    with pytest.raises(KeyError):
+        ledger.set_status('missing', STATUS_ACCEPTED)
+
+
+def test_unsettled_lists_new_and_accepting(ledger):
+    for order_id, status in (('o1', STATUS_NEW), ('o2', STATUS_ACCEPTING), ('o3', STATUS_ACCEPTED),
+                             ('o4', STATUS_ACCEPT_FAILED)):
+        ledger.record_order(order_id, order_id, lines((f'{order_id}e', 'A', 1)))
+        ledger.set_status(order_id, status)
+
+    assert sorted(row['order_id'] for row in ledger.unsettled()) == ['o1', 'o2']
+
+
+def test_pending_decrements_only_for_accepted_orders(ledger):
+    ledger.record_order('o1', '1', lines(('e1', 'A', 2), ('e2', 'B', 1)))
+    ledger.record_order('o2', '2', lines(('e3', 'A', 3)))
+    ledger.record_order('o3', '3', lines(('e4', 'A', 7)))
+    ledger.set_status('o1', STATUS_ACCEPTED)
+    ledger.set_status('o2', STATUS_ACCEPTED)
+    ledger.set_status('o3', STATUS_CANCELLED)
+
+    assert ledger.pending_decrements() == {'A': 5, 'B': 1}
+
+
+def test_applied_decrements_complete_orders(ledger):
+    ledger.record_order('o1', '1', lines(('e1', 'A', 2), ('e2', 'B', 1)))
+    ledger.set_status('o1', STATUS_ACCEPTED)
+
+    ledger.mark_applied('A', 8)
+    assert ledger.pending_decrements() == {'B': 1}
+    assert ledger.complete_orders() == 0
+
+    ledger.mark_applied('B', 0)
+    assert ledger.pending_decrements() == {}
+    assert ledger.complete_orders() == 1
+    assert ledger.statuses(['o1']) == {'o1': STATUS_DONE}
+    assert transitions(ledger, 'o1')[-1] == (STATUS_ACCEPTED, STATUS_DONE)
+
+
+def test_skipped_decrements_do_not_accumulate(ledger):
+    ledger.record_order('o1', '1', lines(('e1', 'A', 2)))
+    ledger.set_status('o1', STATUS_ACCEPTED)
+    ledger.mark_skipped('A')
+
+    # Пропущенное списание не повторяется и не копится: заказ завершается
+    assert ledger.pending_decrements() == {}
+    assert ledger.complete_orders() == 1
+
+    # Новый заказ того же артикула списывается только на своё количество
+    ledger.record_order('o2', '2', lines(('e2', 'A', 3)))
+    ledger.set_status('o2', STATUS_ACCEPTED)
+    assert ledger.pending_decrements() == {'A': 3}
+
+    # Применение не затрагивает уже пропущенные строки
+    ledger.mark_applied('A', 10)
+    skipped = ledger.conn.execute(
+        'SELECT applied_at, skipped_at FROM stock_effects WHERE entry_id = ?', ('e1',)
+    ).fetchone()
+    assert skipped['applied_at'] is None and skipped['skipped_at'] is not None
+
+
+def test_watermark_and_full_sweep_meta(ledger):
+    assert ledger.watermark is None
+    ledger.set_watermark(1700000000123)
+    ledger.set_last_full_sweep(1700000000.5)
+
+    assert ledger.watermark == 1700000000123
+    assert ledger.last_full_sweep == 1700000000.5
+
+
+def test_migration_adds_skipped_column(tmp_path):
+    path = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE stock_effects (
+            order_id TEXT NOT NULL, entry_id TEXT NOT NULL, article TEXT NOT NULL,
+            quantity INTEGER NOT NULL, applied_at REAL, PRIMARY KEY (order_id, entry_id)
+        );
+        INSERT INTO stock_effects VALUES ('o1', 'e1', 'A', 1, NULL);
+    """)
+    conn.close()
+
+    ledger = OrderLedger(path)
+    try:
+        columns = {row['name'] for row in ledger.conn.execute('PRAGMA table_info(stock_effects)')}
+        assert 'skipped_at' in columns
+        assert ledger.conn.execute('SELECT COUNT(*) FROM stock_effects').fetchone()[0] == 1
+    finally:
+        ledger.close()
@@ -0,0 +1,123 @@
+"""Лимит загрузок прайс-листа: распознавание отказа, время сброса, изучение окна и очередь"""
+
+import time
+import datetime
+from email.utils import format_datetime
+
+import pytest
+import requests
+
+from upload_scheduler import (UploadScheduler, is_limited, retry_at_from_response,
+                              UPLOAD_UPLOADED, UPLOAD_QUEUED, UPLOAD_FAILED)
+
+
+def response(status_code, text='', headers=None):
+    result = requests.Response()
+    result.status_code = status_code
+    result._content = text.encode('utf-8')
+    result.headers.update(headers or {})
+    return result
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    scheduler = UploadScheduler(str(tmp_path / 'imports.db'))
+    yield scheduler
+    scheduler.close()
+
+
+def test_only_429_or_rate_limit_headers_are_limits():
+    assert is_limited(response(429))
+    assert is_limited(response(403, headers={'X-RateLimit-Remaining': '0'}))
+    # Обычные ошибки проверки со словом limit - не лимит загрузок
+    assert not is_limited(response(400, 'price limit exceeded'))
+    assert not is_limited(response(503, 'length limit, retry at 12:30'))
+    assert not is_limited(response(200, headers={'X-RateLimit-Remaining': '0'}))
+
+
+def test_retry_at_from_headers():
+    now = 1_800_000_000.0
+    assert retry_at_from_response(response(429, headers={'Retry-After': '120'}), now) == now + 120
+    moment = datetime.datetime.fromtimestamp(now + 300, datetime.timezone.utc)
+    assert retry_at_from_response(response(429, headers={'Retry-After': format_datetime(moment, usegmt=True)}),
+                                  now) == now + 300
+    assert retry_at_from_response(response(429, headers={'X-RateLimit-Reset': '60'}), now) == now + 60
+    assert retry_at_from_response(response(429, headers={'X-RateLimit-Reset': str(now + 90)}), now) == now + 90
+
+
+def test_retry_at_only_near_limit_phrase():
+    now = time.mktime((2026, 10, 18, 12, 0, 0, 0, 0, -1))
+    near = retry_at_from_response(response(429, 'Лимит загрузок исчерпан, повторите после 21:43'), now)
+    assert time.localtime(near)[3:5] == (21, 43)
+
+    far = 'Заказ от 10:15 обработан. ' + 'x' * 200 + ' upload limit reached'
+    assert retry_at_from_response(response(429, far), now) is None
+
+    dated = retry_at_from_response(response(429, 'limit; try at 2026-10-19 03:00:00'), now)
+    assert time.localtime(dated)[:5] == (2026, 10, 19, 3, 0)
+
+
+def test_validation_error_does_not_block(scheduler):
+    assert not scheduler.record_response(response(400, 'length limit exceeded at 12:30'))
+    assert scheduler.seconds_until_slot() == 0
+
+
+def test_limit_blocks_until_retry_and_learns_uploads_per_window(scheduler):
+    scheduler.record_response(response(200))
+    scheduler.record_response(response(202))
+    assert scheduler.record_response(response(429, headers={'Retry-After': '600'}))
+
+    assert scheduler.learned_limit == 2
+    assert 590 < scheduler.seconds_until_slot() <= 600
+
+
+def test_limit_header_sets_uploads_per_window(scheduler):
+    scheduler.record_response(response(200, headers={'X-RateLimit-Limit': '5'}))
+    assert scheduler.learned_limit == 5
+
+
+def test_window_length_is_learned_from_resets(scheduler):
+    reset = 1_800_000_000.0
+    scheduler.block_until(reset)
+    scheduler.block_until(reset + 12 * 3600)
+    assert scheduler.window_seconds == 12 * 3600
+
+    # Между сбросами прошло два окна - длина окна не меняется
+    scheduler.block_until(reset + 36 * 3600)
+    assert scheduler.window_seconds == 12 * 3600
+
+
+def test_learned_limit_closes_window_until_next_reset(scheduler):
+    now = time.time()
+    scheduler.set_meta('reset_at', str(now - 3600))
+    scheduler.set_meta('window_seconds', str(4 * 3600))
+    scheduler.set_meta('uploads_per_window', '1')
+    assert scheduler.next_slot(now) == now
+
+    scheduler.record_response(response(200))
+    assert scheduler.next_slot(now) == pytest.approx(now + 3 * 3600)
+
+
+def test_queue_keeps_one_entry_and_its_place(scheduler):
+    scheduler.enqueue('a.xml')
+    scheduler.enqueue('b.xml')
+    scheduler.enqueue('a.xml')
+
+    assert [item['feed_path'] for item in scheduler.queued()] == ['a.xml', 'b.xml']
+
+
+def test_run_pending_dequeues_only_uploaded(scheduler):
+    for path in ('a.xml', 'b.xml', 'c.xml'):
+        scheduler.enqueue(path)
+    results = {'a.xml': UPLOAD_UPLOADED, 'b.xml': UPLOAD_FAILED, 'c.xml': UPLOAD_QUEUED}
+
+    assert scheduler.run_pending(results.get) == 1
+    assert [item['feed_path'] for item in scheduler.queued()] == ['b.xml', 'c.xml']
+
+
+def test_run_pending_waits_for_window(scheduler):
+    scheduler.enqueue('a.xml')
+    scheduler.block_until(time.time() + 600)
+
+    assert scheduler.run_pending(lambda path: pytest.fail('окно закрыто')) == 0
+    assert len(scheduler.queued()) == 1
@@ -5,10 +5,10 @@
 import json
 import time
 import logging
-from xml.etree.ElementTree import Element, SubElement, tostring
-import xml.dom.minidom
-from Script import get_al_style_products
+from xml.etree.ElementTree import Element, SubElement
+from Script import get_local_products
 from config import config
+from feed_writer import KaspiFeedWriter
 
 def generate_ultra_precise_xml(products):
     """Генерирует XML точно по образцу оригинального kaspi_price_list.xml"""
@@ -16,85 +16,83 @@ def generate_ultra_precise_xml(products):
     print("🎯 Создание XML точно по образцу оригинального файла")
     print("=" * 50)
     
-    # Создаем корневой элемент ТОЧНО как в оригинале
-    kaspi_catalog = Element('kaspi_catalog', {
+    # Атрибуты корневого элемента
+    catalog_attrs = {
         'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
         'xmlns': 'kaspiShopping',
         'xmlns:xsi': 'http://www.w3.org/2001/XMLSchema-instance',
         'xsi:schemaLocation': 'kaspiShopping http://kaspi.kz/kaspishopping.xsd'
-    })
+    }
     
-    # Компания
-    company = SubElement(kaspi_catalog, 'company')
-    company.text = config.company_name
-    
-    # ID продавца
-    merchantid = SubElement(kaspi_catalog, 'merchantid')
-    merchantid.text = config.merchant_id
-    
-    # Offers
-    offers = SubElement(kaspi_catalog, 'offers')
-    
-    processed_count = 0
-    
-    for product in products:
-        try:
-            # SKU - обязательное поле
-            sku = str(product.get('article_pn') or product.get('article') or '').strip()
-            if not sku:
-                continue
+    # Пишем XML в файл потоком, без построения всего дерева в памяти
+    filename = f'kaspi_ultra_precise_{time.strftime("%Y%m%d_%H%M%S")}.xml'
+    with KaspiFeedWriter(filename, catalog_attrs, pretty=False,
+                         declaration='<?xml version="1.0" encoding="UTF-8"?>') as writer:
+        # Компания
+        company = Element('company')
+        company.text = config.company_name
+        writer.write(company)
+        
+        # ID продавца
+        merchantid = Element('merchantid')
+        merchantid.text = config.merchant_id
+        writer.write(merchantid)
+        
+        # Offers
+        writer.start('offers')
+        
+        processed_count = 0
+        
+        for product in products:
+            try:
+                # SKU - обязательное поле
+                sku = str(product.get('article_pn') or product.get('article') or '').strip()
+                if not sku:
+                    continue
+                    
+                # Название товара
+                name = product.get('name', '').strip()
+                if not name:
+                    continue
+                    
+                offer = Element('offer', {
+                    'sku': sku
+                })
                 
-            # Название товара
-            name = product.get('name', '').strip()
-            if not name:
-                continue
+                # ТОЧНО как в оригинале:
+                # 1. model
+                model = SubElement(offer, 'model')
+                model.text = name
                 
-            offer = SubElement(offers, 'offer', {
-                'sku': sku
-            })
-            
-            # ТОЧНО как в оригинале:
-            # 1. model
-            model = SubElement(offer, 'model')
-            model.text = name
-            
-            # 2. brand
-            brand = SubElement(offer, 'brand')
-            brand.text = product.get('brand', 'Unknown').strip()
-            
-            # 3. availabilities (ТОЧНО как в оригинале)
-            availabilities = SubElement(offer, 'availabilities')
-            quantity = get_stock_count(product.get('quantity'))
-            
-            # Элемент availability с теми же атрибутами что в оригинале
-            availability = SubElement(availabilities, 'availability', {
-                'available': 'yes' if int(quantity) > 0 else 'no',
-                'storeId': config.store_id,
-                'preOrder': '0',
-                'stockCount': quantity
-            })
-            
-            # 4. price (ТОЧНО как в оригинале)
-            price = SubElement(offer, 'price')
-            price_value = product.get('price2') or product.get('price1') or '0'
-            price.text = str(price_value)
-            
-            processed_count += 1
-            
-        except Exception as e:
-            logging.error(f"Ошибка при обработке товара {sku}: {e}")
-            continue
-    
-    # Сохраняем БЕЗ XML декларации (как в оригинале)
-    rough_string = tostring(kaspi_catalog, encoding='unicode')
-    
-    # Добавляем XML декларацию вручную
-    xml_content = '<?xml version="1.0" encoding="UTF-8"?>\n' + rough_string
-    
-    # Сохраняем файл
-    filename = f'kaspi_ultra_precise_{time.strftime("%Y%m%d_%H%M%S")}.xml'
-    with open(filename, 'w', encoding='utf-8') as f:
-        f.write(xml_content)
+                # 2. brand
+                brand = SubElement(offer, 'brand')
+                brand.text = product.get('brand', 'Unknown').strip()
+                
+                # 3. availabilities (ТОЧНО как в оригинале)
+                availabilities = SubElement(offer, 'availabilities')
+                quantity = get_stock_count(product.get('quantity'))
+                
+                # Элемент availability с теми же атрибутами что в оригинале
+                availability = SubElement(availabilities, 'availability', {
+                    'available': 'yes' if int(quantity) > 0 else 'no',
+                    'storeId': config.store_id,
+                    'preOrder': '0',
+                    'stockCount': quantity
+                })
+                
+                # 4. price (ТОЧНО как в оригинале)
+                price = SubElement(offer, 'price')
+                price_value = product.get('price2') or product.get('price1') or '0'
+                price.text = str(price_value)
+                
+                writer.write(offer)  # Записываем предложение и освобождаем память
+                processed_count += 1
+                
+            except Exception as e:
+                logging.error(f"Ошибка при обработке товара {sku}: {e}")
+                continue
+        
+        writer.end()  # </offers>
     
     print(f"✅ Создан ультра-точный XML: {filename}")
     print(f"📊 Обработано товаров: {processed_count}")
@@ -125,7 +123,7 @@ def main():
     print("=" * 50)
     
     # Получаем товары
-    products = get_al_style_products()
+    products = get_local_products()
     
     if not products:
         print("❌ Не удалось получить товары")
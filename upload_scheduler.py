@@ -0,0 +1,310 @@
+"""
+Планировщик загрузок прайс-листа в Kaspi.kz с учётом лимита загрузок
+Окно лимита не задаётся вручную: время сброса и число загрузок в окне берутся
+из ответов Kaspi (HTTP 429 и X-RateLimit-*, Retry-After, время рядом с упоминанием
+лимита в тексте ответа) и сохраняются в SQLite. Пока окно закрыто, прайс-листы
+ставятся в очередь - по одной записи на файл; файл читается в момент загрузки,
+поэтому уходит его последняя версия
+"""
+
+import re
+import time
+import sqlite3
+import logging
+import datetime
+from email.utils import parsedate_to_datetime
+from typing import List, Dict, Any, Callable, Optional
+
+import requests
+
+from config import config
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS upload_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    at REAL NOT NULL,
+    status_code INTEGER,
+    limited INTEGER NOT NULL DEFAULT 0,
+    retry_at REAL
+);
+CREATE TABLE IF NOT EXISTS upload_queue (
+    feed_path TEXT PRIMARY KEY,
+    queued_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS upload_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Итог попытки загрузки прайс-листа
+UPLOAD_UPLOADED = 'uploaded'  # Загружен (или эти предложения уже были загружены)
+UPLOAD_QUEUED = 'queued'      # Окно лимита закрыто - файл ждёт в очереди
+UPLOAD_FAILED = 'failed'      # Ошибка загрузки
+
+# Упоминания лимита в тексте ответа: время сброса ищется только рядом с ними
+LIMIT_WORDS = ('limit', 'лимит', 'too many', 'слишком много')
+# Сколько символов вокруг упоминания лимита просматривать в поисках времени
+LIMIT_CONTEXT_CHARS = 80
+
+# Дата и время или только время ("лимит исчерпан, повторите после 21:43") в тексте ответа
+DATETIME_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2})[T ](\d{1,2}):(\d{2})(?::(\d{2}))?')
+TIME_PATTERN = re.compile(r'(?<![\d:])(\d{1,2}):(\d{2})(?![\d:])')
+
+
+def _next_time_of_day(hour: int, minute: int, now: float) -> float:
+    """Ближайший момент (сегодня или завтра) с указанным местным временем"""
+    current = datetime.datetime.fromtimestamp(now)
+    moment = current.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if moment.timestamp() <= now:
+        moment += datetime.timedelta(days=1)
+    return moment.timestamp()
+
+
+def _limit_contexts(text: str) -> List[str]:
+    """Фрагменты текста вокруг упоминаний лимита (время в других местах ответа не учитывается)"""
+    lowered = text.lower()
+    contexts = []
+    for word in LIMIT_WORDS:
+        start = lowered.find(word)
+        while start != -1:
+            contexts.append(text[max(start - LIMIT_CONTEXT_CHARS, 0):start + len(word) + LIMIT_CONTEXT_CHARS])
+            start = lowered.find(word, start + 1)
+    return contexts
+
+
+def retry_at_from_response(response: requests.Response, now: Optional[float] = None) -> Optional[float]:
+    """
+    Когда можно повторить загрузку, по данным ответа Kaspi
+
+    Args:
+        response: Ответ на загрузку
+        now: Текущее время (unix)
+
+    Returns:
+        Optional[float]: Время (unix) или None, если в ответе этого нет
+    """
+    now = time.time() if now is None else now
+    retry_after = response.headers.get('Retry-After')
+    if retry_after:
+        if retry_after.strip().isdigit():
+            return now + int(retry_after)
+        try:
+            return parsedate_to_datetime(retry_after).timestamp()
+        except (TypeError, ValueError):
+            pass
+
+    reset = response.headers.get('X-RateLimit-Reset')
+    if reset:
+        try:
+            value = float(reset)
+            # Абсолютное время (unix) или число секунд до сброса
+            return value if value > 1e9 else now + value
+        except ValueError:
+            pass
+
+    for context in _limit_contexts(response.text or ''):
+        match = DATETIME_PATTERN.search(context)
+        if match:
+            date, hour, minute, second = match.groups()
+            try:
+                moment = datetime.datetime.strptime(f'{date} {hour}:{minute}:{second or "00"}',
+                                                    '%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                continue
+            return moment.timestamp()
+        match = TIME_PATTERN.search(context)
+        if match and int(match.group(1)) < 24 and int(match.group(2)) < 60:
+            return _next_time_of_day(int(match.group(1)), int(match.group(2)), now)
+    return None
+
+
+def is_limited(response: requests.Response) -> bool:
+    """
+    True, если Kaspi отказал из-за лимита загрузок
+
+    Лимитом считаются только HTTP 429 и отказ с X-RateLimit-Remaining: 0. Текст ответа
+    не учитывается: в обычных ошибках проверки ("price limit", "length limit") тоже есть "limit"
+    """
+    if response.status_code == 429:
+        return True
+    return response.headers.get('X-RateLimit-Remaining') == '0' and response.status_code >= 400
+
+
+class UploadScheduler:
+    """Окно лимита загрузок, изученное по ответам Kaspi, и очередь прайс-листов"""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: Путь к файлу базы (по умолчанию config.import_tracker_path - рядом с журналом загрузок)
+        """
+        self.path = path or config.import_tracker_path
+        self.logger = logging.getLogger(__name__)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def get_meta(self, key: str) -> Optional[str]:
+        """Возвращает служебное значение из таблицы upload_meta"""
+        row = self.conn.execute('SELECT value FROM upload_meta WHERE key = ?', (key,)).fetchone()
+        return row['value'] if row else None
+
+    def set_meta(self, key: str, value: Optional[str]) -> None:
+        """Сохраняет служебное значение в таблицу upload_meta"""
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO upload_meta (key, value) VALUES (?, ?)', (key, value))
+
+    def _meta_float(self, key: str) -> Optional[float]:
+        value = self.get_meta(key)
+        return float(value) if value else None
+
+    @property
+    def window_seconds(self) -> float:
+        """Длина окна лимита: изученная по двум сбросам подряд или из config"""
+        learned = self._meta_float('window_seconds')
+        return learned or config.kaspi_upload_window_hours * 3600
+
+    @property
+    def learned_limit(self) -> Optional[int]:
+        """Сколько загрузок Kaspi принимает за окно (по последнему отказу)"""
+        value = self.get_meta('uploads_per_window')
+        return int(value) if value else None
+
+    def _window_start(self, now: float) -> Optional[float]:
+        """Начало текущего окна по последнему известному времени сброса"""
+        reset_at = self._meta_float('reset_at')
+        if reset_at is None or reset_at > now:
+            return None
+        periods = int((now - reset_at) // self.window_seconds)
+        return reset_at + periods * self.window_seconds
+
+    def uploads_in_window(self, now: Optional[float] = None) -> int:
+        """Успешные загрузки с начала текущего окна"""
+        now = time.time() if now is None else now
+        start = self._window_start(now)
+        if start is None:
+            start = now - self.window_seconds
+        row = self.conn.execute(
+            'SELECT COUNT(*) AS count FROM upload_log WHERE limited = 0 AND status_code < 300 AND at >= ?',
+            (start,)
+        ).fetchone()
+        return row['count']
+
+    def next_slot(self, now: Optional[float] = None) -> float:
+        """
+        Когда можно загружать следующий прайс-лист
+
+        Returns:
+            float: Время (unix); не больше now, если загружать можно сейчас
+        """
+        now = time.time() if now is None else now
+        blocked_until = self._meta_float('blocked_until')
+        if blocked_until and blocked_until > now:
+            return blocked_until
+
+        limit = self.learned_limit
+        if limit and self.uploads_in_window(now) >= limit:
+            start = self._window_start(now)
+            if start is not None:
+                return start + self.window_seconds
+        return now
+
+    def seconds_until_slot(self) -> float:
+        """Сколько секунд ждать до ближайшей разрешённой загрузки (0 - можно сейчас)"""
+        return max(self.next_slot() - time.time(), 0.0)
+
+    def block_until(self, moment: float) -> None:
+        """Запрещает загрузки до указанного времени (например, время сброса из сообщения Kaspi)"""
+        self.set_meta('blocked_until', str(moment))
+        self._learn_reset(moment)
+
+    def _learn_reset(self, reset_at: float) -> None:
+        """Запоминает время сброса лимита и длину окна между двумя разными сбросами"""
+        previous = self._meta_float('reset_at')
+        if previous and reset_at - previous > 60:
+            # Между сбросами может пройти несколько окон - берём наименьшее правдоподобное
+            gap = reset_at - previous
+            window = self.window_seconds
+            periods = max(round(gap / window), 1)
+            self.set_meta('window_seconds', str(gap / periods))
+        self.set_meta('reset_at', str(reset_at))
+
+    def record_response(self, response: requests.Response) -> bool:
+        """
+        Учитывает ответ Kaspi на загрузку: успешная загрузка или отказ по лимиту
+
+        Returns:
+            bool: True, если загрузка отклонена из-за лимита
+        """
+        now = time.time()
+        limited = is_limited(response)
+        retry_at = retry_at_from_response(response, now) if limited else None
+        with self.conn:
+            self.conn.execute(
+                'INSERT INTO upload_log (at, status_code, limited, retry_at) VALUES (?, ?, ?, ?)',
+                (now, response.status_code, int(limited), retry_at)
+            )
+        header_limit = response.headers.get('X-RateLimit-Limit')
+        if header_limit and header_limit.isdigit():
+            self.set_meta('uploads_per_window', header_limit)
+
+        if not limited:
+            return False
+
+        # Сколько загрузок прошло до отказа - это и есть лимит окна
+        if not header_limit:
+            self.set_meta('uploads_per_window', str(max(self.uploads_in_window(now), 1)))
+        if retry_at is None:
+            retry_at = now + config.kaspi_upload_retry_minutes * 60
+            self.logger.warning('Kaspi не сообщил время сброса лимита, '
+                                f'повторим через {config.kaspi_upload_retry_minutes} мин')
+            self.set_meta('blocked_until', str(retry_at))
+        else:
+            self.block_until(retry_at)
+        self.logger.warning(f'Лимит загрузок исчерпан, следующая загрузка после '
+                            f'{time.strftime("%Y-%m-%d %H:%M", time.localtime(retry_at))}')
+        return True
+
+    def enqueue(self, feed_path: str) -> None:
+        """Ставит прайс-лист в очередь (одна запись на файл; место в очереди сохраняется)"""
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR IGNORE INTO upload_queue (feed_path, queued_at) VALUES (?, ?)',
+                (feed_path, time.time())
+            )
+
+    def dequeue(self, feed_path: str) -> None:
+        with self.conn:
+            self.conn.execute('DELETE FROM upload_queue WHERE feed_path = ?', (feed_path,))
+
+    def queued(self) -> List[Dict[str, Any]]:
+        """Прайс-листы в очереди (по одной записи на файл)"""
+        rows = self.conn.execute('SELECT feed_path, queued_at FROM upload_queue ORDER BY queued_at')
+        return [dict(row) for row in rows]
+
+    def run_pending(self, upload: Callable[[str], str]) -> int:
+        """
+        Загружает прайс-листы из очереди, если окно лимита открыто
+
+        Args:
+            upload: Функция загрузки файла, возвращающая UPLOAD_* (например, Script.upload_xml_to_kaspi)
+
+        Returns:
+            int: Сколько файлов загружено
+        """
+        uploaded = 0
+        for item in self.queued():
+            if self.seconds_until_slot() > 0:
+                break
+            if upload(item['feed_path']) == UPLOAD_UPLOADED:
+                self.dequeue(item['feed_path'])
+                uploaded += 1
+        return uploaded
+
+    def close(self) -> None:
+        """Закрывает соединение с базой"""
+        self.conn.close()
@@ -2,12 +2,16 @@
 """
 Автоматическая публикация XML прайс-листа на GitHub
 Создает публичный URL для автозагрузки в Kaspi.kz
+Без задержки CDN и коммита на каждую версию прайс-лист отдаёт feed_server.py
 """
 import os
 import time
 import logging
+import subprocess
 from pathlib import Path
 
+from feed_state import FeedState
+
 # Настройка логирования
 logging.basicConfig(
     level=logging.INFO,
@@ -24,25 +28,37 @@ def upload_xml_to_github():
         logging.error(f"❌ Файл {xml_file} не найден!")
         return False
     
+    # Не создаём пустой коммит, если предложения не менялись с последней публикации
+    feed_state = FeedState()
+    if feed_state.is_published(xml_file, 'github'):
+        logging.info("ℹ️ Предложения не изменились - публикация не нужна")
+        return True
+    
     try:
         logging.info("📤 Загрузка XML в GitHub...")
         
         # Добавляем файл в Git
-        os.system('git add kaspi_price_list.xml')
+        subprocess.run(['git', 'add', xml_file], check=True)
         
-        # Создаем коммит с текущей датой
+        # Создаем коммит с текущей датой (если коммит уже есть, но не отправлен - только push)
         commit_message = f"Update price list {time.strftime('%Y-%m-%d %H:%M:%S')}"
-        os.system(f'git commit -m "{commit_message}"')
+        staged = subprocess.run(['git', 'diff', '--cached', '--quiet', '--', xml_file])
+        if staged.returncode not in (0, 1):
+            raise subprocess.CalledProcessError(staged.returncode, staged.args)
+        if staged.returncode == 1:
+            subprocess.run(['git', 'commit', '-m', commit_message, '--', xml_file], check=True)
         
         # Отправляем в GitHub
-        os.system('git push origin main')
+        subprocess.run(['git', 'push', 'origin', 'main'], check=True)
         
+        # Публикация отмечается только после успешного push, иначе он повторится в следующий раз
+        feed_state.mark_published(xml_file, 'github')
         logging.info("✅ XML успешно загружен в GitHub!")
         logging.info("🌐 Публичный URL будет доступен через несколько минут")
         
         return True
         
-    except Exception as e:
+    except (OSError, subprocess.CalledProcessError) as e:
         logging.error(f"❌ Ошибка при загрузке: {e}")
         return False
 
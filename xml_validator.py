@@ -4,55 +4,349 @@ XML Validator для проверки соответствия схеме Kaspi.
 """
 
 import os
+import json
+import time
+import hashlib
 import logging
+import threading
 import requests
 from lxml import etree
-from typing import Tuple, Optional
-import xml.etree.ElementTree as ET
+from typing import Tuple, Optional, Dict, Any, List, Union
+
+from config import config
+
+
+# Структурная резервная схема (составлена по документации, НЕ опубликованная схема Kaspi).
+# Используется, только если Kaspi недоступен и загруженной копии нет
+FALLBACK_SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schemas',
+                                    'kaspishopping_fallback.xsd')
+
+# Как сообщать о проверке по резервной схеме: это не полная валидация
+FALLBACK_NOTE = ' по резервной схеме'
+FALLBACK_VALID_MESSAGE = ("XML проверен по резервной схеме (validated against fallback schema): "
+                          "структура корректна, схема Kaspi.kz недоступна - полная валидация не выполнялась")
+
+# Размер блока при потоковом чтении файла прайс-листа
+READ_CHUNK_SIZE = 1 << 16
+
+# Сколько ошибок предложений показывать в сообщении (полный список - в FeedValidation.offer_errors)
+MAX_REPORTED_OFFER_ERRORS = 20
+
+# Скомпилированные схемы на весь процесс: {schema_url: etree.XMLSchema}
+_schemas: Dict[str, etree.XMLSchema] = {}
+_fallback_urls = set()  # URL, для которых вместо схемы Kaspi загружена резервная схема
+_schemas_lock = threading.Lock()
+
+
+class SchemaCache:
+    """
+    Копия схемы XSD на диске с условным обновлением
+
+    Рядом с копией хранится файл .meta.json с ETag, Last-Modified и временем последней проверки.
+    Пока копия моложе max_age_hours, сеть не используется; затем отправляется условный запрос
+    (If-None-Match / If-Modified-Since). Если Kaspi недоступен, используется имеющаяся копия,
+    а при её отсутствии - структурная резервная схема из schemas/ (тогда fallback = True).
+    """
+
+    def __init__(self, schema_url: str, cache_file: Optional[str] = None,
+                 max_age_hours: Optional[int] = None):
+        """
+        Args:
+            schema_url: URL схемы XSD
+            cache_file: Путь к копии на диске (по умолчанию config.xml_schema_cache_file)
+            max_age_hours: Через сколько часов перепроверять копию (по умолчанию из config)
+        """
+        self.schema_url = schema_url
+        if cache_file is None:
+            cache_file = config.xml_schema_cache_file
+            if schema_url != config.xml_schema_url:
+                # Для нестандартного URL - отдельная копия, чтобы не перепутать схемы
+                suffix = hashlib.sha1(schema_url.encode('utf-8')).hexdigest()[:8]
+                root, ext = os.path.splitext(cache_file)
+                cache_file = f"{root}_{suffix}{ext}"
+        self.cache_file = cache_file
+        self.meta_file = f"{cache_file}.meta.json"
+        self.max_age_hours = config.xml_schema_max_age_hours if max_age_hours is None else max_age_hours
+        self.fallback = False  # Загружена резервная схема, а не схема Kaspi
+        self.logger = logging.getLogger(__name__)
+
+    def _read_meta(self) -> Dict[str, Any]:
+        """Читает ETag/Last-Modified/время проверки сохранённой копии"""
+        try:
+            with open(self.meta_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_meta(self, meta: Dict[str, Any]) -> None:
+        with open(self.meta_file, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+    def is_fresh(self) -> bool:
+        """True, если копия есть и проверялась не раньше max_age_hours назад"""
+        if not os.path.exists(self.cache_file):
+            return False
+        checked_at = self._read_meta().get('checked_at')
+        return bool(checked_at) and time.time() - checked_at < self.max_age_hours * 3600
+
+    def refresh(self) -> bool:
+        """
+        Обновляет копию условным запросом
+
+        Returns:
+            bool: True, если копия на диске актуальна (получена заново или сервер ответил 304)
+        """
+        meta = self._read_meta()
+        headers = {}
+        if os.path.exists(self.cache_file):
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        try:
+            self.logger.info(f"Проверка схемы {self.schema_url}")
+            response = requests.get(self.schema_url, headers=headers, timeout=config.request_timeout)
+            if response.status_code == 304 and headers:
+                meta['checked_at'] = time.time()
+                self._write_meta(meta)
+                self.logger.info("Схема не изменилась, используется копия на диске")
+                return True
+            response.raise_for_status()
+            # Проверяем, что это действительно схема, прежде чем заменить рабочую копию
+            etree.XMLSchema(etree.fromstring(response.content))
+        except requests.exceptions.RequestException as e:
+            self.logger.warning(f"Не удалось обновить схему: {e}")
+            return False
+        except (etree.XMLSyntaxError, etree.XMLSchemaParseError) as e:
+            self.logger.warning(f"Получена некорректная схема: {e}")
+            return False
+
+        tmp_path = f"{self.cache_file}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(response.content)
+        os.replace(tmp_path, self.cache_file)
+        self._write_meta({
+            'url': self.schema_url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'checked_at': time.time()
+        })
+        self.logger.info(f"Схема сохранена в {self.cache_file}")
+        return True
+
+    def load(self) -> Optional[etree.XMLSchema]:
+        """
+        Возвращает скомпилированную схему: из копии на диске (обновив её при необходимости)
+        или из структурной резервной схемы (self.fallback = True)
+
+        Returns:
+            Optional[etree.XMLSchema]: Схема или None, если ни один источник недоступен
+        """
+        if not self.is_fresh():
+            self.refresh()
+
+        for path in (self.cache_file, FALLBACK_SCHEMA_PATH):
+            if not os.path.exists(path):
+                continue
+            try:
+                schema = etree.XMLSchema(etree.parse(path))
+            except (etree.XMLSyntaxError, etree.XMLSchemaParseError) as e:
+                self.logger.warning(f"Схема {path} повреждена: {e}")
+                continue
+            # Копия в кэше может быть резервной схемой, подложенной заранее (benchmark_feeds.py)
+            self.fallback = path == FALLBACK_SCHEMA_PATH or bool(self._read_meta().get('fallback'))
+            if self.fallback:
+                self.logger.warning("Схема Kaspi недоступна - проверка только по структурной резервной схеме "
+                                    "(не опубликованная схема Kaspi)")
+            return schema
+        return None
+
+
+def get_schema(schema_url: Optional[str] = None) -> Optional[etree.XMLSchema]:
+    """
+    Скомпилированная схема XSD, общая для всего процесса
+
+    Схема загружается (с диска или по сети) и компилируется один раз; повторные
+    валидации используют готовый объект etree.XMLSchema.
+
+    Args:
+        schema_url: URL схемы (по умолчанию config.xml_schema_url)
+
+    Returns:
+        Optional[etree.XMLSchema]: Схема или None, если её не удалось получить
+    """
+    schema_url = schema_url or config.xml_schema_url
+    with _schemas_lock:
+        schema = _schemas.get(schema_url)
+        if schema is None:
+            cache = SchemaCache(schema_url)
+            schema = cache.load()
+            if schema is not None:
+                _schemas[schema_url] = schema
+                if cache.fallback:
+                    _fallback_urls.add(schema_url)
+        return schema
+
+
+def is_fallback_schema(schema_url: Optional[str] = None) -> bool:
+    """True, если для schema_url используется структурная резервная схема, а не схема Kaspi"""
+    return (schema_url or config.xml_schema_url) in _fallback_urls
+
+
+class FeedValidation:
+    """
+    Проверка прайс-листа по мере его записи, без повторного разбора готового документа
+
+    Фрагменты документа передаются в feed() (например, из KaspiFeedWriter или блоками из файла),
+    разбираются потоково вместе с проверкой по схеме XSD; заодно проверяются обязательные элементы
+    и собираются все предложения без sku/model/brand/price. Проверенные предложения сразу
+    освобождаются, поэтому память не растёт с размером каталога.
+    """
+
+    def __init__(self, schema: Optional[etree.XMLSchema], fallback: bool = False):
+        """
+        Args:
+            schema: Скомпилированная схема (None - проверяется только структура)
+            fallback: schema - структурная резервная схема, а не схема Kaspi
+        """
+        self.schema = schema
+        self.fallback = fallback
+        # Ошибки схемы при потоковом разборе попадают в общий журнал ошибок lxml потока
+        etree.clear_error_log()
+        if schema is not None:
+            self.parser = etree.XMLPullParser(events=('end',), schema=schema)
+        else:
+            self.parser = etree.XMLPullParser(events=('end',))
+        self.seen = set()  # Встреченные элементы верхнего уровня
+        self.offer_errors: List[str] = []  # Все найденные ошибки предложений
+        self.offers_checked = 0
+        self.syntax_error: Optional[str] = None
+        self.schema_errors = []
+        self.complete = False  # Корневой элемент закрыт
+        self.closed = False
+
+    def feed(self, data: Union[str, bytes]) -> None:
+        """Принимает очередной фрагмент документа (строку или байты)"""
+        if self.syntax_error:
+            return
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        try:
+            self.parser.feed(data)
+        except etree.XMLSyntaxError as e:
+            self.syntax_error = str(e)
+            return
+        self._read_events()
+
+    def _read_events(self) -> None:
+        """Проверяет разобранные элементы и освобождает память"""
+        for _, element in self.parser.read_events():
+            if element.getparent() is None:
+                self.complete = True
+                continue
+            tag = etree.QName(element).localname
+            if tag in ('company', 'merchantid', 'offers'):
+                self.seen.add(tag)
+            elif tag == 'offer':
+                self._check_offer(element)
+                element.clear()
+                # Удаляем уже проверенные предложения из дерева
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+
+    def _check_offer(self, offer) -> None:
+        """Проверяет обязательные поля предложения и запоминает все нарушения"""
+        self.offers_checked += 1
+        sku = offer.get('sku')
+        if not sku:
+            self.offer_errors.append(f"Найдено предложение без SKU (№{self.offers_checked})")
+            return
+        children = {etree.QName(child).localname for child in offer}
+        missing = [req_elem for req_elem in ('model', 'brand', 'price') if req_elem not in children]
+        if len(missing) == 1:
+            self.offer_errors.append(f"В предложении {sku} отсутствует элемент {missing[0]}")
+        elif missing:
+            self.offer_errors.append(f"В предложении {sku} отсутствуют элементы {', '.join(missing)}")
+
+    def close(self) -> None:
+        """Завершает разбор; результаты - в structure_result и schema_result"""
+        if self.closed:
+            return
+        self.closed = True
+        if self.syntax_error:
+            return
+        try:
+            self.parser.close()
+        except etree.XMLSyntaxError as e:
+            self.schema_errors = [
+                f"Строка {error.line}: {error.message}" if error.line else error.message
+                for error in e.error_log if error.domain == etree.ErrorDomains.SCHEMASV
+            ]
+            if not self.schema_errors:
+                self.syntax_error = str(e)
+        self._read_events()
+        if not self.complete and not self.syntax_error:
+            self.syntax_error = "Документ не завершён"
+
+    @property
+    def structure_result(self) -> Tuple[bool, str]:
+        """(все ли обязательные элементы присутствуют, сообщение)"""
+        if self.syntax_error:
+            return False, f"Ошибка парсинга XML: {self.syntax_error}"
+        missing_elements = [name for name in ('company', 'merchantid', 'offers') if name not in self.seen]
+        if missing_elements:
+            return False, f"Отсутствуют обязательные элементы: {', '.join(missing_elements)}"
+        if len(self.offer_errors) == 1:
+            return False, self.offer_errors[0]
+        if self.offer_errors:
+            lines = self.offer_errors[:MAX_REPORTED_OFFER_ERRORS]
+            hidden = len(self.offer_errors) - len(lines)
+            if hidden:
+                lines.append(f"... и ещё {hidden}")
+            return False, f"Ошибки в {len(self.offer_errors)} предложениях:\n" + "\n".join(lines)
+        return True, "Все обязательные элементы присутствуют"
+
+    @property
+    def schema_result(self) -> Tuple[bool, str]:
+        """(соответствует ли XML схеме, сообщение)"""
+        if self.schema is None:
+            return False, "Не удалось загрузить схему для валидации"
+        if self.syntax_error:
+            return False, f"Ошибка синтаксиса XML: {self.syntax_error}"
+        if self.schema_errors:
+            return False, f"Ошибки валидации{FALLBACK_NOTE if self.fallback else ''}:\n" + "\n".join(self.schema_errors)
+        return True, FALLBACK_VALID_MESSAGE if self.fallback else "XML соответствует схеме Kaspi.kz"
 
 
 class KaspiXMLValidator:
     """Класс для валидации XML файлов против схемы Kaspi.kz"""
     
-    def __init__(self, schema_url: str = "http://kaspi.kz/kaspishopping.xsd"):
+    def __init__(self, schema_url: Optional[str] = None):
         """
         Инициализация валидатора
         
         Args:
-            schema_url: URL схемы XSD для валидации
+            schema_url: URL схемы XSD для валидации (по умолчанию config.xml_schema_url)
         """
-        self.schema_url = schema_url
+        self.schema_url = schema_url or config.xml_schema_url
         self.schema = None
+        self.fallback = False  # Схема - структурная резервная, а не схема Kaspi
         self.logger = logging.getLogger(__name__)
         
     def download_schema(self) -> bool:
         """
-        Загружает схему XSD с сайта Kaspi.kz
+        Получает схему XSD из общего для процесса кэша (диск, сеть или резервная копия)
         
         Returns:
             bool: True если схема успешно загружена, False в противном случае
         """
-        try:
-            self.logger.info(f"Загрузка схемы с {self.schema_url}")
-            response = requests.get(self.schema_url, timeout=30)
-            response.raise_for_status()
-            
-            # Парсим схему
-            schema_doc = etree.fromstring(response.content)
-            self.schema = etree.XMLSchema(schema_doc)
-            
-            self.logger.info("Схема успешно загружена и разобрана")
-            return True
-            
-        except requests.exceptions.RequestException as e:
-            self.logger.error(f"Ошибка при загрузке схемы: {e}")
-            return False
-        except etree.XMLSyntaxError as e:
-            self.logger.error(f"Ошибка парсинга схемы: {e}")
-            return False
-        except Exception as e:
-            self.logger.error(f"Неожиданная ошибка при загрузке схемы: {e}")
+        self.schema = get_schema(self.schema_url)
+        self.fallback = is_fallback_schema(self.schema_url)
+        if self.schema is None:
+            self.logger.error(f"Не удалось получить схему {self.schema_url}")
             return False
+        return True
     
     def validate_xml_string(self, xml_content: str) -> Tuple[bool, str]:
         """
@@ -74,14 +368,14 @@ class KaspiXMLValidator:
             
             # Валидируем против схемы
             if self.schema.validate(xml_doc):
-                return True, "XML соответствует схеме Kaspi.kz"
+                return True, FALLBACK_VALID_MESSAGE if self.fallback else "XML соответствует схеме Kaspi.kz"
             else:
                 # Собираем все ошибки валидации
                 errors = []
                 for error in self.schema.error_log:
                     errors.append(f"Строка {error.line}: {error.message}")
                 
-                error_message = "Ошибки валидации:\n" + "\n".join(errors)
+                error_message = f"Ошибки валидации{FALLBACK_NOTE if self.fallback else ''}:\n" + "\n".join(errors)
                 return False, error_message
                 
         except etree.XMLSyntaxError as e:
@@ -89,6 +383,42 @@ class KaspiXMLValidator:
         except Exception as e:
             return False, f"Неожиданная ошибка при валидации: {e}"
     
+    def start_validation(self) -> FeedValidation:
+        """
+        Начинает проверку документа, который будет передаваться по частям
+
+        Пример:
+            validation = validator.start_validation()
+            with KaspiFeedWriter(path, attrs, tee=validation.feed) as writer:
+                ...
+            validation.close()
+            schema_valid, schema_message = validation.schema_result
+
+        Returns:
+            FeedValidation: Объект, принимающий фрагменты документа
+        """
+        if not self.schema:
+            self.download_schema()
+        return FeedValidation(self.schema, self.fallback)
+    
+    def check_file(self, file_path: str, with_schema: bool = True) -> FeedValidation:
+        """
+        Проверяет файл одним потоковым проходом (файл читается блоками, а не целиком)
+        
+        Args:
+            file_path: Путь к XML файлу
+            with_schema: False - только обязательные элементы, без загрузки схемы
+            
+        Returns:
+            FeedValidation: Завершённая проверка (structure_result, schema_result)
+        """
+        validation = self.start_validation() if with_schema else FeedValidation(None)
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(READ_CHUNK_SIZE), b''):
+                validation.feed(chunk)
+        validation.close()
+        return validation
+    
     def validate_xml_file(self, file_path: str) -> Tuple[bool, str]:
         """
         Валидирует XML файл против схемы
@@ -103,77 +433,42 @@ class KaspiXMLValidator:
             return False, f"Файл не найден: {file_path}"
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                xml_content = file.read()
-            
-            return self.validate_xml_string(xml_content)
-            
-        except Exception as e:
+            validation = self.check_file(file_path)
+        except OSError as e:
             return False, f"Ошибка при чтении файла: {e}"
+        return validation.schema_result
     
     def check_required_elements(self, xml_content: str) -> Tuple[bool, str]:
         """
         Проверяет наличие обязательных элементов в XML
         
+        Сообщает обо всех предложениях без sku/model/brand/price, а не только о первом.
+        
         Args:
             xml_content: XML контент как строка
             
         Returns:
             Tuple[bool, str]: (все ли элементы присутствуют, сообщение)
         """
-        try:
-            root = ET.fromstring(xml_content)
-            
-            # Определяем пространство имен
-            namespace = {'kaspi': 'kaspiShopping'}
-            
-            # Проверяем обязательные элементы
-            company = root.find('.//kaspi:company', namespace)
-            if company is None:
-                company = root.find('.//company')
-            
-            merchantid = root.find('.//kaspi:merchantid', namespace)
-            if merchantid is None:
-                merchantid = root.find('.//merchantid')
-            
-            offers = root.find('.//kaspi:offers', namespace)
-            if offers is None:
-                offers = root.find('.//offers')
-            
-            required_elements = {
-                'company': company,
-                'merchantid': merchantid,
-                'offers': offers
-            }
-            
-            missing_elements = []
-            for element_name, element in required_elements.items():
-                if element is None:
-                    missing_elements.append(element_name)
-            
-            if missing_elements:
-                return False, f"Отсутствуют обязательные элементы: {', '.join(missing_elements)}"
-            
-            # Проверяем структуру предложений
-            offers = root.find('.//offers')
-            if offers is not None:
-                for offer in offers.findall('offer'):
-                    sku = offer.get('sku')
-                    if not sku:
-                        return False, "Найдено предложение без SKU"
-                    
-                    # Проверяем обязательные дочерние элементы
-                    required_offer_elements = ['model', 'brand', 'price']
-                    for req_elem in required_offer_elements:
-                        if offer.find(req_elem) is None:
-                            return False, f"В предложении {sku} отсутствует элемент {req_elem}"
-            
-            return True, "Все обязательные элементы присутствуют"
+        validation = FeedValidation(None)
+        validation.feed(xml_content)
+        validation.close()
+        return validation.structure_result
+    
+    def check_required_elements_file(self, file_path: str) -> Tuple[bool, str]:
+        """
+        Проверяет наличие обязательных элементов в XML файле, не загружая его в память
+        
+        Args:
+            file_path: Путь к XML файлу
             
-        except ET.ParseError as e:
-            return False, f"Ошибка парсинга XML: {e}"
-        except Exception as e:
-            return False, f"Ошибка при проверке элементов: {e}"
+        Returns:
+            Tuple[bool, str]: (все ли элементы присутствуют, сообщение)
+        """
+        try:
+            return self.check_file(file_path, with_schema=False).structure_result
+        except OSError as e:
+            return False, f"Ошибка при чтении файла: {e}"
 
 
 def validate_kaspi_xml(file_path: str) -> None:
@@ -194,12 +489,12 @@ def validate_kaspi_xml(file_path: str) -> None:
     print(f"🔍 Валидация файла: {file_path}")
     print("-" * 50)
     
+    # Один потоковый проход по файлу: структура и схема проверяются одновременно
+    validation = validator.check_file(file_path)
+    
     # Проверяем структуру
     print("1. Проверка структуры XML...")
-    with open(file_path, 'r', encoding='utf-8') as f:
-        xml_content = f.read()
-    
-    structure_valid, structure_message = validator.check_required_elements(xml_content)
+    structure_valid, structure_message = validation.structure_result
     if structure_valid:
         print("✅ Структура XML корректна")
     else:
@@ -208,7 +503,7 @@ def validate_kaspi_xml(file_path: str) -> None:
     
     # Валидируем против схемы
     print("\n2. Валидация против схемы Kaspi.kz...")
-    schema_valid, schema_message = validator.validate_xml_file(file_path)
+    schema_valid, schema_message = validation.schema_result
     
     if schema_valid:
         print("✅ XML соответствует схеме Kaspi.kz")